@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script: Benchmark các định dạng nén của backup-folder
+
+Mục đích: So sánh tốc độ (MB/s) và tỷ lệ nén giữa zip/gztar/bztar/xztar
+          và các định dạng nhiều thread (pgztar, zsttar)
+Lý do: Chọn định dạng, mức nén và số thread phù hợp cho máy backup
+
+Cách dùng:
+    python scripts/benchmark_backup.py                    # Tạo cây thư mục mẫu
+    python scripts/benchmark_backup.py D:\\Data            # Đo trên thư mục có sẵn
+    python scripts/benchmark_backup.py --threads 1 8 32 --level 6
+
+Giải thích:
+- Cây mẫu gồm file text (nén tốt) và file ngẫu nhiên (không nén được)
+- Đo toàn bộ create_backup (quét + nén + ghi metadata), chạy 1 lần làm nóng
+  để manifest đã có hash và page cache đã có dữ liệu
+"""
+
+import io
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import importlib.util
+from contextlib import redirect_stdout
+
+# Thêm thư mục gốc project vào sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils import format_size, setup_logger
+
+
+def load_backup_module():
+    """Import tools/py/backup-folder/backup-folder.py (tên file có dấu '-')"""
+    path = os.path.join(ROOT, 'tools', 'py', 'backup-folder', 'backup-folder.py')
+    spec = importlib.util.spec_from_file_location('backup_folder', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def create_sample_tree(root: str, text_mb: int, random_mb: int) -> None:
+    """
+    Tạo cây thư mục mẫu
+    
+    Args:
+        root: Thư mục gốc
+        text_mb: Dung lượng file text (log/source code giả lập)
+        random_mb: Dung lượng file ngẫu nhiên (ảnh/video đã nén giả lập)
+    """
+    rng = random.Random(42)
+    words = [f"word{i}" for i in range(2000)]
+    
+    for i in range(text_mb):
+        folder = os.path.join(root, 'text', f"dir_{i % 10}")
+        os.makedirs(folder, exist_ok=True)
+        lines = []
+        size = 0
+        while size < 1024 * 1024:
+            line = ' '.join(rng.choice(words) for _ in range(12)) + '\n'
+            lines.append(line)
+            size += len(line)
+        with open(os.path.join(folder, f"file_{i:04d}.txt"), 'w') as f:
+            f.writelines(lines)
+    
+    folder = os.path.join(root, 'media')
+    os.makedirs(folder, exist_ok=True)
+    for i in range(random_mb):
+        with open(os.path.join(folder, f"blob_{i:04d}.bin"), 'wb') as f:
+            f.write(os.urandom(1024 * 1024))
+
+
+def run_backup(module, source: str, output: str, fmt: str, level, threads: int):
+    """
+    Chạy một lần backup, trả về (thời gian, kích thước nén)
+    """
+    manager = module.BackupManager(source, output, compression_level=level, threads=threads)
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        success, backup_file, info = manager.create_backup(
+            compression_format=fmt, show_progress=False
+        )
+        elapsed = time.perf_counter() - start
+    
+    if not success:
+        raise RuntimeError(info.get('error', 'Unknown'))
+    
+    size = os.path.getsize(backup_file)
+    os.remove(backup_file)
+    return elapsed, size
+
+
+def main():
+    """Hàm main"""
+    parser = argparse.ArgumentParser(description='Benchmark định dạng nén của backup-folder')
+    parser.add_argument('directory', nargs='?', help='Thư mục cần đo (mặc định: tạo cây mẫu)')
+    parser.add_argument('--text-mb', type=int, default=64, help='Dung lượng file text của cây mẫu (MB)')
+    parser.add_argument('--random-mb', type=int, default=32, help='Dung lượng file ngẫu nhiên của cây mẫu (MB)')
+    parser.add_argument('--formats', nargs='+',
+                        default=['zip', 'gztar', 'bztar', 'xztar', 'pgztar', 'zsttar'],
+                        help='Các định dạng cần đo')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, os.cpu_count() or 1],
+                        help='Các số thread cần thử cho pgztar/zsttar')
+    parser.add_argument('--level', type=int, help='Mức nén (mặc định theo từng định dạng)')
+    
+    args = parser.parse_args()
+    setup_logger('benchmark-backup', log_to_console=False)
+    module = load_backup_module()
+    
+    temp_root = tempfile.mkdtemp(prefix='benchmark_backup_')
+    directory = args.directory
+    
+    try:
+        if not directory:
+            directory = os.path.join(temp_root, 'sample')
+            print(f"📁 Tạo cây mẫu: {args.text_mb} MB text + {args.random_mb} MB ngẫu nhiên")
+            create_sample_tree(directory, args.text_mb, args.random_mb)
+        
+        output = os.path.join(temp_root, 'out')
+        os.makedirs(output, exist_ok=True)
+        source_size = sum(
+            os.path.getsize(os.path.join(r, f)) for r, _, files in os.walk(directory) for f in files
+        )
+        
+        # Làm nóng: manifest có sẵn hash, dữ liệu nằm trong page cache
+        run_backup(module, directory, output, 'tar', None, 1)
+        
+        print(f"\n===== {directory} ({format_size(source_size)}, {os.cpu_count()} CPU) =====")
+        print(f"   {'Định dạng':<20} {'Thời gian':>10} {'MB/s':>9} {'Kích thước':>12} {'Tỷ lệ':>8}")
+        
+        for fmt in args.formats:
+            if fmt == 'zsttar' and not module.ZSTD_AVAILABLE:
+                print(f"   {fmt:<20} (bỏ qua: chưa cài zstandard)")
+                continue
+            
+            thread_counts = args.threads if fmt in module.PARALLEL_FORMATS else [1]
+            for threads in thread_counts:
+                elapsed, size = run_backup(module, directory, output, fmt, args.level, threads)
+                name = f"{fmt} ({threads} thread)" if fmt in module.PARALLEL_FORMATS else fmt
+                speed = source_size / (1024 * 1024) / elapsed if elapsed else 0
+                ratio = size / source_size * 100 if source_size else 0
+                print(f"   {name:<20} {elapsed:>9.2f}s {speed:>9.1f} {format_size(size):>12} {ratio:>7.1f}%")
+    finally:
+        shutil.rmtree(temp_root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script: Benchmark giải mã + thu nhỏ ảnh của compress-images
+
+Mục đích: So sánh cách cũ (giải mã đủ độ phân giải rồi LANCZOS) với cách mới
+          (JPEG draft + reduce trước khi LANCZOS): thời gian và RAM đỉnh mỗi ảnh
+Lý do: Thu nhỏ ảnh máy ảnh 24 MP về 1920 px phần lớn công giải mã là thừa
+
+Cách dùng:
+    python scripts/benchmark_compress_images.py                       # Tạo ảnh mẫu 6000x4000
+    python scripts/benchmark_compress_images.py D:\\Photos\\IMG_0001.jpg
+    python scripts/benchmark_compress_images.py --width 1280 --repeat 5
+
+Giải thích:
+- Mỗi lần đo chạy trong process con riêng: RAM đỉnh (ru_maxrss) chỉ tính cho một ảnh
+- Ảnh mẫu cũng được tạo trong process con: Linux giữ ru_maxrss qua exec,
+  process cha phình to thì số đo của process con bị sai theo
+- Mỗi lần đo gồm: mở + resize + nén JPEG quality 80 trong bộ nhớ
+- RAM đỉnh cần resource (Linux/macOS); Windows chỉ đo thời gian
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import importlib.util
+
+# Thêm thư mục gốc project vào sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils import format_size
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+
+def load_compress_module():
+    """Import tools/py/compress-images/compress-images.py (tên file có dấu '-')"""
+    path = os.path.join(ROOT, 'tools', 'py', 'compress-images', 'compress-images.py')
+    spec = importlib.util.spec_from_file_location('compress_images', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def create_sample_image(path: str, width: int, height: int) -> None:
+    """
+    Tạo ảnh JPEG mẫu giống ảnh chụp (gradient + nhiễu nhẹ)
+    
+    Args:
+        path: Đường dẫn file
+        width: Chiều rộng
+        height: Chiều cao
+    """
+    from PIL import Image, ImageFilter
+    
+    noise = Image.effect_noise((width, height), 40).convert('RGB')
+    gradient = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    Image.blend(gradient, noise, 0.5).filter(ImageFilter.SMOOTH).save(path, quality=92)
+
+
+def run_child(image_path: str, width: int, fast: bool) -> None:
+    """
+    Chạy một lần đo trong process con, in kết quả dạng JSON
+    
+    Giải thích:
+    - ru_maxrss đo trước khi mở ảnh làm mốc (Python + Pillow đã import)
+    """
+    module = load_compress_module()
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if RESOURCE_AVAILABLE else 0
+    
+    start = time.perf_counter()
+    img, _ = module.open_image(image_path, resize_width=width, fast_downscale=fast)
+    data = module.encode_image(img.convert('RGB'), {'format': 'JPEG', 'quality': 80})
+    elapsed = time.perf_counter() - start
+    
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if RESOURCE_AVAILABLE else 0
+    if sys.platform == 'darwin':
+        # macOS trả về byte, Linux trả về KB
+        baseline //= 1024
+        peak //= 1024
+    
+    print(json.dumps({
+        'seconds': elapsed,
+        'peak_kb': peak,
+        'delta_kb': peak - baseline,
+        'size': list(img.size),
+        'bytes': len(data)
+    }))
+
+
+def measure(image_path: str, width: int, fast: bool, repeat: int) -> dict:
+    """
+    Đo nhiều lần (mỗi lần một process con), lấy thời gian nhanh nhất và RAM đỉnh lớn nhất
+    """
+    best = None
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', image_path,
+             '--width', str(width)] + ([] if fast else ['--slow']),
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        if best is None:
+            best = result
+        else:
+            best['seconds'] = min(best['seconds'], result['seconds'])
+            best['peak_kb'] = max(best['peak_kb'], result['peak_kb'])
+            best['delta_kb'] = max(best['delta_kb'], result['delta_kb'])
+    return best
+
+
+def main():
+    """Hàm main"""
+    parser = argparse.ArgumentParser(description='Benchmark giải mã + thu nhỏ ảnh của compress-images')
+    parser.add_argument('images', nargs='*', help='Ảnh cần đo (mặc định: tạo ảnh mẫu)')
+    parser.add_argument('--width', type=int, default=1920, help='Chiều rộng đích (mặc định: 1920)')
+    parser.add_argument('--sample-size', default='6000x4000', help='Kích thước ảnh mẫu (mặc định: 6000x4000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Số lần đo mỗi cách (lấy nhanh nhất)')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--slow', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--make-sample', help=argparse.SUPPRESS)
+    
+    args = parser.parse_args()
+    
+    width, height = (int(v) for v in args.sample_size.lower().split('x'))
+    
+    if args.child:
+        run_child(args.child, args.width, not args.slow)
+        return
+    
+    if args.make_sample:
+        create_sample_image(args.make_sample, width, height)
+        return
+    
+    temp_root = tempfile.mkdtemp(prefix='benchmark_compress_')
+    images = args.images
+    
+    try:
+        if not images:
+            sample = os.path.join(temp_root, 'sample.jpg')
+            print(f"📷 Tạo ảnh mẫu {width}x{height}")
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--make-sample', sample,
+                 '--sample-size', args.sample_size],
+                check=True
+            )
+            images = [sample]
+        
+        for image_path in images:
+            print(f"\n===== {os.path.basename(image_path)} "
+                  f"({format_size(os.path.getsize(image_path))}) -> {args.width} px =====")
+            print(f"   {'Cách':<26} {'Thời gian':>10} {'RAM đỉnh':>12} {'RAM thêm':>12}")
+            
+            results = []
+            for name, fast in (("Giải mã đầy đủ + LANCZOS", False), ("draft + reduce + LANCZOS", True)):
+                result = measure(image_path, args.width, fast, args.repeat)
+                results.append(result)
+                if RESOURCE_AVAILABLE:
+                    peak = format_size(result['peak_kb'] * 1024)
+                    delta = format_size(result['delta_kb'] * 1024)
+                else:
+                    peak = delta = 'n/a'
+                print(f"   {name:<26} {result['seconds']:>9.3f}s {peak:>12} {delta:>12}")
+            
+            if results[1]['seconds']:
+                print(f"   Tăng tốc: {results[0]['seconds'] / results[1]['seconds']:.2f}x")
+    finally:
+        shutil.rmtree(temp_root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script: Benchmark các cách duyệt thư mục
+
+Mục đích: So sánh os.walk + getsize, scan_files và parallel_scan_files
+Lý do: Chọn số thread quét phù hợp cho ổ local và ổ mạng (NFS/SMB)
+
+Cách dùng:
+    python scripts/benchmark_walk.py                 # Tạo cây thư mục mẫu
+    python scripts/benchmark_walk.py D:\\Data         # Đo trên thư mục có sẵn
+    python scripts/benchmark_walk.py --latency-ms 5 --workers 4 16 32
+
+Giải thích:
+- Kịch bản "local": gọi trực tiếp filesystem
+- Kịch bản "latency": mỗi lần scandir/stat bị chờ thêm N ms (giả lập ổ mạng)
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+# Thêm thư mục gốc project vào sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import scan_files, parallel_scan_files, format_size
+
+
+class _SlowDirEntry:
+    """DirEntry giả lập ổ mạng: stat() bị chờ thêm latency giây"""
+    
+    def __init__(self, entry, latency: float):
+        self._entry = entry
+        self._latency = latency
+        self.name = entry.name
+        self.path = entry.path
+    
+    def is_dir(self, follow_symlinks: bool = True) -> bool:
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+    
+    def is_file(self, follow_symlinks: bool = True) -> bool:
+        return self._entry.is_file(follow_symlinks=follow_symlinks)
+    
+    def is_symlink(self) -> bool:
+        return self._entry.is_symlink()
+    
+    def inode(self) -> int:
+        return self._entry.inode()
+    
+    def stat(self, follow_symlinks: bool = True):
+        time.sleep(self._latency)
+        return self._entry.stat(follow_symlinks=follow_symlinks)
+
+
+class _SlowScandir:
+    """Iterator scandir giả lập ổ mạng: mở thư mục bị chờ thêm latency giây"""
+    
+    def __init__(self, real_scandir, path, latency: float):
+        time.sleep(latency)
+        self._it = real_scandir(path)
+        self._latency = latency
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        return _SlowDirEntry(next(self._it), self._latency)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def close(self):
+        self._it.close()
+
+
+class simulated_latency:
+    """
+    Context manager thêm độ trễ vào os.scandir và os.stat
+    
+    Giải thích:
+    - os.walk, os.path.getsize, scan_files đều gọi qua os.scandir/os.stat
+      nên cùng chịu một mức trễ, so sánh được công bằng
+    """
+    
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000.0
+    
+    def __enter__(self):
+        self._scandir = os.scandir
+        self._stat = os.stat
+        real_scandir, real_stat, latency = self._scandir, self._stat, self.latency
+        
+        def slow_stat(*args, **kwargs):
+            time.sleep(latency)
+            return real_stat(*args, **kwargs)
+        
+        os.scandir = lambda path='.': _SlowScandir(real_scandir, path, latency)
+        os.stat = slow_stat
+        return self
+    
+    def __exit__(self, *exc):
+        os.scandir = self._scandir
+        os.stat = self._stat
+
+
+def create_sample_tree(root: str, dirs: int, files_per_dir: int) -> None:
+    """
+    Tạo cây thư mục mẫu (rộng, 2 cấp)
+    
+    Args:
+        root: Thư mục gốc
+        dirs: Số thư mục cấp 1 (mỗi thư mục có 4 thư mục con)
+        files_per_dir: Số file trong mỗi thư mục lá
+    """
+    for i in range(dirs):
+        for j in range(4):
+            leaf = os.path.join(root, f"dir_{i:04d}", f"sub_{j}")
+            os.makedirs(leaf, exist_ok=True)
+            for k in range(files_per_dir):
+                with open(os.path.join(leaf, f"file_{k:04d}.dat"), 'wb') as f:
+                    f.write(b'x' * (k % 7 + 1))
+
+
+def walk_with_getsize(directory: str) -> int:
+    """Cách cũ: os.walk rồi getsize từng file (stat thêm một lần)"""
+    total = 0
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            try:
+                total += os.path.getsize(os.path.join(root, file))
+            except OSError:
+                pass
+    return total
+
+
+def measure(func, repeat: int):
+    """
+    Chạy func nhiều lần, trả về (thời gian nhanh nhất, kết quả)
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def run_scenario(title: str, directory: str, workers_list, repeat: int) -> None:
+    """
+    Đo tất cả các cách duyệt trên một kịch bản
+    """
+    methods = [
+        ("os.walk + getsize", lambda: walk_with_getsize(directory)),
+        ("scan_files", lambda: sum(e.size for e in scan_files(directory))),
+    ]
+    for workers in workers_list:
+        methods.append((
+            f"parallel ({workers} threads)",
+            lambda w=workers: sum(e.size for e in parallel_scan_files(directory, workers=w))
+        ))
+    
+    print(f"\n===== {title} =====")
+    print(f"   {'Cách duyệt':<26} {'Thời gian':>10} {'Tăng tốc':>10} {'Tổng size':>12}")
+    
+    baseline = None
+    for name, func in methods:
+        elapsed, total = measure(func, repeat)
+        if baseline is None:
+            baseline = elapsed
+        speedup = baseline / elapsed if elapsed else 0
+        print(f"   {name:<26} {elapsed:>9.3f}s {speedup:>9.2f}x {format_size(total):>12}")
+
+
+def main():
+    """Hàm main"""
+    parser = argparse.ArgumentParser(description='Benchmark duyệt thư mục')
+    parser.add_argument('directory', nargs='?', help='Thư mục cần đo (mặc định: tạo cây mẫu)')
+    parser.add_argument('--dirs', type=int, default=50, help='Số thư mục cấp 1 của cây mẫu')
+    parser.add_argument('--files', type=int, default=20, help='Số file mỗi thư mục lá của cây mẫu')
+    parser.add_argument('--latency-ms', type=float, default=2.0,
+                        help='Độ trễ giả lập mỗi lần scandir/stat (ms, mặc định: 2)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[4, 16, 32],
+                        help='Các số thread cần thử cho parallel_scan_files')
+    parser.add_argument('--repeat', type=int, default=3, help='Số lần đo mỗi cách (lấy nhanh nhất)')
+    parser.add_argument('--skip-latency', action='store_true', help='Bỏ kịch bản giả lập ổ mạng')
+    
+    args = parser.parse_args()
+    
+    temp_root = None
+    directory = args.directory
+    
+    if not directory:
+        temp_root = tempfile.mkdtemp(prefix='benchmark_walk_')
+        print(f"📁 Tạo cây mẫu: {args.dirs * 4} thư mục x {args.files} file tại {temp_root}")
+        create_sample_tree(temp_root, args.dirs, args.files)
+        directory = temp_root
+    
+    try:
+        run_scenario("Local disk", directory, args.workers, args.repeat)
+        
+        if not args.skip_latency:
+            with simulated_latency(args.latency_ms):
+                # Mỗi thao tác đều chậm nên chỉ đo 1 lần
+                run_scenario(f"Giả lập ổ mạng ({args.latency_ms} ms/thao tác)",
+                             directory, args.workers, 1)
+    finally:
+        if temp_root:
+            shutil.rmtree(temp_root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,365 +9,2917 @@ Lý do: Bảo vệ dữ liệu khỏi mất mát
 
 import os
 import sys
+import time
+import zlib
+import gzip
 import shutil
+import fnmatch
+import struct
+import tarfile
+import zipfile
 import datetime
 import json
+import bisect
+import random
+import hashlib
+import sqlite3
 import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 # Thêm thư mục cha vào sys.path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils import (
     print_header, format_size, get_user_input, confirm_action,
-    get_folder_size, ensure_directory_exists, ProgressBar,
-    log_info, log_error, setup_logger, normalize_path
+    ensure_directory_exists, ProgressBar,
+    log_info, log_error, setup_logger, normalize_path,
+    scan_files, hash_file, get_fastest_algorithm, available_algorithms, get_hasher
 )
 
 
+# zstandard (tùy chọn): pip install zstandard
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+
+# NumPy (tùy chọn): tăng tốc cắt chunk của repository
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+# Các kiểu backup
+# - full: toàn bộ thư mục
+# - incremental: file thay đổi so với backup gần nhất (bất kỳ kiểu nào)
+# - differential: file thay đổi so với backup full gần nhất
+BACKUP_MODES = ['full', 'incremental', 'differential']
+
+# Phần mở rộng của từng định dạng nén (giống shutil.make_archive)
+ARCHIVE_EXTENSIONS = {
+    'zip': '.zip',
+    'tar': '.tar',
+    'gztar': '.tar.gz',
+    'bztar': '.tar.bz2',
+    'xztar': '.tar.xz',
+    'zsttar': '.tar.zst',
+    'pgztar': '.tar.gz'
+}
+
+# Định dạng nén nhiều thread (tự ghi, shutil.make_archive không hỗ trợ)
+# - zsttar: tar + zstd đa luồng (cần zstandard)
+# - pgztar: tar + gzip chia block nén song song kiểu pigz (file .tar.gz chuẩn)
+PARALLEL_FORMATS = ['zsttar', 'pgztar']
+
+# Mức nén mặc định của các định dạng nhiều thread
+DEFAULT_ZSTD_LEVEL = 3
+DEFAULT_GZIP_LEVEL = 6
+
+# Kích thước block của pgztar (mỗi block nén ở một thread)
+PGZIP_BLOCK_SIZE = 1024 * 1024
+
+# Cửa sổ deflate: block sau dùng 32 KB cuối của block trước làm dictionary
+GZIP_DICT_SIZE = 32 * 1024
+
+# Mode mở tarfile tương ứng với định dạng tar
+TAR_MODES = {
+    'tar': 'w',
+    'gztar': 'w:gz',
+    'bztar': 'w:bz2',
+    'xztar': 'w:xz'
+}
+
+# Kích thước buffer khi copy file vào archive
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Khoảng thời gian tối thiểu giữa 2 lần vẽ lại progress bar (giây)
+PROGRESS_INTERVAL = 0.1
+
+# File checksum đi kèm mỗi archive: <file backup>.checksums.json
+CHECKSUM_SUFFIX = '.checksums.json'
+CHECKSUM_VERSION = 1
+
+# Repository khử trùng lặp: tham số chunk theo nội dung (FastCDC)
+CHUNK_MIN_SIZE = 256 * 1024
+CHUNK_AVG_SIZE = 1024 * 1024
+CHUNK_MAX_SIZE = 4 * 1024 * 1024
+
+# Kích thước block đọc khi cắt chunk
+CHUNK_READ_SIZE = 8 * 1024 * 1024
+
+# Seed của bảng gear (đổi seed = đổi toàn bộ ranh giới chunk)
+GEAR_SEED = 0x5EED
+
+# Phiên bản định dạng repository
+REPO_VERSION = 1
+
+# Thuật toán hash đặt tên chunk (cần chống va chạm vì dùng làm địa chỉ nội dung)
+REPO_HASH_ALGO = 'sha256'
+
+# Byte đầu của file chunk cho biết cách nén
+CHUNK_RAW = b'\x00'
+CHUNK_ZLIB = b'\x01'
+CHUNK_ZSTD = b'\x02'
+
+# Các lệnh của repository
+REPO_COMMANDS = ['backup', 'list', 'restore', 'prune', 'check']
+
+# Danh mục backup (SQLite) trong thư mục backup, thay cho file JSON cũ
+CATALOG_FILE = 'backup_catalog.db'
+LEGACY_METADATA_FILE = 'backup_metadata.json'
+
+# Retention: khóa nhóm backup theo ngày/tuần (ISO)/tháng
+RETENTION_BUCKETS = {
+    'daily': '%Y-%m-%d',
+    'weekly': '%G-W%V',
+    'monthly': '%Y-%m'
+}
+
+
+def is_excluded(name: str, exclude_patterns: Optional[List[str]]) -> bool:
+    """
+    Kiểm tra tên file/thư mục có bị loại trừ không
+    
+    Args:
+        name: Tên file/thư mục
+        exclude_patterns: Danh sách pattern loại trừ
+    
+    Returns:
+        bool: True nếu tên chứa một trong các pattern (không phân biệt hoa thường)
+    """
+    if not exclude_patterns:
+        return False
+    
+    lower = name.lower()
+    return any(pattern.lower() in lower for pattern in exclude_patterns)
+
+
+def _deflate_block(block: bytes, zdict: bytes, level: int, last: bool) -> bytes:
+    """
+    Nén một block thành raw deflate (chạy trong thread của ParallelGzipWriter)
+    
+    Args:
+        block: Dữ liệu cần nén
+        zdict: 32 KB cuối của block trước (rỗng với block đầu tiên)
+        level: Mức nén zlib
+        last: Block cuối cùng (kết thúc stream deflate)
+    
+    Returns:
+        bytes: Dữ liệu deflate, ghi nối tiếp được với block trước
+    """
+    if zdict:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=zdict)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    
+    data = compressor.compress(block)
+    return data + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class ParallelGzipWriter:
+    """
+    File-like ghi gzip bằng nhiều thread (giống pigz)
+    
+    Mục đích: Dùng hết các core khi nén .tar.gz
+    Lý do: gzip/zlib của tarfile chỉ nén trên một thread
+    
+    Giải thích:
+    - Dữ liệu được chia thành block PGZIP_BLOCK_SIZE, mỗi block nén ở một thread
+      (zlib nhả GIL khi nén nên các thread chạy song song thật)
+    - Block dùng 32 KB cuối của block trước làm dictionary nên tỷ lệ nén
+      gần bằng gzip một luồng
+    - Các block kết thúc bằng Z_SYNC_FLUSH nên ghép lại thành một stream gzip chuẩn
+    - Số block đang chờ bị giới hạn (2 x threads) để bộ nhớ không tăng theo dữ liệu
+    """
+    
+    def __init__(self, fileobj, level: int = DEFAULT_GZIP_LEVEL, threads: int = 0,
+                 block_size: int = PGZIP_BLOCK_SIZE):
+        """
+        Args:
+            fileobj: File đích (mở ở chế độ 'wb')
+            level: Mức nén (1-9)
+            threads: Số thread nén (0 = số CPU)
+            block_size: Kích thước mỗi block
+        """
+        threads = threads or os.cpu_count() or 1
+        self._f = fileobj
+        self._level = level
+        self._block_size = block_size
+        self._executor = ThreadPoolExecutor(max_workers=threads)
+        self._max_pending = threads * 2
+        self._pending = deque()
+        self._buffer = bytearray()
+        self._zdict = b''
+        self._crc = 0
+        self._size = 0
+        self._closed = False
+        
+        # Header gzip: magic, deflate, không flag, mtime = 0, XFL = 0, OS = unknown
+        self._f.write(b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff')
+    
+    def write(self, data) -> int:
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        self._buffer += data
+        
+        while len(self._buffer) >= self._block_size:
+            block = bytes(self._buffer[:self._block_size])
+            del self._buffer[:self._block_size]
+            self._submit(block, last=False)
+        
+        return len(data)
+    
+    def _submit(self, block: bytes, last: bool):
+        """Gửi block vào thread pool, ghi các block đã xong theo đúng thứ tự"""
+        self._pending.append(
+            self._executor.submit(_deflate_block, block, self._zdict, self._level, last)
+        )
+        self._zdict = block[-GZIP_DICT_SIZE:]
+        
+        while len(self._pending) > self._max_pending:
+            self._f.write(self._pending.popleft().result())
+    
+    def close(self):
+        """Nén phần còn lại, ghi trailer (CRC32 + kích thước). Không đóng fileobj"""
+        if self._closed:
+            return
+        self._closed = True
+        
+        try:
+            self._submit(bytes(self._buffer), last=True)
+            self._buffer = bytearray()
+            
+            while self._pending:
+                self._f.write(self._pending.popleft().result())
+            
+            self._f.write(struct.pack('<II', self._crc & 0xffffffff, self._size & 0xffffffff))
+        finally:
+            self._executor.shutdown(wait=True)
+
+
+def _unpack_zsttar(filename: str, extract_dir: str, **kwargs):
+    """Giải nén .tar.zst (đăng ký với shutil.unpack_archive)"""
+    _extract_tar(filename, extract_dir, None)
+
+
+if ZSTD_AVAILABLE:
+    shutil.register_unpack_format('zsttar', ['.tar.zst'], _unpack_zsttar,
+                                  description='zstd compressed tar file')
+
+
+def _make_gear_table(seed: int) -> List[int]:
+    """
+    Bảng gear (256 số ngẫu nhiên 32 bit) cho rolling hash của FastCDC
+    
+    Giải thích:
+    - Sinh từ seed cố định nên mọi lần chạy/mọi máy cắt chunk giống nhau
+    """
+    rng = random.Random(seed)
+    return [rng.getrandbits(32) for _ in range(256)]
+
+
+_GEAR_TABLE = _make_gear_table(GEAR_SEED)
+_GEAR_TABLE_NP = np.array(_GEAR_TABLE, dtype=np.uint32) if NUMPY_AVAILABLE else None
+
+
+def _chunk_masks(avg_size: int) -> Tuple[int, int]:
+    """
+    Mask của FastCDC (normalized chunking) theo kích thước chunk trung bình
+    
+    Args:
+        avg_size: Kích thước trung bình (lũy thừa của 2)
+    
+    Returns:
+        tuple: (mask khó - dùng trước avg_size, mask dễ - dùng sau avg_size)
+    
+    Giải thích:
+    - Bit cao của gear hash phụ thuộc cả 32 byte gần nhất, bit thấp chỉ phụ thuộc
+      vài byte cuối -> lấy mask từ các bit cao
+    - Mask khó nhiều hơn 2 bit, mask dễ ít hơn 2 bit so với log2(avg_size)
+      -> kích thước chunk tập trung quanh avg_size
+    """
+    bits = avg_size.bit_length() - 1
+    strict = ((1 << (bits + 2)) - 1) << (32 - bits - 2)
+    loose = ((1 << (bits - 2)) - 1) << (32 - bits + 2)
+    return strict, loose
+
+
+def _gear_candidates(data: bytes, strict_mask: int, loose_mask: int) -> Tuple[List[int], List[int]]:
+    """
+    Tìm các vị trí có thể cắt chunk trong data
+    
+    Args:
+        data: Dữ liệu
+        strict_mask: Mask khó
+        loose_mask: Mask dễ
+    
+    Returns:
+        tuple: (vị trí kết thúc khớp mask dễ, vị trí kết thúc khớp mask khó) - tăng dần
+    
+    Giải thích:
+    - Gear hash: h = (h << 1) + GEAR[byte] (32 bit), bằng tổng GEAR[b(i-k)] << k
+      với k < 32 nên chỉ phụ thuộc 32 byte gần nhất
+    - Có NumPy: tính hash cho cả buffer bằng 5 bước nhân đôi cửa sổ (1, 2, 4, 8, 16)
+      thay vì vòng lặp Python từng byte
+    - Mask khó chứa mask dễ nên vị trí khớp mask khó là tập con
+    """
+    if NUMPY_AVAILABLE:
+        hashes = _GEAR_TABLE_NP[np.frombuffer(data, dtype=np.uint8)]
+        shift = 1
+        while shift < 32:
+            hashes[shift:] += hashes[:-shift] << np.uint32(shift)
+            shift *= 2
+        
+        positions = np.flatnonzero((hashes & np.uint32(loose_mask)) == 0)
+        strict = positions[(hashes[positions] & np.uint32(strict_mask)) == 0]
+        return (positions + 1).tolist(), (strict + 1).tolist()
+    
+    loose_ends = []
+    strict_ends = []
+    gear = _GEAR_TABLE
+    h = 0
+    for i, byte in enumerate(data):
+        h = ((h << 1) + gear[byte]) & 0xFFFFFFFF
+        if not h & loose_mask:
+            loose_ends.append(i + 1)
+            if not h & strict_mask:
+                strict_ends.append(i + 1)
+    return loose_ends, strict_ends
+
+
+def find_chunk_ends(
+    data: bytes,
+    min_size: int = CHUNK_MIN_SIZE,
+    avg_size: int = CHUNK_AVG_SIZE,
+    max_size: int = CHUNK_MAX_SIZE,
+    final: bool = True
+) -> List[int]:
+    """
+    Chia data thành các chunk theo nội dung (FastCDC)
+    
+    Args:
+        data: Dữ liệu
+        min_size: Kích thước chunk tối thiểu
+        avg_size: Kích thước chunk trung bình
+        max_size: Kích thước chunk tối đa
+        final: Đây là phần cuối của file (phần dư cuối cùng thành chunk)
+    
+    Returns:
+        list: Vị trí kết thúc của từng chunk hoàn chỉnh
+    
+    Giải thích:
+    - Bỏ qua min_size byte đầu mỗi chunk, sau đó cắt ở vị trí khớp mask khó
+      trong khoảng (min, avg], nếu không có thì khớp mask dễ trong (avg, max]
+    - Chèn/xóa vài byte chỉ làm đổi chunk quanh chỗ sửa, các chunk sau
+      vẫn giống hệt -> khử trùng lặp tốt hơn chia block cố định
+    - final=False: dừng khi chưa đủ dữ liệu để quyết định, phần dư đọc tiếp
+    """
+    strict_mask, loose_mask = _chunk_masks(avg_size)
+    loose_ends, strict_ends = _gear_candidates(data, strict_mask, loose_mask)
+    
+    size = len(data)
+    ends = []
+    start = 0
+    
+    while start < size:
+        if size - start <= min_size:
+            if final:
+                ends.append(size)
+            break
+        
+        if not final and start + avg_size > size:
+            break
+        
+        i = bisect.bisect_left(strict_ends, start + min_size)
+        if i < len(strict_ends) and strict_ends[i] <= start + avg_size:
+            end = strict_ends[i]
+        else:
+            j = bisect.bisect_right(loose_ends, start + avg_size)
+            if j < len(loose_ends) and loose_ends[j] <= start + max_size:
+                end = loose_ends[j]
+            elif start + max_size <= size:
+                end = start + max_size
+            elif final:
+                end = size
+            else:
+                break
+        
+        ends.append(end)
+        start = end
+    
+    return ends
+
+
+def iter_file_chunks(f, min_size: int = CHUNK_MIN_SIZE, avg_size: int = CHUNK_AVG_SIZE,
+                     max_size: int = CHUNK_MAX_SIZE) -> Iterator[bytes]:
+    """
+    Đọc file và trả về từng chunk theo nội dung
+    
+    Args:
+        f: File mở ở chế độ 'rb'
+        min_size, avg_size, max_size: Tham số chunk (xem find_chunk_ends)
+    
+    Yields:
+        bytes: Dữ liệu từng chunk (file rỗng không có chunk nào)
+    
+    Giải thích:
+    - Đọc theo block CHUNK_READ_SIZE, phần chưa cắt được (< max_size) ghép với block sau
+    """
+    buffer = b''
+    while True:
+        data = f.read(CHUNK_READ_SIZE)
+        final = not data
+        buffer = buffer + data if buffer else data
+        
+        start = 0
+        for end in find_chunk_ends(buffer, min_size, avg_size, max_size, final):
+            yield buffer[start:end]
+            start = end
+        
+        buffer = buffer[start:]
+        if final:
+            break
+
+
+def match_member(name: str, patterns: Optional[List[str]]) -> bool:
+    """
+    Kiểm tra member trong archive có khớp pattern restore không
+    
+    Args:
+        name: Tên member (vd: 'project/config/app.yml')
+        patterns: Danh sách đường dẫn/glob (None hoặc rỗng = khớp tất cả)
+    
+    Returns:
+        bool: True nếu khớp
+    
+    Giải thích:
+    - Pattern khớp theo tên đầy đủ hoặc theo đường dẫn bỏ thư mục gốc
+      ('config/app.yml' và 'project/config/app.yml' đều được)
+    - Pattern là thư mục thì khớp mọi thứ bên trong ('config' -> 'config/...')
+    - Hỗ trợ glob: '*.yml', 'config/*.json'
+    """
+    if not patterns:
+        return True
+    
+    name = name.rstrip('/')
+    relative = name.split('/', 1)[1] if '/' in name else ''
+    
+    for pattern in patterns:
+        pattern = pattern.strip('/')
+        for candidate in (name, relative):
+            if not candidate:
+                continue
+            if fnmatch.fnmatchcase(candidate, pattern) or candidate.startswith(pattern + '/'):
+                return True
+    return False
+
+
+def _is_literal_pattern(pattern: str) -> bool:
+    """Pattern không có ký tự glob"""
+    return not any(ch in pattern for ch in '*?[')
+
+
+def _open_tar_stream(backup_file: str):
+    """
+    Mở archive tar ở chế độ stream (đọc tuần tự, không seek)
+    
+    Returns:
+        tuple: (tarfile, streams cần đóng sau khi đóng tarfile)
+    
+    Giải thích:
+    - .tar.zst giải nén qua zstandard, các định dạng tar khác để tarfile tự nhận dạng
+    """
+    if backup_file.endswith(ARCHIVE_EXTENSIONS['zsttar']):
+        if not ZSTD_AVAILABLE:
+            raise ValueError("File .tar.zst cần thư viện zstandard: pip install zstandard")
+        raw = open(backup_file, 'rb')
+        reader = zstandard.ZstdDecompressor().stream_reader(raw)
+        return tarfile.open(fileobj=reader, mode='r|'), [reader, raw]
+    
+    return tarfile.open(backup_file, 'r|*'), []
+
+
+def list_archive(backup_file: str) -> List[Tuple[str, int, bool]]:
+    """
+    Liệt kê nội dung archive mà không giải nén ra đĩa
+    
+    Args:
+        backup_file: File backup (zip hoặc tar.*)
+    
+    Returns:
+        list: [(tên, kích thước, là thư mục), ...]
+    
+    Giải thích:
+    - zip: chỉ đọc central directory ở cuối file (không đọc dữ liệu)
+    - tar: đọc tuần tự các header (file nén vẫn phải giải nén để đi qua dữ liệu)
+    """
+    if zipfile.is_zipfile(backup_file):
+        with zipfile.ZipFile(backup_file) as archive:
+            return [(info.filename, info.file_size, info.is_dir()) for info in archive.infolist()]
+    
+    tar, streams = _open_tar_stream(backup_file)
+    try:
+        with tar:
+            return [(member.name, member.size, member.isdir()) for member in tar]
+    finally:
+        for stream in streams:
+            stream.close()
+
+
+def _extract_zip(backup_file: str, restore_location: str, patterns: Optional[List[str]],
+                 workers: int, show_progress: bool) -> Tuple[int, int]:
+    """
+    Giải nén các member khớp pattern từ file zip (có thể song song)
+    
+    Returns:
+        tuple: (số file, số byte)
+    
+    Giải thích:
+    - Chọn member từ central directory, không đọc dữ liệu của member không khớp
+    - workers > 1: mỗi thread mở ZipFile riêng (không dùng chung vị trí đọc),
+      file lớn được giao trước để các thread xong gần cùng lúc
+    """
+    with zipfile.ZipFile(backup_file) as archive:
+        members = [info for info in archive.infolist() if match_member(info.filename, patterns)]
+    
+    files = sorted((info for info in members if not info.is_dir()),
+                   key=lambda info: info.file_size, reverse=True)
+    total_bytes = sum(info.file_size for info in files)
+    
+    with zipfile.ZipFile(backup_file) as archive:
+        for info in members:
+            if info.is_dir():
+                archive.extract(info, restore_location)
+    
+    progress = ProgressBar(max(total_bytes, 1), prefix="Giải nén:") if show_progress and files else None
+    local = threading.local()
+    lock = threading.Lock()
+    state = {'bytes': 0, 'last': 0.0}
+    handles = []
+    
+    def extract(info: zipfile.ZipInfo):
+        archive = getattr(local, 'archive', None)
+        if archive is None:
+            archive = local.archive = zipfile.ZipFile(backup_file)
+            with lock:
+                handles.append(archive)
+        archive.extract(info, restore_location)
+        with lock:
+            state['bytes'] += info.file_size
+            now = time.monotonic()
+            if progress and now - state['last'] >= PROGRESS_INTERVAL:
+                state['last'] = now
+                progress.update(
+                    state['bytes'],
+                    f"{format_size(state['bytes'])}/{format_size(total_bytes)}"
+                )
+    
+    try:
+        if workers > 1 and len(files) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for _ in executor.map(extract, files):
+                    pass
+        else:
+            for info in files:
+                extract(info)
+    finally:
+        for archive in handles:
+            archive.close()
+    
+    if progress:
+        progress.finish(f"Giải nén hoàn thành ({format_size(state['bytes'])})")
+    
+    return len(files), state['bytes']
+
+
+def _extract_tar(backup_file: str, restore_location: str,
+                 patterns: Optional[List[str]]) -> Tuple[int, int]:
+    """
+    Giải nén các member khớp pattern từ file tar (đọc stream một lượt)
+    
+    Returns:
+        tuple: (số file, số byte)
+    
+    Giải thích:
+    - Đọc tuần tự, chỉ ghi ra đĩa member khớp pattern
+    - Mọi pattern là đường dẫn file cụ thể (không glob): dừng ngay khi đã lấy đủ,
+      không phải đọc hết archive
+    """
+    literal = patterns and all(_is_literal_pattern(p) for p in patterns)
+    wanted = {p.strip('/') for p in patterns} if literal else set()
+    file_count = 0
+    byte_count = 0
+    
+    tar, streams = _open_tar_stream(backup_file)
+    try:
+        with tar:
+            for member in tar:
+                if not match_member(member.name, patterns):
+                    continue
+                
+                if hasattr(tarfile, 'data_filter'):
+                    tar.extract(member, restore_location, filter='data')
+                else:
+                    tar.extract(member, restore_location)
+                
+                if member.isfile():
+                    file_count += 1
+                    byte_count += member.size
+                
+                if wanted and member.isfile():
+                    relative = member.name.split('/', 1)[1] if '/' in member.name else ''
+                    wanted.discard(member.name)
+                    wanted.discard(relative)
+                    if not wanted:
+                        break
+    finally:
+        for stream in streams:
+            stream.close()
+    
+    return file_count, byte_count
+
+
+def extract_archive(backup_file: str, restore_location: str,
+                    patterns: Optional[List[str]] = None, workers: int = 1,
+                    show_progress: bool = True) -> Tuple[int, int]:
+    """
+    Giải nén archive (toàn bộ hoặc chỉ các đường dẫn/glob chỉ định)
+    
+    Args:
+        backup_file: File backup (zip hoặc tar.*)
+        restore_location: Vị trí giải nén
+        patterns: Đường dẫn/glob cần lấy (None = toàn bộ), xem match_member
+        workers: Số thread giải nén (chỉ áp dụng cho zip)
+        show_progress: Hiển thị progress bar (zip)
+    
+    Returns:
+        tuple: (số file đã giải nén, số byte)
+    """
+    if zipfile.is_zipfile(backup_file):
+        return _extract_zip(backup_file, restore_location, patterns, workers, show_progress)
+    return _extract_tar(backup_file, restore_location, patterns)
+
+
+def write_checksum_file(backup_file: str, algo: str, checksums: Dict[str, List]) -> str:
+    """
+    Ghi file checksum đi kèm archive
+    
+    Args:
+        backup_file: File backup
+        algo: Thuật toán hash
+        checksums: {tên trong archive: [size, hash]}
+    
+    Returns:
+        str: Đường dẫn file checksum
+    """
+    checksum_file = backup_file + CHECKSUM_SUFFIX
+    data = {
+        'version': CHECKSUM_VERSION,
+        'archive': os.path.basename(backup_file),
+        'archive_size': os.path.getsize(backup_file),
+        'algo': algo,
+        'files': checksums
+    }
+    with open(checksum_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    return checksum_file
+
+
+def load_checksums(backup_file: str) -> Optional[dict]:
+    """
+    Đọc file checksum của archive
+    
+    Returns:
+        dict: Nội dung file checksum (None nếu archive không có file checksum)
+    """
+    checksum_file = backup_file + CHECKSUM_SUFFIX
+    if not os.path.isfile(checksum_file):
+        return None
+    with open(checksum_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _hash_stream(f, algo: str) -> Tuple[int, str]:
+    """Hash dữ liệu đọc từ file object theo block, trả về (size, hash)"""
+    hasher = get_hasher(algo)
+    size = 0
+    while True:
+        data = f.read(COPY_BUFFER_SIZE)
+        if not data:
+            break
+        hasher.update(data)
+        size += len(data)
+    return size, hasher.hexdigest()
+
+
+def verify_archive(backup_file: str, workers: int = 1) -> dict:
+    """
+    Kiểm tra toàn vẹn archive mà không giải nén ra đĩa
+    
+    Args:
+        backup_file: File backup (zip hoặc tar.*)
+        workers: Số thread đọc song song (chỉ áp dụng cho zip)
+    
+    Returns:
+        dict: {'files', 'bytes', 'seconds', 'archive_size', 'algo', 'has_checksums',
+               'mismatched', 'missing', 'unexpected', 'errors'}
+    
+    Giải thích:
+    - Đọc (giải nén trong RAM) mọi file, hash và so với <file backup>.checksums.json
+    - zip: mỗi thread mở ZipFile riêng, file lớn được giao trước; zipfile tự kiểm CRC
+    - tar: đọc stream một lượt; gzip/xz/bz2/zstd tự kiểm tra dữ liệu nén
+    - Archive cũ không có file checksum: chỉ kiểm tra đọc được toàn bộ (CRC)
+    """
+    start = time.perf_counter()
+    checksum_data = load_checksums(backup_file)
+    expected = checksum_data['files'] if checksum_data else {}
+    algo = checksum_data['algo'] if checksum_data else get_fastest_algorithm()
+    if algo not in available_algorithms():
+        raise ValueError(f"Thiếu thư viện cho thuật toán hash '{algo}' của file checksum")
+    
+    stats = {
+        'files': 0, 'bytes': 0, 'seconds': 0.0,
+        'archive_size': os.path.getsize(backup_file), 'algo': algo,
+        'has_checksums': checksum_data is not None,
+        'mismatched': [], 'missing': [], 'unexpected': [], 'errors': []
+    }
+    found = set()
+    
+    def record(name: str, size: int, digest: str):
+        stats['files'] += 1
+        stats['bytes'] += size
+        found.add(name)
+        if not checksum_data:
+            return
+        if name not in expected:
+            stats['unexpected'].append(name)
+        elif expected[name] != [size, digest]:
+            stats['mismatched'].append(name)
+    
+    if zipfile.is_zipfile(backup_file):
+        with zipfile.ZipFile(backup_file) as archive:
+            members = sorted((info for info in archive.infolist() if not info.is_dir()),
+                             key=lambda info: info.file_size, reverse=True)
+        
+        local = threading.local()
+        lock = threading.Lock()
+        handles = []
+        
+        def check(info: zipfile.ZipInfo):
+            archive = getattr(local, 'archive', None)
+            if archive is None:
+                archive = local.archive = zipfile.ZipFile(backup_file)
+                with lock:
+                    handles.append(archive)
+            try:
+                with archive.open(info) as f:
+                    size, digest = _hash_stream(f, algo)
+            except Exception as e:
+                with lock:
+                    found.add(info.filename)
+                    stats['errors'].append(f"{info.filename}: {e}")
+                return
+            with lock:
+                record(info.filename, size, digest)
+        
+        try:
+            if workers > 1 and len(members) > 1:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    for _ in executor.map(check, members):
+                        pass
+            else:
+                for info in members:
+                    check(info)
+        finally:
+            for archive in handles:
+                archive.close()
+    else:
+        try:
+            tar, streams = _open_tar_stream(backup_file)
+            try:
+                with tar:
+                    for member in tar:
+                        if member.isreg():
+                            size, digest = _hash_stream(tar.extractfile(member), algo)
+                            record(member.name, size, digest)
+            finally:
+                for stream in streams:
+                    stream.close()
+        except Exception as e:
+            stats['errors'].append(str(e))
+    
+    stats['missing'] = sorted(set(expected) - found)
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+
+def find_backup_archives(paths: Iterable[str]) -> List[str]:
+    """
+    Lấy danh sách file backup từ các đường dẫn (file hoặc thư mục chứa backup)
+    
+    Returns:
+        list: Đường dẫn các archive (đã sắp xếp)
+    """
+    extensions = tuple(set(ARCHIVE_EXTENSIONS.values()))
+    archives = []
+    for path in paths:
+        if os.path.isdir(path):
+            archives.extend(
+                entry.path for entry in os.scandir(path)
+                if entry.is_file() and entry.name.endswith(extensions)
+            )
+        else:
+            archives.append(path)
+    return sorted(archives)
+
+
+class _ProgressReader:
+    """
+    File wrapper theo dõi dữ liệu đọc qua nó
+    
+    Giải thích:
+    - on_read(số byte) mỗi lần đọc (progress theo byte)
+    - hasher: hash đúng dữ liệu được ghi vào archive, không phải đọc file lần 2
+    """
+    
+    def __init__(self, f, on_read: Optional[Callable[[int], None]] = None, hasher=None):
+        self._f = f
+        self._on_read = on_read
+        self._hasher = hasher
+        self.bytes_read = 0
+    
+    def read(self, size: int = -1) -> bytes:
+        data = self._f.read(size)
+        if data:
+            self.bytes_read += len(data)
+            if self._hasher is not None:
+                self._hasher.update(data)
+            if self._on_read:
+                self._on_read(len(data))
+        return data
+
+
+class BackupCatalog:
+    """
+    Danh mục các backup của một thư mục backup (SQLite)
+    
+    Mục đích: Thay backup_metadata.json (ghi lại toàn bộ mỗi lần backup)
+    Lý do: Sau nhiều năm backup, thêm/liệt kê/xóa bản ghi vẫn chỉ tốn
+           công theo số bản ghi thay đổi, không phải đọc/ghi cả lịch sử
+    
+    Giải thích:
+    - backups: một dòng mỗi backup, index theo (source_path, id) và base_backup
+    - manifests: manifest nén zlib, tách riêng -> liệt kê không phải đọc manifest
+    - Lần đầu mở, tự chuyển backup_metadata.json cũ vào catalog
+      (file cũ đổi tên thành backup_metadata.json.migrated)
+    """
+    
+    def __init__(self, db_path: str, legacy_file: Optional[str] = None, read_only: bool = False):
+        """
+        Mở (hoặc tạo) catalog
+        
+        Args:
+            db_path: Đường dẫn file SQLite
+            legacy_file: File backup_metadata.json cũ cần chuyển sang (nếu có)
+            read_only: Chỉ đọc catalog đã có (không tạo bảng, không chuyển file cũ)
+        """
+        self.db_path = db_path
+        if read_only:
+            uri = Path(db_path).resolve().as_uri() + '?mode=ro'
+            self.conn = sqlite3.connect(uri, uri=True, timeout=30)
+            return
+        
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS backups (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                backup_file TEXT NOT NULL UNIQUE,
+                source_path TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                base_backup TEXT,
+                info TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_backups_source ON backups (source_path, id);
+            CREATE INDEX IF NOT EXISTS idx_backups_base ON backups (base_backup);
+            CREATE TABLE IF NOT EXISTS manifests (
+                backup_file TEXT PRIMARY KEY,
+                data BLOB NOT NULL
+            );
+        """)
+        self.conn.commit()
+        
+        if legacy_file and os.path.isfile(legacy_file):
+            self._import_legacy(legacy_file)
+    
+    def _import_legacy(self, legacy_file: str) -> None:
+        """Chuyển backup_metadata.json cũ vào catalog (chỉ khi catalog còn trống)"""
+        if self.conn.execute("SELECT 1 FROM backups LIMIT 1").fetchone():
+            return
+        
+        try:
+            with open(legacy_file, 'r', encoding='utf-8') as f:
+                backups = json.load(f).get('backups', [])
+        except Exception as e:
+            log_error(f"Không đọc được metadata cũ {legacy_file}: {e}")
+            return
+        
+        with self.conn:
+            for backup_info in backups:
+                self._insert(backup_info)
+        
+        os.replace(legacy_file, legacy_file + '.migrated')
+        log_info(f"Đã chuyển {len(backups)} bản ghi từ {legacy_file} sang catalog")
+    
+    def _insert(self, backup_info: dict) -> None:
+        """Ghi một bản ghi (không commit)"""
+        info = {k: v for k, v in backup_info.items() if k != 'manifest'}
+        self.conn.execute(
+            "INSERT OR REPLACE INTO backups "
+            "(backup_file, source_path, timestamp, mode, base_backup, info) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (info['backup_file'], info.get('source_path', ''), info.get('timestamp', ''),
+             info.get('mode', 'full'), info.get('base_backup'),
+             json.dumps(info, ensure_ascii=False))
+        )
+        if backup_info.get('manifest') is not None:
+            data = zlib.compress(json.dumps(backup_info['manifest'], ensure_ascii=False).encode('utf-8'))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO manifests (backup_file, data) VALUES (?, ?)",
+                (info['backup_file'], data)
+            )
+    
+    def add(self, backup_info: dict) -> None:
+        """
+        Thêm bản ghi backup mới
+        
+        Args:
+            backup_info: Thông tin backup (có thể kèm 'manifest')
+        """
+        with self.conn:
+            self._insert(backup_info)
+    
+    def get(self, backup_file: str) -> Optional[dict]:
+        """Bản ghi của một backup theo tên file (không kèm manifest)"""
+        row = self.conn.execute(
+            "SELECT info FROM backups WHERE backup_file = ?", (backup_file,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def load_manifest(self, backup_file: str) -> Optional[dict]:
+        """Manifest của một backup (None nếu không có)"""
+        row = self.conn.execute(
+            "SELECT data FROM manifests WHERE backup_file = ?", (backup_file,)
+        ).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+    
+    def iter_backups(self, source_path: Optional[str] = None, newest_first: bool = False) -> Iterator[dict]:
+        """
+        Duyệt các bản ghi (không kèm manifest)
+        
+        Args:
+            source_path: Chỉ lấy backup của thư mục nguồn này (None = tất cả)
+            newest_first: Mới nhất trước
+        
+        Giải thích:
+        - Đọc dần theo cursor, dừng sớm được (vd: tìm backup gốc gần nhất)
+        """
+        order = "DESC" if newest_first else "ASC"
+        if source_path is None:
+            cursor = self.conn.execute(f"SELECT info FROM backups ORDER BY id {order}")
+        else:
+            cursor = self.conn.execute(
+                f"SELECT info FROM backups WHERE source_path = ? ORDER BY id {order}",
+                (source_path,)
+            )
+        for (info,) in cursor:
+            yield json.loads(info)
+    
+    def list_backups(self, source_path: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+        """
+        Danh sách bản ghi, cũ trước mới sau
+        
+        Args:
+            source_path: Chỉ lấy backup của thư mục nguồn này (None = tất cả)
+            limit: Chỉ lấy N bản ghi mới nhất (None = tất cả)
+        """
+        backups = []
+        for backup_info in self.iter_backups(source_path, newest_first=True):
+            if limit is not None and len(backups) >= limit:
+                break
+            backups.append(backup_info)
+        backups.reverse()
+        return backups
+    
+    def sources(self) -> List[str]:
+        """Các thư mục nguồn có trong catalog"""
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT source_path FROM backups")]
+    
+    def remove(self, backup_file: str) -> None:
+        """Xóa bản ghi (và manifest) của một backup"""
+        with self.conn:
+            self.conn.execute("DELETE FROM backups WHERE backup_file = ?", (backup_file,))
+            self.conn.execute("DELETE FROM manifests WHERE backup_file = ?", (backup_file,))
+    
+    def close(self) -> None:
+        """Đóng kết nối"""
+        self.conn.close()
+    
+    def __enter__(self) -> 'BackupCatalog':
+        return self
+    
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _backup_datetime(backup_info: dict) -> datetime.datetime:
+    """Thời điểm tạo backup (từ trường timestamp dạng YYYYmmdd_HHMMSS)"""
+    return datetime.datetime.strptime(backup_info['timestamp'][:15], "%Y%m%d_%H%M%S")
+
+
+def plan_retention(
+    backups: List[dict],
+    keep_last: int = 0,
+    keep_daily: int = 0,
+    keep_weekly: int = 0,
+    keep_monthly: int = 0
+) -> Tuple[List[dict], List[dict]]:
+    """
+    Chọn backup giữ lại / xóa theo chính sách retention
+    
+    Args:
+        backups: Bản ghi backup của một thư mục nguồn, cũ trước mới sau
+        keep_last: Giữ N backup gần nhất
+        keep_daily: Giữ backup mới nhất của mỗi ngày, cho N ngày gần nhất có backup
+        keep_weekly: Như trên theo tuần (ISO)
+        keep_monthly: Như trên theo tháng
+    
+    Returns:
+        tuple: (giữ lại, xóa) - cùng thứ tự với backups
+    
+    Giải thích:
+    - Một backup được giữ nếu thỏa ít nhất một quy tắc
+    - Backup gốc của backup incremental/differential được giữ thì cũng được giữ
+      (thiếu backup gốc thì không restore được)
+    - Không có quy tắc nào (tất cả = 0) -> giữ tất cả
+    """
+    if not any((keep_last, keep_daily, keep_weekly, keep_monthly)):
+        return list(backups), []
+    
+    newest = list(reversed(backups))
+    keep = {b['backup_file'] for b in newest[:max(keep_last, 0)]}
+    
+    for count, bucket_format in ((keep_daily, RETENTION_BUCKETS['daily']),
+                                 (keep_weekly, RETENTION_BUCKETS['weekly']),
+                                 (keep_monthly, RETENTION_BUCKETS['monthly'])):
+        buckets = set()
+        for backup in newest:
+            if len(buckets) >= count:
+                break
+            try:
+                bucket = _backup_datetime(backup).strftime(bucket_format)
+            except (KeyError, ValueError):
+                continue
+            if bucket not in buckets:
+                buckets.add(bucket)
+                keep.add(backup['backup_file'])
+    
+    by_name = {b['backup_file']: b for b in backups}
+    pending = list(keep)
+    while pending:
+        base = by_name.get(pending.pop(), {}).get('base_backup')
+        if base and base not in keep:
+            keep.add(base)
+            pending.append(base)
+    
+    kept = [b for b in backups if b['backup_file'] in keep]
+    removed = [b for b in backups if b['backup_file'] not in keep]
+    return kept, removed
+
+
 class BackupManager:
     """
-    Class quản lý backup
+    Class quản lý backup
+    
+    Mục đích: Tập trung logic backup, dễ mở rộng và maintain
+    """
+    
+    def __init__(self, source_folder: str, backup_location: str,
+                 compression_level: Optional[int] = None, threads: int = 0):
+        """
+        Khởi tạo BackupManager
+        
+        Args:
+            source_folder: Thư mục nguồn cần backup
+            backup_location: Vị trí lưu backup
+            compression_level: Mức nén (None = mặc định của từng định dạng)
+            threads: Số thread nén cho zsttar/pgztar (0 = số CPU)
+        """
+        self.source_path = Path(source_folder).resolve()
+        self.backup_location = Path(backup_location).resolve()
+        self.compression_level = compression_level
+        self.threads = threads
+        self._catalog = None
+        
+        # Đảm bảo thư mục backup tồn tại
+        ensure_directory_exists(str(self.backup_location))
+    
+    @property
+    def catalog(self) -> BackupCatalog:
+        """
+        Danh mục backup của backup_location (mở khi cần lần đầu)
+        
+        Giải thích:
+        - Mở muộn: các lệnh không dùng metadata (vd: repository) không tạo file catalog
+        """
+        if self._catalog is None:
+            self._catalog = BackupCatalog(
+                str(self.backup_location / CATALOG_FILE),
+                str(self.backup_location / LEGACY_METADATA_FILE)
+            )
+        return self._catalog
+    
+    def save_backup_metadata(self, backup_info: dict):
+        """
+        Lưu metadata của backup mới
+        
+        Args:
+            backup_info: Thông tin backup (timestamp, size, path, manifest...)
+        
+        Giải thích:
+        - Thêm một dòng vào catalog, không ghi lại lịch sử cũ
+        - Bản ghi cũ chỉ bị xóa cùng file backup (xem apply_retention)
+        """
+        self.catalog.add(backup_info)
+    
+    def list_previous_backups(self, limit: Optional[int] = None) -> List[dict]:
+        """
+        Liệt kê các backup trước
+        
+        Args:
+            limit: Chỉ lấy N backup gần nhất (None = tất cả)
+        
+        Returns:
+            list: Danh sách backup info (cũ trước mới sau, không kèm manifest)
+        """
+        return self.catalog.list_backups(limit=limit)
+    
+    def find_base_backup(self, mode: str) -> Optional[dict]:
+        """
+        Tìm backup làm gốc so sánh cho kiểu backup
+        
+        Args:
+            mode: 'incremental' (backup gần nhất) hoặc 'differential' (full gần nhất)
+        
+        Returns:
+            dict: Bản ghi metadata của backup gốc, kèm manifest (None nếu chưa có)
+        
+        Giải thích:
+        - Chỉ xét backup của cùng thư mục nguồn, có manifest và file còn tồn tại
+        - Duyệt từ mới đến cũ, dừng ở bản ghi đầu tiên phù hợp
+        """
+        for backup in self.catalog.iter_backups(str(self.source_path), newest_first=True):
+            if mode == 'differential' and backup.get('mode', 'full') != 'full':
+                continue
+            if not (self.backup_location / backup['backup_file']).exists():
+                continue
+            manifest = self.catalog.load_manifest(backup['backup_file'])
+            if manifest is None:
+                continue
+            backup['manifest'] = manifest
+            return backup
+        return None
+    
+    def apply_retention(self, policy: Dict[str, int], source_path: Optional[str] = None,
+                        dry_run: bool = False) -> dict:
+        """
+        Xóa backup cũ theo chính sách retention
+        
+        Args:
+            policy: {'keep_last', 'keep_daily', 'keep_weekly', 'keep_monthly'} (xem plan_retention)
+            source_path: Chỉ áp dụng cho thư mục nguồn này (None = mọi nguồn trong catalog)
+            dry_run: Chỉ in ra, không xóa
+        
+        Returns:
+            dict: {'kept', 'removed', 'freed_bytes'}
+        
+        Giải thích:
+        - Áp dụng riêng cho từng thư mục nguồn
+        - Xóa file backup, file checksum đi kèm và bản ghi trong catalog
+        """
+        stats = {'kept': 0, 'removed': [], 'freed_bytes': 0}
+        sources = [source_path] if source_path else self.catalog.sources()
+        
+        for source in sources:
+            kept, removed = plan_retention(self.catalog.list_backups(source), **policy)
+            stats['kept'] += len(kept)
+            
+            for backup in removed:
+                backup_path = self.backup_location / backup['backup_file']
+                size = backup_path.stat().st_size if backup_path.exists() else 0
+                print(f"   🗑️  {backup['backup_file']} ({format_size(size)})")
+                stats['removed'].append(backup['backup_file'])
+                stats['freed_bytes'] += size
+                if dry_run:
+                    continue
+                
+                for path in (backup_path, Path(str(backup_path) + CHECKSUM_SUFFIX)):
+                    if path.exists():
+                        path.unlink()
+                self.catalog.remove(backup['backup_file'])
+                log_info(f"Retention: đã xóa {backup['backup_file']}")
+        
+        return stats
+    
+    def iter_source(
+        self,
+        exclude_patterns: Optional[List[str]] = None,
+        yield_dirs: bool = False
+    ) -> Iterator:
+        """
+        Duyệt thư mục nguồn, bỏ qua file/thư mục bị loại trừ ngay khi quét
+        
+        Args:
+            exclude_patterns: Danh sách pattern cần loại trừ
+            yield_dirs: Có trả về cả entry thư mục không
+        
+        Yields:
+            FileEntry: Entry của từng file (và thư mục nếu yield_dirs)
+        
+        Giải thích:
+        - Thư mục bị loại trừ không được đi vào (không tốn scandir/stat)
+        """
+        for entry in scan_files(
+            str(self.source_path),
+            yield_dirs=yield_dirs,
+            skip_dir=lambda d: is_excluded(d.name, exclude_patterns)
+        ):
+            if not is_excluded(entry.name, exclude_patterns):
+                yield entry
+    
+    def build_manifest(
+        self,
+        entries: list,
+        algo: str,
+        reuse: Optional[Dict[str, list]] = None,
+        show_progress: bool = True,
+        defer_hash: bool = False,
+        hash_base: Optional[Dict[str, list]] = None
+    ) -> Dict[str, list]:
+        """
+        Lập manifest của thư mục nguồn
+        
+        Args:
+            entries: Danh sách FileEntry (file và thư mục, đã áp dụng exclude)
+            algo: Thuật toán hash
+            reuse: Manifest cũ (cùng thuật toán) để dùng lại hash
+            show_progress: Hiển thị progress bar
+            defer_hash: Để hash = None cho file mới/đã sửa, lấy hash lúc nén
+                        (xem fill_manifest_hashes)
+            hash_base: Manifest gốc so sánh theo hash (khi defer_hash): file cùng
+                       size với file trong đó vẫn được hash trước để biết có thay đổi không
+        
+        Returns:
+            dict: {đường dẫn tương đối: [size, mtime_ns, hash]}
+        
+        Giải thích:
+        - File có size và mtime giống manifest cũ -> dùng lại hash, không đọc lại
+        - Chỉ file mới/đã sửa mới phải hash, nên lần backup sau rất nhanh
+        - defer_hash: file mới/khác size chắc chắn được nén -> không đọc hai lần
+        - Thư mục được ghi với key kết thúc bằng '/' (vd: 'src/old/'), không hash
+          -> backup sau biết thư mục nào đã bị xóa
+        """
+        manifest = {}
+        to_hash = []
+        reuse = reuse or {}
+        
+        for entry in entries:
+            rel_path = Path(entry.path).relative_to(self.source_path).as_posix()
+            if entry.is_dir:
+                manifest[rel_path + '/'] = [0, 0, None]
+                continue
+            
+            record = [entry.size, entry.mtime_ns, None]
+            
+            old = reuse.get(rel_path)
+            if old and old[0] == record[0] and old[1] == record[1]:
+                record[2] = old[2]
+            elif not defer_hash:
+                to_hash.append((entry.path, record))
+            else:
+                base = (hash_base or {}).get(rel_path)
+                if base and base[2] and base[0] == record[0]:
+                    to_hash.append((entry.path, record))
+            
+            manifest[rel_path] = record
+        
+        progress = None
+        if show_progress and to_hash:
+            progress = ProgressBar(len(to_hash), prefix="Hash file:")
+        
+        for file_path, record in to_hash:
+            try:
+                record[2] = hash_file(file_path, algo)
+            except OSError as e:
+                # File bị xóa/khóa trong lúc backup: vẫn ghi nhận, hash rỗng
+                log_error(f"Không hash được {file_path}: {e}")
+                record[2] = ''
+            if progress:
+                progress.update()
+        
+        if progress:
+            progress.finish("Lập manifest hoàn thành")
+        
+        return manifest
+    
+    def fill_manifest_hashes(
+        self,
+        manifest: Dict[str, list],
+        algo: str,
+        checksums: Dict[str, List]
+    ) -> None:
+        """
+        Điền hash còn thiếu của manifest từ checksum tính lúc nén
+        
+        Args:
+            manifest: Manifest lập với defer_hash=True
+            algo: Thuật toán hash (phải trùng với thuật toán lúc nén)
+            checksums: {tên trong archive: [size, hash]} do _write_archive trả về
+        
+        Giải thích:
+        - File đã nén: dùng hash của đúng nội dung đã ghi vào archive
+        - File không có trong archive (hiếm, vd: đổi lại mtime cũ): hash riêng
+        """
+        folder_name = self.source_path.name
+        for rel_path, record in manifest.items():
+            if record[2] is not None or rel_path.endswith('/'):
+                continue
+            
+            checksum = checksums.get(f"{folder_name}/{rel_path}")
+            if checksum:
+                record[0], record[2] = checksum
+                continue
+            
+            try:
+                record[2] = hash_file(str(self.source_path / rel_path), algo)
+            except OSError as e:
+                log_error(f"Không hash được {rel_path}: {e}")
+                record[2] = ''
+    
+    @staticmethod
+    def diff_manifest(
+        manifest: Dict[str, list],
+        base_manifest: Dict[str, list],
+        compare_hash: bool = True
+    ) -> Tuple[List[str], List[str], List[str]]:
+        """
+        So sánh manifest hiện tại với manifest của backup gốc
+        
+        Args:
+            manifest: Manifest hiện tại
+            base_manifest: Manifest của backup gốc
+            compare_hash: Hai manifest dùng cùng thuật toán hash
+        
+        Returns:
+            tuple: (file/thư mục mới hoặc thay đổi, file đã bị xóa, thư mục đã bị xóa)
+        
+        Giải thích:
+        - Cùng thuật toán: so sánh theo hash (chỉ đổi mtime thì không tính là thay đổi)
+        - Khác thuật toán (vd: vừa cài xxhash) hoặc thiếu hash: so sánh size + mtime
+        - Thư mục (key kết thúc bằng '/'): chỉ xét mới/bị xóa; thư mục mới được
+          nén lại để restore đúng cả thư mục rỗng
+        - Manifest cũ chưa có thư mục: không có thư mục nào bị coi là đã xóa
+        """
+        changed = []
+        for rel_path, record in manifest.items():
+            old = base_manifest.get(rel_path)
+            if old is None:
+                changed.append(rel_path)
+            elif rel_path.endswith('/'):
+                continue
+            elif compare_hash and old[2] and record[2]:
+                if old[2] != record[2]:
+                    changed.append(rel_path)
+            elif old[0] != record[0] or old[1] != record[1]:
+                changed.append(rel_path)
+        
+        deleted = []
+        deleted_dirs = []
+        for rel_path in base_manifest:
+            if rel_path not in manifest:
+                if rel_path.endswith('/'):
+                    deleted_dirs.append(rel_path.rstrip('/'))
+                else:
+                    deleted.append(rel_path)
+        return changed, deleted, deleted_dirs
+    
+    def create_backup(
+        self,
+        compression_format: str = 'zip',
+        exclude_patterns: Optional[List[str]] = None,
+        show_progress: bool = True,
+        mode: str = 'full'
+    ) -> Tuple[bool, str, dict]:
+        """
+        Tạo backup thư mục
+        
+        Args:
+            compression_format: Định dạng nén (zip, tar, gztar, bztar, xztar)
+            exclude_patterns: Danh sách pattern cần loại trừ
+            show_progress: Hiển thị progress bar
+            mode: Kiểu backup (full, incremental, differential)
+        
+        Returns:
+            tuple: (success, backup_file_path, backup_info)
+        
+        Giải thích:
+        - Quét thư mục một lần (scandir): danh sách file, dung lượng, exclude
+        - Lập manifest (path, size, mtime, hash) cho mọi kiểu backup; hash của
+          file mới/đã sửa lấy luôn lúc nén (mỗi file chỉ đọc một lần)
+        - full: nén các file đã quét (bỏ file bị loại trừ)
+        - incremental/differential: chỉ nén file thay đổi so với backup gốc,
+          ghi lại danh sách file/thư mục đã xóa để restore đúng thời điểm
+        - Lưu metadata
+        """
+        try:
+            # Kiểm tra thư mục nguồn
+            if not self.source_path.exists():
+                return False, "", {"error": "Thư mục nguồn không tồn tại"}
+            
+            if mode not in BACKUP_MODES:
+                return False, "", {"error": f"Kiểu backup không hợp lệ: {mode}"}
+            
+            if compression_format == 'zsttar' and not ZSTD_AVAILABLE:
+                return False, "", {"error": "Định dạng zsttar cần thư viện zstandard: pip install zstandard"}
+            
+            # Tìm backup gốc
+            previous = self.find_base_backup('incremental')
+            base = None
+            if mode == 'incremental':
+                base = previous
+            elif mode == 'differential':
+                base = self.find_base_backup('differential')
+            
+            if mode != 'full' and base is None:
+                print(f"⚠️  Chưa có backup gốc, chuyển sang backup full")
+                mode = 'full'
+            
+            # Tạo tên backup
+            folder_name = self.source_path.name
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            backup_name = f"{folder_name}_backup_{timestamp}"
+            if mode != 'full':
+                backup_name += f"_{mode}"
+            
+            # Tránh ghi đè backup tạo trong cùng giây (vd: gztar và pgztar cùng đuôi .tar.gz)
+            extension = ARCHIVE_EXTENSIONS[compression_format]
+            unique_name, counter = backup_name, 1
+            while (self.backup_location / (unique_name + extension)).exists():
+                unique_name = f"{backup_name}_{counter}"
+                counter += 1
+            backup_name = unique_name
+            
+            log_info(f"Bắt đầu backup ({mode}): {self.source_path}")
+            
+            # Quét một lần: danh sách file, dung lượng và quyết định exclude
+            # (manifest và bước nén đều dùng lại kết quả này)
+            print(f"📊 Đang quét thư mục...")
+            entries = list(self.iter_source(exclude_patterns, yield_dirs=True))
+            files = [entry for entry in entries if not entry.is_dir]
+            total_size = sum(entry.size for entry in files)
+            excluded_note = " (sau khi loại trừ)" if exclude_patterns else ""
+            print(f"   {len(files)} file, {format_size(total_size)}{excluded_note}")
+            log_info(f"Dung lượng backup: {format_size(total_size)} ({len(files)} file){excluded_note}")
+            
+            # Lập manifest, dùng lại hash của backup gần nhất nếu cùng thuật toán
+            algo = get_fastest_algorithm()
+            if previous and previous.get('manifest_algo') in available_algorithms():
+                algo = previous['manifest_algo']
+            reuse = previous['manifest'] if previous and previous.get('manifest_algo') == algo else None
+            
+            compare_hash = base is not None and base.get('manifest_algo') == algo
+            print(f"\n🔍 Đang lập manifest...")
+            manifest = self.build_manifest(
+                entries, algo, reuse, show_progress, defer_hash=True,
+                hash_base=base['manifest'] if compare_hash else None
+            )
+            
+            changed = [rel_path for rel_path in manifest if not rel_path.endswith('/')]
+            checksums = {}
+            deleted = []
+            deleted_dirs = []
+            
+            if mode != 'full':
+                changed, deleted, deleted_dirs = self.diff_manifest(
+                    manifest, base['manifest'], compare_hash=compare_hash
+                )
+                changed_count = sum(1 for rel_path in changed if not rel_path.endswith('/'))
+                print(f"   Thay đổi: {changed_count} file, đã xóa: {len(deleted)} file, "
+                      f"{len(deleted_dirs)} thư mục (so với {base['backup_file']})")
+                
+                print(f"\n📦 Đang nén file thay đổi...")
+                backup_file = self._backup_files(
+                    backup_name, changed, compression_format, show_progress,
+                    sum(manifest[rel_path][0] for rel_path in changed),
+                    algo, checksums
+                )
+            else:
+                print(f"\n📦 Đang nén...")
+                backup_file = self._backup_entries(
+                    backup_name, entries, compression_format, show_progress, total_size,
+                    algo, checksums
+                )
+            
+            if not backup_file:
+                return False, "", {"error": "Lỗi khi tạo backup"}
+            
+            self.fill_manifest_hashes(manifest, algo, checksums)
+            
+            # Lấy thông tin backup
+            archived_size = sum(manifest[rel_path][0] for rel_path in changed)
+            backup_size = os.path.getsize(backup_file)
+            compression_ratio = (backup_size / archived_size * 100) if archived_size > 0 else 0
+            
+            # Tạo backup info
+            backup_info = {
+                'timestamp': timestamp,
+                'source_path': str(self.source_path),
+                'backup_file': os.path.basename(backup_file),
+                'original_size': total_size,
+                'file_count': len(files),
+                'compressed_size': backup_size,
+                'compression_ratio': compression_ratio,
+                'format': compression_format,
+                'compression_level': self.compression_level,
+                'excluded_patterns': exclude_patterns or [],
+                'mode': mode,
+                'base_backup': base['backup_file'] if base else None,
+                'archived_size': archived_size,
+                'changed_files': sum(1 for rel_path in changed if not rel_path.endswith('/')),
+                'deleted_files': deleted,
+                'deleted_dirs': deleted_dirs,
+                'manifest_algo': algo,
+                'manifest': manifest,
+                'checksum_file': os.path.basename(backup_file) + CHECKSUM_SUFFIX
+            }
+            
+            # Lưu metadata
+            self.save_backup_metadata(backup_info)
+            
+            # Hiển thị kết quả
+            print(f"\n✅ Backup thành công!")
+            print(f"   📁 Thư mục nguồn: {self.source_path}")
+            print(f"   💾 File backup: {backup_file}")
+            print(f"   🗂️  Kiểu backup: {mode}")
+            if base:
+                print(f"   🔗 Backup gốc: {base['backup_file']}")
+            print(f"   📊 Kích thước gốc: {format_size(total_size)} ({len(files)} file){excluded_note}")
+            if mode != 'full':
+                print(f"   📊 Dữ liệu thay đổi: {format_size(archived_size)} "
+                      f"({backup_info['changed_files']} file)")
+            print(f"   📊 Kích thước nén: {format_size(backup_size)}")
+            print(f"   💯 Tỷ lệ nén: {compression_ratio:.1f}%")
+            
+            log_info(f"Backup thành công: {backup_file}")
+            
+            return True, backup_file, backup_info
+        
+        except Exception as e:
+            error_msg = f"Lỗi khi backup: {e}"
+            print(f"❌ {error_msg}")
+            log_error(error_msg, exc_info=True)
+            return False, "", {"error": str(e)}
+    
+    def _backup_entries(
+        self,
+        backup_name: str,
+        entries: list,
+        compression_format: str,
+        show_progress: bool,
+        total_bytes: int = 0,
+        algo: Optional[str] = None,
+        checksums: Optional[Dict[str, List]] = None
+    ) -> Optional[str]:
+        """
+        Nén các entry đã quét (backup full)
+        
+        Args:
+            backup_name: Tên backup
+            entries: Danh sách FileEntry (file và thư mục, đã áp dụng exclude)
+            compression_format: Format nén
+            show_progress: Hiển thị progress
+            total_bytes: Tổng dung lượng các file (cho progress)
+            algo: Thuật toán hash checksum (xem _write_archive)
+            checksums: Dict nhận checksum các file đã nén (xem _write_archive)
+        
+        Returns:
+            str: Đường dẫn file backup
+        
+        Giải thích:
+        - Dùng lại kết quả quét của create_backup, không duyệt thư mục lần nữa
+        - Mỗi file chỉ được đọc một lần, ghi thẳng vào archive (không cần thư mục tạm)
+        """
+        items = (
+            (entry.path, self._relative_path(entry.path), entry.is_dir)
+            for entry in entries
+        )
+        return self._write_archive(
+            backup_name, items, compression_format, show_progress, total_bytes,
+            algo, checksums
+        )
+    
+    def _backup_files(
+        self,
+        backup_name: str,
+        rel_paths: List[str],
+        compression_format: str,
+        show_progress: bool,
+        total_bytes: int = 0,
+        algo: Optional[str] = None,
+        checksums: Optional[Dict[str, List]] = None
+    ) -> Optional[str]:
+        """
+        Nén một danh sách file (dùng cho backup incremental/differential)
+        
+        Args:
+            backup_name: Tên backup
+            rel_paths: Đường dẫn tương đối (so với thư mục nguồn) của các file cần nén,
+                       thư mục có dạng key manifest ('src/new/')
+            compression_format: Format nén
+            show_progress: Hiển thị progress
+            total_bytes: Tổng dung lượng các file (cho progress)
+            algo: Thuật toán hash checksum (xem _write_archive)
+            checksums: Dict nhận checksum các file đã nén (xem _write_archive)
+        
+        Returns:
+            str: Đường dẫn file backup
+        """
+        items = (
+            (str(self.source_path / rel_path), rel_path.rstrip('/'), rel_path.endswith('/'))
+            for rel_path in rel_paths
+        )
+        return self._write_archive(
+            backup_name, items, compression_format, show_progress, total_bytes,
+            algo, checksums
+        )
+    
+    def _relative_path(self, path: str) -> str:
+        """Đường dẫn tương đối so với thư mục nguồn (dùng '/')"""
+        return Path(os.path.relpath(path, self.source_path)).as_posix()
+    
+    def _write_archive(
+        self,
+        backup_name: str,
+        items: Iterable[Tuple[str, str, bool]],
+        compression_format: str,
+        show_progress: bool,
+        total_bytes: int = 0,
+        algo: Optional[str] = None,
+        checksums: Optional[Dict[str, List]] = None
+    ) -> Optional[str]:
+        """
+        Ghi trực tiếp file vào zipfile/tarfile (không qua thư mục tạm)
+        
+        Args:
+            backup_name: Tên backup
+            items: Iterable (đường dẫn, đường dẫn tương đối, là thư mục)
+            compression_format: Format nén
+            show_progress: Hiển thị progress
+            total_bytes: Tổng số byte dự kiến (cho progress)
+            algo: Thuật toán hash checksum (None = thuật toán nhanh nhất)
+            checksums: Dict nhận {tên trong archive: [size, hash]} của các file
+                       đã nén (None = chỉ ghi ra file checksum)
+        
+        Returns:
+            str: Đường dẫn file backup (None nếu lỗi)
+        
+        Giải thích:
+        - Tên trong archive có dạng <tên thư mục>/<đường dẫn tương đối>
+          (giống shutil.make_archive), các archive trong chuỗi incremental
+          có cùng cấu trúc nên restore chỉ cần giải nén chồng lên nhau
+        - Progress tính theo byte đã đọc, cập nhật cả khi đang nén file lớn
+        - File bị xóa/khóa trước khi mở được bỏ qua (ghi log)
+        - Hash từng file ngay khi ghi vào archive, lưu ra <file backup>.checksums.json
+          để verify sau này không cần giải nén ra đĩa
+        """
+        backup_file = str(self.backup_location / backup_name) + ARCHIVE_EXTENSIONS[compression_format]
+        folder_name = self.source_path.name
+        algo = algo or get_fastest_algorithm()
+        if checksums is None:
+            checksums = {}
+        
+        progress = ProgressBar(max(total_bytes, 1), prefix="Nén:") if show_progress else None
+        state = {'done': 0, 'last': 0.0}
+        
+        def on_read(n: int):
+            state['done'] += n
+            now = time.monotonic()
+            if now - state['last'] >= PROGRESS_INTERVAL:
+                state['last'] = now
+                progress.update(
+                    state['done'],
+                    f"{format_size(state['done'])}/{format_size(total_bytes)}"
+                )
+        
+        streams = []
+        try:
+            archive, streams = self._open_archive(backup_file, compression_format)
+            
+            with archive:
+                self._add_to_archive(archive, str(self.source_path), folder_name, True)
+                
+                for path, rel_path, is_dir in items:
+                    arcname = f"{folder_name}/{rel_path}"
+                    try:
+                        checksum = self._add_to_archive(
+                            archive, path, arcname, is_dir,
+                            on_read if progress else None, algo
+                        )
+                    except (FileNotFoundError, PermissionError) as e:
+                        log_error(f"Bỏ qua file không đọc được: {path} ({e})")
+                        continue
+                    if checksum:
+                        checksums[arcname] = checksum
+            
+            # Đóng lần lượt: bộ nén (ghi phần cuối) rồi file
+            for stream in streams:
+                stream.close()
+            
+            write_checksum_file(backup_file, algo, checksums)
+            
+            if progress:
+                progress.finish(f"Nén hoàn thành ({format_size(state['done'])})")
+            
+            return backup_file
+        except Exception as e:
+            for stream in streams:
+                try:
+                    stream.close()
+                except Exception:
+                    pass
+            
+            for path in (backup_file, backup_file + CHECKSUM_SUFFIX):
+                if os.path.exists(path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            
+            log_error(f"Lỗi khi nén: {e}")
+            return None
+    
+    def _open_archive(self, backup_file: str, compression_format: str) -> tuple:
+        """
+        Mở archive để ghi theo định dạng nén
+        
+        Args:
+            backup_file: Đường dẫn file backup
+            compression_format: Format nén
+        
+        Returns:
+            tuple: (archive, streams) - streams cần đóng theo thứ tự sau khi đóng archive
+        
+        Giải thích:
+        - zip/tar/gztar/bztar/xztar: zipfile/tarfile (một thread), có áp dụng compression_level
+        - zsttar/pgztar: tarfile ở chế độ stream ('w|') ghi qua bộ nén nhiều thread
+        """
+        level = self.compression_level
+        
+        if compression_format == 'zip':
+            return zipfile.ZipFile(backup_file, 'w', zipfile.ZIP_DEFLATED, compresslevel=level), []
+        
+        if compression_format in PARALLEL_FORMATS:
+            raw = open(backup_file, 'wb')
+            try:
+                if compression_format == 'zsttar':
+                    compressor = zstandard.ZstdCompressor(
+                        level=DEFAULT_ZSTD_LEVEL if level is None else level,
+                        threads=self.threads or -1
+                    )
+                    stream = compressor.stream_writer(raw)
+                else:
+                    stream = ParallelGzipWriter(
+                        raw, DEFAULT_GZIP_LEVEL if level is None else level, self.threads
+                    )
+                return tarfile.open(fileobj=stream, mode='w|'), [stream, raw]
+            except Exception:
+                raw.close()
+                raise
+        
+        if level is None:
+            return tarfile.open(backup_file, TAR_MODES[compression_format]), []
+        if compression_format == 'xztar':
+            return tarfile.open(backup_file, 'w:xz', preset=level), []
+        if compression_format == 'tar':
+            return tarfile.open(backup_file, 'w'), []
+        return tarfile.open(backup_file, TAR_MODES[compression_format], compresslevel=level), []
+    
+    @staticmethod
+    def _add_to_archive(
+        archive,
+        path: str,
+        arcname: str,
+        is_dir: bool,
+        on_read: Optional[Callable[[int], None]] = None,
+        algo: Optional[str] = None
+    ) -> Optional[List]:
+        """
+        Thêm một file/thư mục vào archive đang mở
+        
+        Args:
+            archive: zipfile.ZipFile hoặc tarfile.TarFile
+            path: Đường dẫn file/thư mục
+            arcname: Tên trong archive
+            is_dir: Có phải thư mục không
+            on_read: Callback nhận số byte đã đọc (None = không theo dõi)
+            algo: Thuật toán hash nội dung file (None = không hash)
+        
+        Returns:
+            list: [size, hash] của file thường khi có algo, ngược lại None
+        
+        Giải thích:
+        - stat và mở file trước khi ghi header -> lỗi mở file không làm hỏng archive
+        - Đọc theo block COPY_BUFFER_SIZE, không nạp cả file vào RAM
+        """
+        hasher = get_hasher(algo) if algo else None
+        
+        if isinstance(archive, zipfile.ZipFile):
+            if is_dir:
+                archive.write(path, arcname)
+                return None
+            
+            zinfo = zipfile.ZipInfo.from_file(path, arcname)
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+            # ZipFile.open(zinfo, 'w') không lấy compresslevel của archive cho ZipInfo tự tạo
+            # (Python 3.13+ đổi tên thuộc tính thành compress_level)
+            if hasattr(zinfo, 'compress_level'):
+                zinfo.compress_level = archive.compresslevel
+            else:
+                zinfo._compresslevel = archive.compresslevel
+            with open(path, 'rb') as src:
+                reader = _ProgressReader(src, on_read, hasher)
+                with archive.open(zinfo, 'w', force_zip64=zinfo.file_size >= zipfile.ZIP64_LIMIT) as dst:
+                    shutil.copyfileobj(reader, dst, COPY_BUFFER_SIZE)
+        else:
+            tarinfo = archive.gettarinfo(path, arcname)
+            if not tarinfo.isreg():
+                archive.addfile(tarinfo)
+                return None
+            
+            with open(path, 'rb') as src:
+                reader = _ProgressReader(src, on_read, hasher)
+                archive.addfile(tarinfo, reader)
+        
+        if hasher is None:
+            return None
+        return [reader.bytes_read, hasher.hexdigest()]
+    
+    def get_backup_chain(self, backup_file: str) -> List[dict]:
+        """
+        Lấy chuỗi backup cần áp dụng để restore một backup
+        
+        Args:
+            backup_file: File backup cần restore
+        
+        Returns:
+            list: Bản ghi metadata từ backup full đến backup được chọn
+                  (rỗng nếu backup không có trong metadata)
+        
+        Raises:
+            FileNotFoundError: Nếu thiếu backup gốc trong chuỗi
+        
+        Giải thích:
+        - Đọc catalog nằm cùng thư mục với file backup
+        - Catalog chưa được mở: mở chỉ đọc (restore không tạo file catalog mới),
+          chưa có catalog thì đọc backup_metadata.json cũ mà không chuyển đổi
+        - Lần theo base_backup cho đến backup full
+        """
+        backup_dir = Path(backup_file).resolve().parent
+        if backup_dir == self.backup_location and self._catalog is not None:
+            return self._build_chain(self._catalog.get, backup_file, backup_dir)
+        
+        if (backup_dir / CATALOG_FILE).exists():
+            with BackupCatalog(str(backup_dir / CATALOG_FILE), read_only=True) as catalog:
+                return self._build_chain(catalog.get, backup_file, backup_dir)
+        
+        legacy_file = backup_dir / LEGACY_METADATA_FILE
+        if legacy_file.exists():
+            with open(legacy_file, 'r', encoding='utf-8') as f:
+                backups = {
+                    backup_info['backup_file']: backup_info
+                    for backup_info in json.load(f).get('backups', [])
+                }
+            return self._build_chain(backups.get, backup_file, backup_dir)
+        
+        return []
+    
+    @staticmethod
+    def _build_chain(
+        lookup: Callable[[str], Optional[dict]],
+        backup_file: str,
+        backup_dir: Path
+    ) -> List[dict]:
+        """
+        Lần theo base_backup từ backup được chọn về backup full
+        
+        Args:
+            lookup: Hàm lấy bản ghi theo tên file backup
+            backup_file: File backup cần restore
+            backup_dir: Thư mục chứa các file backup
+        
+        Returns:
+            list: Bản ghi từ backup full đến backup được chọn (rỗng nếu không có bản ghi)
+        """
+        entry = lookup(os.path.basename(backup_file))
+        if entry is None:
+            return []
+        
+        chain = [entry]
+        while chain[-1].get('base_backup'):
+            base_name = chain[-1]['base_backup']
+            base = lookup(base_name)
+            if base is None or not (backup_dir / base_name).exists():
+                raise FileNotFoundError(f"Thiếu backup gốc: {base_name}")
+            chain.append(base)
+        
+        chain.reverse()
+        return chain
+    
+    def restore_backup(self, backup_file: str, restore_location: str,
+                       patterns: Optional[List[str]] = None, workers: int = 1,
+                       show_progress: bool = True) -> bool:
+        """
+        Khôi phục từ backup
+        
+        Args:
+            backup_file: File backup cần restore
+            restore_location: Vị trí restore
+            patterns: Chỉ restore các đường dẫn/glob này (None = toàn bộ)
+            workers: Số thread giải nén (zip)
+            show_progress: Hiển thị progress bar
+        
+        Returns:
+            bool: Thành công hay không
+        
+        Giải thích:
+        - Giải nén backup vào vị trí chỉ định
+        - Có patterns: zip chỉ đọc member khớp (qua central directory),
+          tar được đọc stream một lượt, không giải nén toàn bộ ra đĩa
+        - Backup incremental/differential: giải nén lần lượt backup full và
+          các backup trong chuỗi, xóa file rồi thư mục (sâu trước) đã bị xóa ở từng bước
+          -> được cây thư mục đúng thời điểm của backup được chọn
+        """
+        try:
+            chain = self.get_backup_chain(backup_file)
+            backup_dir = Path(backup_file).resolve().parent
+            
+            if len(chain) > 1:
+                print(f"🔗 Chuỗi backup gồm {len(chain)} bước:")
+                for entry in chain:
+                    print(f"   - {entry['backup_file']} ({entry.get('mode', 'full')})")
+            
+            if patterns:
+                print(f"🔎 Chỉ restore: {', '.join(patterns)}")
+            
+            steps = [(str(backup_dir / entry['backup_file']), entry) for entry in chain]
+            if not steps:
+                steps = [(backup_file, None)]
+            
+            total_files = 0
+            total_bytes = 0
+            for idx, (archive_path, entry) in enumerate(steps, 1):
+                print(f"📦 Đang giải nén ({idx}/{len(steps)}): {os.path.basename(archive_path)}")
+                file_count, byte_count = extract_archive(
+                    archive_path, restore_location, patterns, workers, show_progress
+                )
+                total_files += file_count
+                total_bytes += byte_count
+                
+                if entry and (entry.get('deleted_files') or entry.get('deleted_dirs')):
+                    folder_name = Path(entry['source_path']).name
+                    root = Path(restore_location) / folder_name
+                    for rel_path in entry.get('deleted_files', []):
+                        if not match_member(f"{folder_name}/{rel_path}", patterns):
+                            continue
+                        target = root / rel_path
+                        if target.is_file():
+                            target.unlink()
+                    
+                    # Thư mục sâu nhất trước, chỉ xóa khi đã rỗng
+                    # (không đụng tới file có sẵn ở vị trí restore)
+                    deleted_dirs = sorted(entry.get('deleted_dirs', []),
+                                          key=lambda d: d.count('/'), reverse=True)
+                    for rel_path in deleted_dirs:
+                        if not match_member(f"{folder_name}/{rel_path}", patterns):
+                            continue
+                        target = root / rel_path
+                        if target.is_dir() and not target.is_symlink():
+                            try:
+                                target.rmdir()
+                            except OSError as e:
+                                log_error(f"Không xóa được thư mục {target}: {e}")
+            
+            print(f"✅ Restore thành công vào: {restore_location} "
+                  f"({total_files} file, {format_size(total_bytes)})")
+            log_info(f"Restore thành công: {backup_file} -> {restore_location}")
+            return True
+        except Exception as e:
+            print(f"❌ Lỗi khi restore: {e}")
+            log_error(f"Lỗi restore: {e}", exc_info=True)
+            return False
+    
+    def create_repository_backup(
+        self,
+        repository: 'BackupRepository',
+        exclude_patterns: Optional[List[str]] = None,
+        show_progress: bool = True
+    ) -> Tuple[bool, str, dict]:
+        """
+        Backup vào repository khử trùng lặp (tạo một snapshot)
+        
+        Args:
+            repository: BackupRepository đích (tự tạo nếu chưa có)
+            exclude_patterns: Danh sách pattern cần loại trừ
+            show_progress: Hiển thị progress bar
+        
+        Returns:
+            tuple: (success, snapshot_id, summary)
+        
+        Giải thích:
+        - Mỗi file được cắt thành chunk theo nội dung, chunk đã có trong repository
+          không được ghi lại -> snapshot sau chỉ tốn dung lượng phần thay đổi
+        - File có size + mtime giống snapshot trước dùng lại danh sách chunk, không đọc lại
+        - Hash + nén chunk chạy song song trên thread pool (số chunk chờ có giới hạn)
+        """
+        try:
+            if not self.source_path.exists():
+                return False, "", {"error": "Thư mục nguồn không tồn tại"}
+            
+            repository.open(create=True)
+            chunker = repository.config['chunker']
+            chunk_args = (chunker['min_size'], chunker['avg_size'], chunker['max_size'])
+            
+            log_info(f"Bắt đầu backup vào repository {repository.path}: {self.source_path}")
+            
+            # Snapshot trước của cùng thư mục nguồn (để dùng lại danh sách chunk)
+            previous = repository.find_snapshot(source_path=str(self.source_path))
+            previous_files = repository.load_index(previous['id'])['files'] if previous else {}
+            known = repository.known_chunks()
+            
+            print(f"📊 Đang quét thư mục...")
+            entries = list(self.iter_source(exclude_patterns, yield_dirs=True))
+            total_size = sum(entry.size for entry in entries)
+            print(f"   {len([e for e in entries if not e.is_dir])} file, {format_size(total_size)}")
+            
+            progress = ProgressBar(max(total_size, 1), prefix="Snapshot:") if show_progress else None
+            files = {}
+            dirs = []
+            stats = {'done': 0, 'reused': 0, 'new_chunks': 0, 'new_size': 0}
+            
+            def on_stored(result: Tuple[str, int], size: int):
+                stats['done'] += size
+                if result[1]:
+                    stats['new_chunks'] += 1
+                    stats['new_size'] += result[1]
+                if progress:
+                    progress.update(stats['done'])
+            
+            with ThreadPoolExecutor(max_workers=repository.threads) as executor:
+                pending = deque()
+                
+                for entry in entries:
+                    rel_path = self._relative_path(entry.path)
+                    if entry.is_dir:
+                        dirs.append(rel_path)
+                        continue
+                    
+                    st = entry.stat
+                    old = previous_files.get(rel_path)
+                    if old and old[0] == st.st_size and old[1] == st.st_mtime_ns \
+                            and all(digest in known for digest in old[3]):
+                        files[rel_path] = [st.st_size, st.st_mtime_ns, st.st_mode, old[3]]
+                        stats['reused'] += st.st_size
+                        on_stored(('', 0), st.st_size)
+                        continue
+                    
+                    chunks = []
+                    try:
+                        with open(entry.path, 'rb') as f:
+                            for data in iter_file_chunks(f, *chunk_args):
+                                future = executor.submit(repository.store_chunk, data)
+                                chunks.append(future)
+                                pending.append((future, len(data)))
+                                
+                                while len(pending) > repository.threads * 2:
+                                    done_future, size = pending.popleft()
+                                    on_stored(done_future.result(), size)
+                    except (FileNotFoundError, PermissionError) as e:
+                        log_error(f"Bỏ qua file không đọc được: {entry.path} ({e})")
+                        continue
+                    
+                    files[rel_path] = [st.st_size, st.st_mtime_ns, st.st_mode, chunks]
+                
+                while pending:
+                    done_future, size = pending.popleft()
+                    on_stored(done_future.result(), size)
+            
+            # Đổi future thành hash
+            for record in files.values():
+                record[3] = [c if isinstance(c, str) else c.result()[0] for c in record[3]]
+            
+            if progress:
+                progress.finish("Snapshot hoàn thành")
+            
+            summary = {
+                'id': repository.new_snapshot_id(),
+                'timestamp': datetime.datetime.now().strftime("%Y%m%d_%H%M%S"),
+                'source_path': str(self.source_path),
+                'excluded_patterns': exclude_patterns or [],
+                'file_count': len(files),
+                'dir_count': len(dirs),
+                'total_size': total_size,
+                'reused_size': stats['reused'],
+                'new_chunks': stats['new_chunks'],
+                'new_size': stats['new_size'],
+                'parent': previous['id'] if previous else None
+            }
+            repository.save_snapshot(summary, {'files': files, 'dirs': dirs})
+            
+            print(f"\n✅ Snapshot thành công!")
+            print(f"   📁 Thư mục nguồn: {self.source_path}")
+            print(f"   🗄️  Repository: {repository.path}")
+            print(f"   🆔 Snapshot: {summary['id']}")
+            print(f"   📊 Dung lượng nguồn: {format_size(total_size)} ({len(files)} file)")
+            print(f"   ♻️  Dùng lại từ snapshot trước: {format_size(stats['reused'])}")
+            print(f"   💾 Dữ liệu mới ghi: {format_size(stats['new_size'])} ({stats['new_chunks']} chunk)")
+            
+            log_info(f"Snapshot thành công: {summary['id']}")
+            
+            return True, summary['id'], summary
+        
+        except Exception as e:
+            error_msg = f"Lỗi khi backup vào repository: {e}"
+            print(f"❌ {error_msg}")
+            log_error(error_msg, exc_info=True)
+            return False, "", {"error": str(e)}
+
+
+class BackupRepository:
+    """
+    Repository backup khử trùng lặp theo nội dung (content-addressed)
     
-    Mục đích: Tập trung logic backup, dễ mở rộng và maintain
+    Mục đích: Nhiều lần backup một thư mục ít thay đổi chỉ tốn dung lượng phần thay đổi
+    Lý do: Mỗi archive là một bản copy đầy đủ, 30 backup = 30 bản copy
+    
+    Cấu trúc thư mục:
+        repo.json                  Cấu hình (phiên bản, hash, tham số chunk)
+        chunks/ab/abcdef...        Chunk đã nén, tên file = hash nội dung
+        snapshots/<id>.json        Thông tin tóm tắt của từng snapshot
+        index/<id>.json.gz         Danh sách file/thư mục và chunk của snapshot
     """
     
-    def __init__(self, source_folder: str, backup_location: str):
+    def __init__(self, path: str, compression_level: Optional[int] = None, threads: int = 0):
         """
-        Khởi tạo BackupManager
+        Khởi tạo BackupRepository
         
         Args:
-            source_folder: Thư mục nguồn cần backup
-            backup_location: Vị trí lưu backup
+            path: Thư mục repository
+            compression_level: Mức nén chunk (None = mặc định zstd 3 / zlib 6)
+            threads: Số thread hash + nén chunk (0 = số CPU)
         """
-        self.source_path = Path(source_folder).resolve()
-        self.backup_location = Path(backup_location).resolve()
-        self.metadata_file = self.backup_location / "backup_metadata.json"
+        self.path = Path(path).resolve()
+        self.config_file = self.path / "repo.json"
+        self.chunks_dir = self.path / "chunks"
+        self.snapshots_dir = self.path / "snapshots"
+        self.index_dir = self.path / "index"
+        self.compression_level = compression_level
+        self.threads = threads or os.cpu_count() or 1
+        self.config = {}
+        self._known_chunks = None
+        self._lock = threading.Lock()
+    
+    def open(self, create: bool = False) -> None:
+        """
+        Mở repository (đọc repo.json)
         
-        # Đảm bảo thư mục backup tồn tại
-        ensure_directory_exists(str(self.backup_location))
+        Args:
+            create: Tạo repository mới nếu chưa có
+        
+        Raises:
+            FileNotFoundError: Nếu chưa có repository và create=False
+            ValueError: Nếu phiên bản repository không hỗ trợ
+        """
+        if self.config_file.exists():
+            with open(self.config_file, 'r', encoding='utf-8') as f:
+                self.config = json.load(f)
+            if self.config.get('version') != REPO_VERSION:
+                raise ValueError(f"Phiên bản repository không hỗ trợ: {self.config.get('version')}")
+            return
+        
+        if not create:
+            raise FileNotFoundError(f"Không tìm thấy repository: {self.path}")
+        
+        for folder in (self.chunks_dir, self.snapshots_dir, self.index_dir):
+            ensure_directory_exists(str(folder))
+        
+        self.config = {
+            'version': REPO_VERSION,
+            'hash': REPO_HASH_ALGO,
+            'chunker': {
+                'algorithm': 'fastcdc',
+                'gear_seed': GEAR_SEED,
+                'min_size': CHUNK_MIN_SIZE,
+                'avg_size': CHUNK_AVG_SIZE,
+                'max_size': CHUNK_MAX_SIZE
+            },
+            'created': datetime.datetime.now().isoformat(timespec='seconds')
+        }
+        with open(self.config_file, 'w', encoding='utf-8') as f:
+            json.dump(self.config, f, indent=2)
+    
+    def _chunk_path(self, digest: str) -> Path:
+        """Đường dẫn file của chunk (chia 256 thư mục con theo 2 ký tự đầu)"""
+        return self.chunks_dir / digest[:2] / digest
+    
+    def known_chunks(self, refresh: bool = False) -> set:
+        """
+        Tập hash các chunk đang có trong repository
+        
+        Args:
+            refresh: Quét lại thư mục chunks
+        
+        Returns:
+            set: Các hash
+        
+        Giải thích:
+        - Quét thư mục một lần, sau đó kiểm tra trùng lặp trong RAM (không stat từng chunk)
+        """
+        if self._known_chunks is None or refresh:
+            self._known_chunks = {
+                entry.name for entry in scan_files(str(self.chunks_dir))
+                if not entry.name.endswith('.tmp')
+            }
+        return self._known_chunks
+    
+    def _hash_chunk(self, data: bytes) -> str:
+        """Hash nội dung chunk theo thuật toán của repository"""
+        return hashlib.new(self.config.get('hash', REPO_HASH_ALGO), data).hexdigest()
     
-    def get_backup_metadata(self) -> dict:
+    def store_chunk(self, data: bytes) -> Tuple[str, int]:
         """
-        Đọc metadata của các backup trước
+        Lưu một chunk (bỏ qua nếu đã có)
+        
+        Args:
+            data: Nội dung chunk
         
         Returns:
-            dict: Metadata của các backup
+            tuple: (hash, số byte đã ghi thêm vào repository - 0 nếu chunk đã có)
         
         Giải thích:
-        - Lưu thông tin các lần backup (timestamp, size, file count...)
-        - Hỗ trợ incremental backup trong tương lai
+        - Nén bằng zstd (nếu có) hoặc zlib, giữ nguyên nếu nén không nhỏ hơn
+        - Ghi ra file .tmp rồi os.replace -> không có chunk ghi dở
+        - An toàn khi gọi từ nhiều thread
         """
-        if self.metadata_file.exists():
+        digest = self._hash_chunk(data)
+        known = self.known_chunks()
+        
+        with self._lock:
+            if digest in known:
+                return digest, 0
+            known.add(digest)
+        
+        try:
+            level = self.compression_level
+            if ZSTD_AVAILABLE:
+                header = CHUNK_ZSTD
+                packed = zstandard.ZstdCompressor(
+                    level=DEFAULT_ZSTD_LEVEL if level is None else level
+                ).compress(data)
+            else:
+                header = CHUNK_ZLIB
+                packed = zlib.compress(data, DEFAULT_GZIP_LEVEL if level is None else level)
+            
+            if len(packed) >= len(data):
+                header, packed = CHUNK_RAW, data
+            
+            path = self._chunk_path(digest)
+            path.parent.mkdir(exist_ok=True)
+            temp_path = path.with_name(path.name + '.tmp')
+            with open(temp_path, 'wb') as f:
+                f.write(header)
+                f.write(packed)
+            os.replace(temp_path, path)
+            
+            return digest, len(packed) + 1
+        except Exception:
+            with self._lock:
+                known.discard(digest)
+            raise
+    
+    def load_chunk(self, digest: str) -> bytes:
+        """
+        Đọc và giải nén một chunk
+        
+        Args:
+            digest: Hash của chunk
+        
+        Returns:
+            bytes: Nội dung chunk
+        
+        Raises:
+            FileNotFoundError: Nếu thiếu chunk
+            ValueError: Nếu chunk hỏng hoặc cần zstandard mà chưa cài
+        """
+        with open(self._chunk_path(digest), 'rb') as f:
+            header = f.read(1)
+            packed = f.read()
+        
+        if header == CHUNK_RAW:
+            return packed
+        if header == CHUNK_ZLIB:
+            return zlib.decompress(packed)
+        if header == CHUNK_ZSTD:
+            if not ZSTD_AVAILABLE:
+                raise ValueError("Chunk nén bằng zstd, cần cài: pip install zstandard")
+            return zstandard.ZstdDecompressor().decompress(packed)
+        raise ValueError(f"Chunk hỏng (header không hợp lệ): {digest}")
+    
+    def list_snapshots(self) -> List[dict]:
+        """
+        Danh sách snapshot (thông tin tóm tắt), cũ trước mới sau
+        
+        Returns:
+            list: Các dict tóm tắt (id, timestamp, source_path, file_count...)
+        """
+        snapshots = []
+        for entry in scan_files(str(self.snapshots_dir), extensions=['.json'], recursive=False):
             try:
-                with open(self.metadata_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception:
-                return {'backups': []}
-        return {'backups': []}
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError) as e:
+                log_error(f"Không đọc được snapshot {entry.name}: {e}")
+        
+        snapshots.sort(key=lambda s: s['id'])
+        return snapshots
     
-    def save_backup_metadata(self, backup_info: dict):
+    def find_snapshot(self, snapshot_id: Optional[str] = None,
+                      source_path: Optional[str] = None) -> Optional[dict]:
         """
-        Lưu metadata của backup mới
+        Tìm snapshot theo ID (hoặc snapshot mới nhất)
+        
+        Args:
+            snapshot_id: ID snapshot (None = mới nhất)
+            source_path: Chỉ xét snapshot của thư mục nguồn này
+        
+        Returns:
+            dict: Thông tin tóm tắt (None nếu không có)
+        """
+        for snapshot in reversed(self.list_snapshots()):
+            if source_path and snapshot.get('source_path') != source_path:
+                continue
+            if snapshot_id is None or snapshot['id'] == snapshot_id:
+                return snapshot
+        return None
+    
+    def load_index(self, snapshot_id: str) -> dict:
+        """
+        Đọc index của snapshot
         
         Args:
-            backup_info: Thông tin backup (timestamp, size, path...)
+            snapshot_id: ID snapshot
         
-        Giải thích:
-        - Append backup info vào metadata file
-        - Giúp tracking lịch sử backup
+        Returns:
+            dict: {'files': {path: [size, mtime_ns, mode, [chunk...]]}, 'dirs': [path...]}
         """
-        metadata = self.get_backup_metadata()
-        metadata['backups'].append(backup_info)
-        
-        # Giữ tối đa 50 records gần nhất
-        if len(metadata['backups']) > 50:
-            metadata['backups'] = metadata['backups'][-50:]
-        
-        with open(self.metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, indent=2, ensure_ascii=False)
+        with gzip.open(self.index_dir / f"{snapshot_id}.json.gz", 'rt', encoding='utf-8') as f:
+            return json.load(f)
     
-    def list_previous_backups(self) -> List[dict]:
+    def save_snapshot(self, summary: dict, index: dict) -> None:
         """
-        Liệt kê các backup trước
+        Ghi snapshot: index trước, tóm tắt sau (snapshot chỉ xuất hiện khi đã đầy đủ)
         
-        Returns:
-            list: Danh sách backup info
+        Args:
+            summary: Thông tin tóm tắt
+            index: Danh sách file/thư mục và chunk
         """
-        metadata = self.get_backup_metadata()
-        return metadata.get('backups', [])
+        snapshot_id = summary['id']
+        
+        index_path = self.index_dir / f"{snapshot_id}.json.gz"
+        temp_path = index_path.with_name(index_path.name + '.tmp')
+        with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+            json.dump(index, f, separators=(',', ':'), ensure_ascii=False)
+        os.replace(temp_path, index_path)
+        
+        summary_path = self.snapshots_dir / f"{snapshot_id}.json"
+        temp_path = summary_path.with_name(summary_path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        os.replace(temp_path, summary_path)
     
-    def create_backup(
-        self,
-        compression_format: str = 'zip',
-        exclude_patterns: Optional[List[str]] = None,
-        show_progress: bool = True
-    ) -> Tuple[bool, str, dict]:
+    def delete_snapshot(self, snapshot_id: str) -> None:
+        """Xóa snapshot (chunk chỉ được xóa khi prune)"""
+        for path in (self.snapshots_dir / f"{snapshot_id}.json",
+                     self.index_dir / f"{snapshot_id}.json.gz"):
+            if path.exists():
+                path.unlink()
+    
+    def new_snapshot_id(self) -> str:
+        """ID snapshot theo thời gian, thêm hậu tố nếu trùng"""
+        base = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        snapshot_id, counter = base, 1
+        while (self.snapshots_dir / f"{snapshot_id}.json").exists():
+            snapshot_id = f"{base}_{counter}"
+            counter += 1
+        return snapshot_id
+    
+    def restore(self, snapshot_id: str, restore_location: str, show_progress: bool = True,
+                patterns: Optional[List[str]] = None) -> dict:
         """
-        Tạo backup thư mục
+        Khôi phục snapshot
         
         Args:
-            compression_format: Định dạng nén (zip, tar, gztar, bztar, xztar)
-            exclude_patterns: Danh sách pattern cần loại trừ
+            snapshot_id: ID snapshot
+            restore_location: Vị trí restore (tạo <vị trí>/<tên thư mục nguồn>)
             show_progress: Hiển thị progress bar
+            patterns: Chỉ restore các đường dẫn/glob này (None = toàn bộ)
         
         Returns:
-            tuple: (success, backup_file_path, backup_info)
+            dict: {'files', 'bytes', 'errors'}
         
         Giải thích:
-        - Tính dung lượng thư mục nguồn
-        - Copy file với exclude patterns
-        - Nén thành archive
-        - Lưu metadata
+        - Ghép lại từng file từ các chunk, khôi phục mtime và quyền file
+        - Lỗi ở một file (thiếu/hỏng chunk) không dừng cả quá trình
+        - Có patterns: chỉ đọc chunk của các file khớp
         """
-        try:
-            # Kiểm tra thư mục nguồn
-            if not self.source_path.exists():
-                return False, "", {"error": "Thư mục nguồn không tồn tại"}
-            
-            # Tạo tên backup
-            folder_name = self.source_path.name
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_name = f"{folder_name}_backup_{timestamp}"
-            
-            log_info(f"Bắt đầu backup: {self.source_path}")
-            
-            # Tính dung lượng (với progress)
-            print(f"📊 Đang tính dung lượng...")
-            total_size = get_folder_size(str(self.source_path))
-            print(f"   Dung lượng: {format_size(total_size)}")
-            log_info(f"Dung lượng nguồn: {format_size(total_size)}")
-            
-            # Nếu có exclude patterns
-            if exclude_patterns:
-                print(f"\n📦 Đang copy và loại trừ...")
-                backup_file = self._backup_with_exclude(
-                    backup_name, exclude_patterns, compression_format, show_progress
-                )
-            else:
-                print(f"\n📦 Đang nén...")
-                backup_file = self._backup_full(
-                    backup_name, compression_format, show_progress
-                )
-            
-            if not backup_file:
-                return False, "", {"error": "Lỗi khi tạo backup"}
-            
-            # Lấy thông tin backup
-            backup_size = os.path.getsize(backup_file)
-            compression_ratio = (backup_size / total_size * 100) if total_size > 0 else 0
-            
-            # Tạo backup info
-            backup_info = {
-                'timestamp': timestamp,
-                'source_path': str(self.source_path),
-                'backup_file': os.path.basename(backup_file),
-                'original_size': total_size,
-                'compressed_size': backup_size,
-                'compression_ratio': compression_ratio,
-                'format': compression_format,
-                'excluded_patterns': exclude_patterns or []
-            }
-            
-            # Lưu metadata
-            self.save_backup_metadata(backup_info)
-            
-            # Hiển thị kết quả
-            print(f"\n✅ Backup thành công!")
-            print(f"   📁 Thư mục nguồn: {self.source_path}")
-            print(f"   💾 File backup: {backup_file}")
-            print(f"   📊 Kích thước gốc: {format_size(total_size)}")
-            print(f"   📊 Kích thước nén: {format_size(backup_size)}")
-            print(f"   💯 Tỷ lệ nén: {compression_ratio:.1f}%")
-            
-            log_info(f"Backup thành công: {backup_file}")
-            
-            return True, backup_file, backup_info
-            
-        except Exception as e:
-            error_msg = f"Lỗi khi backup: {e}"
-            print(f"❌ {error_msg}")
-            log_error(error_msg, exc_info=True)
-            return False, "", {"error": str(e)}
+        summary = self.find_snapshot(snapshot_id)
+        if summary is None:
+            raise FileNotFoundError(f"Không tìm thấy snapshot: {snapshot_id}")
+        
+        index = self.load_index(snapshot_id)
+        folder_name = Path(summary['source_path']).name
+        root = Path(restore_location) / folder_name
+        root.mkdir(parents=True, exist_ok=True)
+        for rel_path in index.get('dirs', []):
+            if match_member(f"{folder_name}/{rel_path}", patterns):
+                (root / rel_path).mkdir(parents=True, exist_ok=True)
+        
+        files = {
+            rel_path: record for rel_path, record in index.get('files', {}).items()
+            if match_member(f"{folder_name}/{rel_path}", patterns)
+        }
+        total_bytes = sum(record[0] for record in files.values())
+        progress = ProgressBar(max(total_bytes, 1), prefix="Restore:") if show_progress else None
+        stats = {'files': 0, 'bytes': 0, 'errors': []}
+        
+        for rel_path, (size, mtime_ns, mode, chunks) in files.items():
+            target = root / rel_path
+            try:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                with open(target, 'wb') as f:
+                    for digest in chunks:
+                        data = self.load_chunk(digest)
+                        f.write(data)
+                        stats['bytes'] += len(data)
+                        if progress:
+                            progress.update(stats['bytes'])
+                os.chmod(target, mode & 0o7777)
+                os.utime(target, ns=(mtime_ns, mtime_ns))
+                stats['files'] += 1
+            except Exception as e:
+                stats['errors'].append(f"{rel_path}: {e}")
+                log_error(f"Lỗi restore {rel_path}: {e}")
+        
+        if progress:
+            progress.finish(f"Restore hoàn thành ({format_size(stats['bytes'])})")
+        
+        return stats
     
-    def _backup_full(
-        self,
-        backup_name: str,
-        compression_format: str,
-        show_progress: bool
-    ) -> Optional[str]:
+    def _referenced_chunks(self, snapshots: List[dict]) -> set:
+        """Tập hash các chunk được snapshot tham chiếu (lỗi đọc index -> raise)"""
+        referenced = set()
+        for snapshot in snapshots:
+            for record in self.load_index(snapshot['id']).get('files', {}).values():
+                referenced.update(record[3])
+        return referenced
+    
+    def prune(self, keep_last: Optional[int] = None) -> dict:
         """
-        Backup toàn bộ không có exclude
+        Xóa snapshot cũ (tùy chọn) và dọn các chunk không còn được tham chiếu
         
         Args:
-            backup_name: Tên backup
-            compression_format: Format nén
-            show_progress: Hiển thị progress
+            keep_last: Giữ N snapshot gần nhất của mỗi thư mục nguồn (None = không xóa snapshot)
         
         Returns:
-            str: Đường dẫn file backup
+            dict: {'removed_snapshots', 'removed_chunks', 'freed_bytes'}
         
         Giải thích:
-        - Sử dụng shutil.make_archive cho backup nhanh
-        - Không cần copy trung gian
+        - Đọc index của mọi snapshot còn lại trước, chỉ xóa chunk khi đọc thành công hết
+          (index lỗi -> dừng, không xóa nhầm dữ liệu)
+        - Không chạy prune khi đang có backup vào cùng repository
         """
-        backup_file_base = self.backup_location / backup_name
+        snapshots = self.list_snapshots()
+        removed_snapshots = []
         
-        try:
-            backup_file = shutil.make_archive(
-                str(backup_file_base),
-                compression_format,
-                self.source_path.parent,
-                self.source_path.name
-            )
-            return backup_file
-        except Exception as e:
-            log_error(f"Lỗi khi nén: {e}")
-            return None
+        if keep_last is not None:
+            by_source = {}
+            for snapshot in snapshots:
+                by_source.setdefault(snapshot.get('source_path'), []).append(snapshot)
+            for group in by_source.values():
+                old = group[:-keep_last] if keep_last > 0 else group
+                removed_snapshots.extend(s['id'] for s in old)
+        
+        remaining = [s for s in snapshots if s['id'] not in removed_snapshots]
+        referenced = self._referenced_chunks(remaining)
+        
+        for snapshot_id in removed_snapshots:
+            self.delete_snapshot(snapshot_id)
+        
+        removed_chunks = 0
+        freed_bytes = 0
+        for entry in scan_files(str(self.chunks_dir)):
+            digest = entry.name
+            if digest.endswith('.tmp') or digest not in referenced:
+                try:
+                    os.remove(entry.path)
+                    removed_chunks += 1
+                    freed_bytes += entry.size
+                except OSError as e:
+                    log_error(f"Không xóa được chunk {digest}: {e}")
+        
+        self._known_chunks = None
+        
+        return {
+            'removed_snapshots': removed_snapshots,
+            'removed_chunks': removed_chunks,
+            'freed_bytes': freed_bytes
+        }
     
-    def _backup_with_exclude(
-        self,
-        backup_name: str,
-        exclude_patterns: List[str],
-        compression_format: str,
-        show_progress: bool
-    ) -> Optional[str]:
+    def check(self, read_data: bool = False, show_progress: bool = True) -> dict:
         """
-        Backup với exclude patterns
+        Kiểm tra tính toàn vẹn của repository
         
         Args:
-            backup_name: Tên backup
-            exclude_patterns: Danh sách patterns cần loại trừ
-            compression_format: Format nén
-            show_progress: Hiển thị progress
+            read_data: Đọc lại mọi chunk, giải nén và so sánh hash
+            show_progress: Hiển thị progress bar (khi read_data)
         
         Returns:
-            str: Đường dẫn file backup
+            dict: {'snapshots', 'chunks', 'errors'}
         
         Giải thích:
-        - Copy file vào thư mục tạm với ignore patterns
-        - Nén thư mục tạm
-        - Xóa thư mục tạm
+        - Luôn kiểm tra: index đọc được, mọi chunk được tham chiếu đều tồn tại
+        - read_data: kiểm tra nội dung bằng nhiều thread (zlib/zstd/hashlib nhả GIL)
         """
-        temp_folder = self.backup_location / f"temp_{backup_name}"
+        errors = []
+        known = self.known_chunks(refresh=True)
+        referenced = set()
+        snapshots = self.list_snapshots()
         
-        try:
-            # Hàm ignore patterns
-            def ignore_patterns(directory, contents):
-                ignored = set()
-                for pattern in exclude_patterns:
-                    for item in contents:
-                        # Khớp pattern trong tên file/folder
-                        if pattern.lower() in item.lower():
-                            ignored.add(item)
-                return ignored
-            
-            # Copy với progress
-            if show_progress:
-                # Đếm số file để hiển thị progress
-                total_files = sum(1 for _ in self.source_path.rglob('*') if _.is_file())
-                progress = ProgressBar(total_files, prefix="Copy file:")
-                
-                # Custom copytree với callback
-                self._copytree_with_progress(
-                    self.source_path,
-                    temp_folder,
-                    ignore=ignore_patterns,
-                    progress=progress
-                )
-                progress.finish("Copy hoàn thành")
-            else:
-                shutil.copytree(self.source_path, temp_folder, ignore=ignore_patterns)
-            
-            # Nén thư mục tạm
-            backup_file = shutil.make_archive(
-                str(self.backup_location / backup_name),
-                compression_format,
-                temp_folder.parent,
-                temp_folder.name
-            )
-            
-            # Xóa thư mục tạm
-            shutil.rmtree(temp_folder)
+        for snapshot in snapshots:
+            try:
+                index = self.load_index(snapshot['id'])
+            except Exception as e:
+                errors.append(f"Snapshot {snapshot['id']}: không đọc được index ({e})")
+                continue
             
-            return backup_file
+            missing = set()
+            for record in index.get('files', {}).values():
+                referenced.update(record[3])
+                missing.update(d for d in record[3] if d not in known)
+            if missing:
+                errors.append(f"Snapshot {snapshot['id']}: thiếu {len(missing)} chunk")
+        
+        if read_data:
+            to_read = sorted(referenced & known)
+            progress = ProgressBar(len(to_read), prefix="Kiểm tra chunk:") if show_progress and to_read else None
             
-        except Exception as e:
-            # Cleanup thư mục tạm nếu lỗi
-            if temp_folder.exists():
+            def verify(digest: str) -> Optional[str]:
                 try:
-                    shutil.rmtree(temp_folder)
-                except Exception:
-                    pass
+                    if self._hash_chunk(self.load_chunk(digest)) != digest:
+                        return f"Chunk {digest}: sai hash"
+                except Exception as e:
+                    return f"Chunk {digest}: {e}"
+                return None
             
-            log_error(f"Lỗi khi backup với exclude: {e}")
-            return None
-    
-    def _copytree_with_progress(
-        self,
-        src: Path,
-        dst: Path,
-        ignore=None,
-        progress: Optional[ProgressBar] = None
-    ):
-        """
-        Copy tree với progress tracking
-        
-        Args:
-            src: Source path
-            dst: Destination path
-            ignore: Ignore function
-            progress: Progress bar instance
-        
-        Giải thích:
-        - Custom implementation của copytree
-        - Cập nhật progress sau mỗi file copy
-        """
-        dst.mkdir(parents=True, exist_ok=True)
+            with ThreadPoolExecutor(max_workers=self.threads) as executor:
+                for error in executor.map(verify, to_read):
+                    if error:
+                        errors.append(error)
+                    if progress:
+                        progress.update()
+            
+            if progress:
+                progress.finish("Kiểm tra chunk hoàn thành")
         
-        for item in src.iterdir():
-            s = src / item.name
-            d = dst / item.name
+        return {'snapshots': len(snapshots), 'chunks': len(referenced), 'errors': errors}
+
+
+def print_archive_contents(backup_file: str, patterns: Optional[List[str]] = None) -> bool:
+    """
+    Hiển thị nội dung file backup (không giải nén)
+    
+    Args:
+        backup_file: File backup
+        patterns: Chỉ hiển thị các đường dẫn/glob này (None = toàn bộ)
+    
+    Returns:
+        bool: Thành công hay không
+    """
+    try:
+        members = [m for m in list_archive(backup_file) if match_member(m[0], patterns)]
+    except Exception as e:
+        print(f"❌ Không đọc được file backup: {e}")
+        log_error(f"Lỗi đọc {backup_file}: {e}", exc_info=True)
+        return False
+    
+    total_size = 0
+    file_count = 0
+    for name, size, is_dir in members:
+        if is_dir:
+            print(f"   {'<DIR>':>10}  {name}")
+        else:
+            print(f"   {format_size(size):>10}  {name}")
+            total_size += size
+            file_count += 1
+    
+    print(f"\n📊 {file_count} file, {format_size(total_size)}")
+    return True
+
+
+def verify_backups(paths: List[str], workers: int = 1) -> bool:
+    """
+    Kiểm tra toàn vẹn nhiều file backup, in kết quả và tốc độ
+    
+    Args:
+        paths: File backup hoặc thư mục chứa backup
+        workers: Số thread
+    
+    Returns:
+        bool: True nếu mọi archive đều hợp lệ
+    
+    Giải thích:
+    - Nhiều archive: mỗi thread kiểm tra một archive (tar không đọc song song được)
+    - Một archive zip: các thread đọc song song các file trong archive
+    """
+    archives = find_backup_archives(paths)
+    if not archives:
+        print("❌ Không tìm thấy file backup nào")
+        return False
+    
+    print(f"🔍 Kiểm tra {len(archives)} archive ({workers} thread)...\n")
+    start = time.perf_counter()
+    per_archive_workers = workers if len(archives) == 1 else 1
+    
+    def run(backup_file: str) -> dict:
+        try:
+            return verify_archive(backup_file, per_archive_workers)
+        except Exception as e:
+            return {'files': 0, 'bytes': 0, 'seconds': 0.0, 'archive_size': 0,
+                    'has_checksums': False, 'mismatched': [], 'missing': [],
+                    'unexpected': [], 'errors': [str(e)]}
+    
+    total = {'files': 0, 'bytes': 0, 'archive_size': 0, 'failed': 0}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(archives)))) as executor:
+        for backup_file, stats in zip(archives, executor.map(run, archives)):
+            name = os.path.basename(backup_file)
+            problems = stats['mismatched'] + stats['missing'] + stats['unexpected'] + stats['errors']
+            speed = stats['bytes'] / (1024 * 1024) / stats['seconds'] if stats['seconds'] else 0
             
-            # Check ignore
-            if ignore:
-                ignored = ignore(str(src), [item.name])
-                if item.name in ignored:
-                    continue
+            total['files'] += stats['files']
+            total['bytes'] += stats['bytes']
+            total['archive_size'] += stats['archive_size']
             
-            if s.is_dir():
-                self._copytree_with_progress(s, d, ignore, progress)
+            if problems:
+                total['failed'] += 1
+                print(f"❌ {name}: {len(stats['mismatched'])} sai checksum, "
+                      f"{len(stats['missing'])} thiếu, {len(stats['unexpected'])} thừa, "
+                      f"{len(stats['errors'])} lỗi đọc")
+                for label, items in (("Sai checksum", stats['mismatched']), ("Thiếu", stats['missing']),
+                                     ("Thừa", stats['unexpected']), ("Lỗi", stats['errors'])):
+                    for item in items[:5]:
+                        print(f"   {label}: {item}")
+                log_error(f"Verify lỗi: {backup_file}")
             else:
-                shutil.copy2(str(s), str(d))
-                if progress:
-                    progress.update()
+                note = "" if stats['has_checksums'] else " (không có file checksum, chỉ kiểm tra CRC)"
+                print(f"✅ {name}: {stats['files']} file, {format_size(stats['bytes'])}, "
+                      f"{speed:.1f} MB/s{note}")
     
-    def restore_backup(self, backup_file: str, restore_location: str) -> bool:
-        """
-        Khôi phục từ backup
+    elapsed = time.perf_counter() - start
+    mb = 1024 * 1024
+    print(f"\n📊 {len(archives) - total['failed']}/{len(archives)} archive hợp lệ, "
+          f"{total['files']} file, {format_size(total['bytes'])} trong {elapsed:.2f}s")
+    if elapsed:
+        print(f"   Tốc độ: {total['bytes'] / mb / elapsed:.1f} MB/s dữ liệu, "
+              f"{total['archive_size'] / mb / elapsed:.1f} MB/s archive")
+    
+    log_info(f"Verify {len(archives)} archive, {total['failed']} lỗi")
+    return total['failed'] == 0
+
+
+def print_snapshots(repository: BackupRepository) -> List[dict]:
+    """
+    Hiển thị danh sách snapshot của repository
+    
+    Returns:
+        list: Danh sách snapshot (cũ trước mới sau)
+    """
+    snapshots = repository.list_snapshots()
+    if not snapshots:
+        print("Repository chưa có snapshot nào.")
+        return snapshots
+    
+    print(f"\n===== SNAPSHOT ({len(snapshots)}) =====")
+    for snapshot in snapshots:
+        print(f"\n🆔 {snapshot['id']}")
+        print(f"   Nguồn: {snapshot['source_path']}")
+        print(f"   {snapshot['file_count']} file, {format_size(snapshot['total_size'])}")
+        print(f"   Dữ liệu mới: {format_size(snapshot['new_size'])} ({snapshot['new_chunks']} chunk)")
+    
+    return snapshots
+
+
+def run_repository_command(
+    repository: BackupRepository,
+    command: str,
+    source: Optional[str] = None,
+    exclude_patterns: Optional[List[str]] = None,
+    snapshot_id: Optional[str] = None,
+    restore_location: str = './restored',
+    keep_last: Optional[int] = None,
+    read_data: bool = False,
+    show_progress: bool = True,
+    patterns: Optional[List[str]] = None
+) -> bool:
+    """
+    Chạy một lệnh của repository (dùng chung cho CLI và interactive)
+    
+    Args:
+        repository: BackupRepository
+        command: backup, list, restore, prune, check
+        source: Thư mục nguồn (lệnh backup)
+        exclude_patterns: Pattern loại trừ (lệnh backup)
+        snapshot_id: Snapshot cần restore (None = mới nhất)
+        restore_location: Vị trí restore
+        keep_last: prune: giữ N snapshot gần nhất của mỗi thư mục nguồn
+        read_data: check: đọc lại và kiểm tra hash mọi chunk
+        show_progress: Hiển thị progress bar
+        patterns: restore: chỉ restore các đường dẫn/glob này
+    
+    Returns:
+        bool: Thành công hay không
+    """
+    try:
+        if command == 'backup':
+            manager = BackupManager(source, str(repository.path))
+            success, _, _ = manager.create_repository_backup(
+                repository, exclude_patterns, show_progress
+            )
+            return success
         
-        Args:
-            backup_file: File backup cần restore
-            restore_location: Vị trí restore
+        repository.open()
         
-        Returns:
-            bool: Thành công hay không
+        if command == 'list':
+            print_snapshots(repository)
+            return True
         
-        Giải thích:
-        - Giải nén backup vào vị trí chỉ định
-        - Hỗ trợ restore từ các backup cũ
-        """
-        try:
-            print(f"📦 Đang giải nén...")
-            shutil.unpack_archive(backup_file, restore_location)
-            print(f"✅ Restore thành công vào: {restore_location}")
-            log_info(f"Restore thành công: {backup_file} -> {restore_location}")
+        if command == 'restore':
+            snapshot = repository.find_snapshot(snapshot_id)
+            if snapshot is None:
+                print(f"❌ Không tìm thấy snapshot: {snapshot_id or '(mới nhất)'}")
+                return False
+            
+            print(f"📦 Restore snapshot {snapshot['id']} -> {restore_location}")
+            stats = repository.restore(snapshot['id'], restore_location, show_progress, patterns)
+            print(f"✅ Đã restore {stats['files']} file ({format_size(stats['bytes'])})")
+            for error in stats['errors'][:10]:
+                print(f"   ❌ {error}")
+            return not stats['errors']
+        
+        if command == 'prune':
+            stats = repository.prune(keep_last)
+            print(f"✅ Prune hoàn thành")
+            print(f"   Snapshot đã xóa: {len(stats['removed_snapshots'])}")
+            print(f"   Chunk đã xóa: {stats['removed_chunks']} ({format_size(stats['freed_bytes'])})")
             return True
-        except Exception as e:
-            print(f"❌ Lỗi khi restore: {e}")
-            log_error(f"Lỗi restore: {e}", exc_info=True)
-            return False
+        
+        if command == 'check':
+            stats = repository.check(read_data, show_progress)
+            print(f"🔍 {stats['snapshots']} snapshot, {stats['chunks']} chunk được tham chiếu")
+            if stats['errors']:
+                print(f"❌ Phát hiện {len(stats['errors'])} lỗi:")
+                for error in stats['errors'][:20]:
+                    print(f"   - {error}")
+                return False
+            print(f"✅ Repository toàn vẹn" + (" (đã đọc lại toàn bộ dữ liệu)" if read_data else ""))
+            return True
+        
+        print(f"❌ Lệnh không hợp lệ: {command}")
+        return False
+    except Exception as e:
+        print(f"❌ Lỗi: {e}")
+        log_error(f"Lỗi repository ({command}): {e}", exc_info=True)
+        return False
+
+
+def repository_interactive():
+    """
+    Menu repository khử trùng lặp (chế độ interactive)
+    """
+    print("\n===== REPOSITORY KHỬ TRÙNG LẶP =====")
+    print("1. Backup vào repository (tạo snapshot)")
+    print("2. Xem danh sách snapshot")
+    print("3. Restore snapshot")
+    print("4. Prune (xóa snapshot cũ, dọn chunk không dùng)")
+    print("5. Kiểm tra toàn vẹn")
+    
+    choice = get_user_input("Chọn chức năng (1-5)", default="1")
+    command = {"1": "backup", "2": "list", "3": "restore", "4": "prune", "5": "check"}.get(choice)
+    if command is None:
+        print("❌ Lựa chọn không hợp lệ!")
+        return
+    
+    repo_input = normalize_path(get_user_input("Nhập đường dẫn repository"))
+    repository = BackupRepository(repo_input)
+    options = {}
+    
+    if command == 'backup':
+        source_input = normalize_path(get_user_input("Nhập đường dẫn thư mục cần backup"))
+        if not os.path.isdir(source_input):
+            print(f"❌ Thư mục không tồn tại: {source_input}")
+            return
+        exclude_input = get_user_input("Nhập các pattern cần loại trừ (Enter để bỏ qua)", default="")
+        options['source'] = source_input
+        options['exclude_patterns'] = [p.strip() for p in exclude_input.split(',') if p.strip()]
+    elif command == 'restore':
+        repository.open()
+        if not print_snapshots(repository):
+            return
+        options['snapshot_id'] = get_user_input("\nNhập ID snapshot (Enter = mới nhất)", default="") or None
+        options['restore_location'] = get_user_input("Nhập vị trí restore", default="./restored")
+        include_input = get_user_input("Chỉ restore các đường dẫn/glob (phân cách dấu phẩy, Enter = toàn bộ)", default="")
+        options['patterns'] = [p.strip() for p in include_input.split(',') if p.strip()] or None
+    elif command == 'prune':
+        keep_input = get_user_input("Giữ bao nhiêu snapshot gần nhất mỗi thư mục (Enter = không xóa snapshot)", default="")
+        options['keep_last'] = int(keep_input) if keep_input.isdigit() else None
+        if not confirm_action("Bắt đầu prune?", require_yes=True):
+            print("❌ Đã hủy")
+            return
+    elif command == 'check':
+        options['read_data'] = confirm_action("Đọc lại và kiểm tra toàn bộ dữ liệu (chậm hơn)?")
+    
+    run_repository_command(repository, command, **options)
+
+
+def print_retention_result(stats: dict, dry_run: bool) -> None:
+    """In kết quả apply_retention"""
+    action = "sẽ xóa" if dry_run else "đã xóa"
+    print(f"\n📊 Giữ {stats['kept']} backup, {action} {len(stats['removed'])} backup "
+          f"({format_size(stats['freed_bytes'])})")
+
+
+def retention_interactive():
+    """
+    Dọn backup cũ theo chính sách retention (interactive)
+    
+    Giải thích:
+    - Xem trước danh sách sẽ xóa, xác nhận rồi mới xóa
+    """
+    backup_location = normalize_path(get_user_input("Nhập thư mục chứa backup", default="./backups"))
+    if not os.path.isdir(backup_location):
+        print(f"❌ Thư mục không tồn tại: {backup_location}")
+        return
+    
+    policy = {}
+    for key, label in (('keep_last', "Giữ N backup gần nhất"),
+                       ('keep_daily', "Giữ 1 backup/ngày cho N ngày"),
+                       ('keep_weekly', "Giữ 1 backup/tuần cho N tuần"),
+                       ('keep_monthly', "Giữ 1 backup/tháng cho N tháng")):
+        value = get_user_input(f"{label} (Enter = 0)", default="0")
+        policy[key] = int(value) if value.isdigit() else 0
+    
+    if not any(policy.values()):
+        print("❌ Chưa chọn quy tắc nào, không xóa gì")
+        return
+    
+    manager = BackupManager(".", backup_location)
+    print("\n===== XEM TRƯỚC =====")
+    stats = manager.apply_retention(policy, dry_run=True)
+    print_retention_result(stats, dry_run=True)
+    
+    if not stats['removed'] or not confirm_action("Xóa các backup trên?", require_yes=True):
+        return
+    
+    stats = manager.apply_retention(policy)
+    print_retention_result(stats, dry_run=False)
 
 
 def main_interactive():
@@ -385,14 +2937,30 @@ def main_interactive():
     print("1. Tạo backup mới")
     print("2. Xem lịch sử backup")
     print("3. Restore từ backup")
+    print("4. Repository khử trùng lặp (snapshot)")
+    print("5. Kiểm tra toàn vẹn backup")
+    print("6. Dọn backup cũ (retention)")
     print("0. Thoát")
     
-    choice = get_user_input("\nChọn chức năng (0-3)", default="1")
+    choice = get_user_input("\nChọn chức năng (0-6)", default="1")
     
     if choice == "0":
         print("Thoát chương trình.")
         return
     
+    if choice == "4":
+        repository_interactive()
+        return
+    
+    if choice == "5":
+        path_input = normalize_path(get_user_input("Nhập file backup hoặc thư mục chứa backup"))
+        verify_backups([path_input], os.cpu_count() or 1)
+        return
+    
+    if choice == "6":
+        retention_interactive()
+        return
+    
     # Nhập thư mục nguồn
     print("💡 Mẹo: Bạn có thể kéo thả thư mục vào terminal để nhập đường dẫn")
     source_input_raw = get_user_input("Nhập đường dẫn thư mục cần backup")
@@ -428,18 +2996,32 @@ def main_interactive():
         print("2. TAR")
         print("3. TAR.GZ (nén cao hơn)")
         print("4. TAR.BZ2 (nén cao nhất, chậm hơn)")
+        print("5. TAR.GZ nhiều thread (kiểu pigz)")
+        if ZSTD_AVAILABLE:
+            print("6. TAR.ZST nhiều thread (nhanh, nén tốt)")
         
-        format_choice = get_user_input("Chọn định dạng (1-4, Enter để mặc định ZIP)", default="1")
+        format_choice = get_user_input("Chọn định dạng (1-6, Enter để mặc định ZIP)", default="1")
         
         format_map = {
             "1": "zip",
             "2": "tar",
             "3": "gztar",
-            "4": "bztar"
+            "4": "bztar",
+            "5": "pgztar",
+            "6": "zsttar"
         }
         
         compression = format_map.get(format_choice, "zip")
         
+        # Kiểu backup
+        print("\n===== KIỂU BACKUP =====")
+        print("1. Full (toàn bộ thư mục)")
+        print("2. Incremental (chỉ file thay đổi so với backup gần nhất)")
+        print("3. Differential (chỉ file thay đổi so với backup full gần nhất)")
+        
+        backup_mode_choice = get_user_input("Chọn kiểu backup (1-3)", default="1")
+        backup_mode = {"1": "full", "2": "incremental", "3": "differential"}.get(backup_mode_choice, "full")
+        
         # Exclude patterns
         exclude_patterns = None
         if mode == "2":
@@ -462,7 +3044,8 @@ def main_interactive():
         success, backup_file, info = manager.create_backup(
             compression_format=compression,
             exclude_patterns=exclude_patterns,
-            show_progress=True
+            show_progress=True,
+            mode=backup_mode
         )
         
         if success:
@@ -471,15 +3054,18 @@ def main_interactive():
     elif choice == "2":
         # Xem lịch sử backup
         print("\n===== LỊCH SỬ BACKUP =====")
-        backups = manager.list_previous_backups()
+        backups = manager.list_previous_backups(limit=10)  # 10 backup gần nhất
         
         if not backups:
             print("Chưa có backup nào.")
             return
         
-        for idx, backup in enumerate(backups[-10:], 1):  # 10 backup gần nhất
+        for idx, backup in enumerate(backups, 1):
             print(f"\n{idx}. {backup['timestamp']}")
             print(f"   File: {backup['backup_file']}")
+            print(f"   Kiểu: {backup.get('mode', 'full')}")
+            if backup.get('base_backup'):
+                print(f"   Backup gốc: {backup['base_backup']}")
             print(f"   Kích thước: {format_size(backup['compressed_size'])}")
             print(f"   Tỷ lệ nén: {backup['compression_ratio']:.1f}%")
             if backup.get('excluded_patterns'):
@@ -494,13 +3080,18 @@ def main_interactive():
             print("❌ File backup không tồn tại!")
             return
         
+        if confirm_action("Xem danh sách file trong backup trước?"):
+            print_archive_contents(backup_file)
+        
+        include_input = get_user_input("Chỉ restore các đường dẫn/glob (phân cách dấu phẩy, Enter = toàn bộ)", default="")
+        patterns = [p.strip() for p in include_input.split(',') if p.strip()] or None
         restore_location = get_user_input("Nhập vị trí restore", default="./restored")
         
         if not confirm_action("Bắt đầu restore?", require_yes=True):
             print("❌ Đã hủy")
             return
         
-        manager.restore_backup(backup_file, restore_location)
+        manager.restore_backup(backup_file, restore_location, patterns, workers=os.cpu_count() or 1)
 
 
 def main_cli(args):
@@ -510,7 +3101,68 @@ def main_cli(args):
     Args:
         args: Arguments từ argparse
     """
-    manager = BackupManager(args.source, args.output)
+    include_patterns = None
+    if args.include:
+        include_patterns = [p.strip() for p in args.include.split(',') if p.strip()]
+    
+    if args.repo:
+        repository = BackupRepository(args.repo, compression_level=args.level, threads=args.threads)
+        command = args.repo_command or 'backup'
+        if command == 'backup' and not args.source:
+            print("❌ Lệnh backup cần -s/--source")
+            return 1
+        
+        success = run_repository_command(
+            repository, command,
+            source=args.source,
+            exclude_patterns=[p.strip() for p in args.exclude.split(',')] if args.exclude else None,
+            snapshot_id=args.snapshot,
+            restore_location=args.restore_to,
+            keep_last=args.keep_last,
+            read_data=args.read_data,
+            show_progress=not args.quiet,
+            patterns=include_patterns
+        )
+        return 0 if success else 1
+    
+    if args.list:
+        return 0 if print_archive_contents(args.list, include_patterns) else 1
+    
+    if args.verify:
+        return 0 if verify_backups(args.verify, args.workers or os.cpu_count() or 1) else 1
+    
+    policy = {
+        'keep_last': args.keep_last or 0,
+        'keep_daily': args.keep_daily or 0,
+        'keep_weekly': args.keep_weekly or 0,
+        'keep_monthly': args.keep_monthly or 0
+    }
+    
+    if args.prune:
+        if not args.output:
+            print("❌ --prune cần -o/--output (thư mục chứa backup)")
+            return 1
+        if not any(policy.values()):
+            print("❌ --prune cần ít nhất một trong --keep-last/--keep-daily/--keep-weekly/--keep-monthly")
+            return 1
+        manager = BackupManager(args.source or ".", args.output)
+        stats = manager.apply_retention(
+            policy, str(manager.source_path) if args.source else None, dry_run=args.dry_run
+        )
+        print_retention_result(stats, args.dry_run)
+        return 0
+    
+    if args.restore:
+        manager = BackupManager(args.source or ".", os.path.dirname(os.path.abspath(args.restore)))
+        success = manager.restore_backup(
+            args.restore, args.restore_to, include_patterns,
+            workers=args.workers or os.cpu_count() or 1,
+            show_progress=not args.quiet
+        )
+        return 0 if success else 1
+    
+    manager = BackupManager(args.source, args.output,
+                            compression_level=args.level, threads=args.threads)
     
     exclude_patterns = None
     if args.exclude:
@@ -519,11 +3171,15 @@ def main_cli(args):
     success, backup_file, info = manager.create_backup(
         compression_format=args.format,
         exclude_patterns=exclude_patterns,
-        show_progress=not args.quiet
+        show_progress=not args.quiet,
+        mode=args.mode
     )
     
     if success:
         print(f"✅ Backup: {backup_file}")
+        if any(policy.values()):
+            stats = manager.apply_retention(policy, str(manager.source_path), dry_run=args.dry_run)
+            print_retention_result(stats, args.dry_run)
         return 0
     else:
         print(f"❌ Lỗi: {info.get('error', 'Unknown')}")
@@ -551,20 +3207,76 @@ Ví dụ:
   
   # Backup với TAR.GZ
   python backup-folder.py -s ./project -o ./backups -f gztar
+  
+  # Backup TAR.ZST nén 16 thread, mức 6
+  python backup-folder.py -s ./project -o ./backups -f zsttar --threads 16 --level 6
+  
+  # Backup incremental (chỉ file thay đổi so với lần backup trước)
+  python backup-folder.py -s ./project -o ./backups -m incremental
+  
+  # Restore (tự áp dụng chuỗi full + incremental)
+  python backup-folder.py --restore ./backups/project_backup_20240101_020000_incremental.zip --restore-to ./restored
+  
+  # Xem nội dung backup, restore một phần (đường dẫn hoặc glob)
+  python backup-folder.py --list ./backups/project_backup_20240101_020000.zip
+  python backup-folder.py --restore ./backups/project_backup_20240101_020000.zip -i "config,*.yml"
+  
+  # Backup rồi tự dọn backup cũ: 7 ngày, 4 tuần, 12 tháng
+  python backup-folder.py -s ./project -o ./backups --keep-daily 7 --keep-weekly 4 --keep-monthly 12
+  
+  # Chỉ dọn backup cũ (xem trước với --dry-run)
+  python backup-folder.py -o ./backups --prune --keep-last 10 --dry-run
+  
+  # Kiểm tra toàn vẹn (checksum từng file) một file hoặc cả thư mục backup
+  python backup-folder.py --verify ./backups --workers 8
+  
+  # Repository khử trùng lặp: backup (snapshot), list, restore, prune, check
+  python backup-folder.py --repo ./repo -s ./project
+  python backup-folder.py --repo ./repo list
+  python backup-folder.py --repo ./repo restore --snapshot 20240101_020000 --restore-to ./restored
+  python backup-folder.py --repo ./repo prune --keep-last 30
+  python backup-folder.py --repo ./repo check --read-data
         """
     )
     
     parser.add_argument('-s', '--source', help='Thư mục nguồn')
     parser.add_argument('-o', '--output', help='Thư mục đầu ra')
     parser.add_argument('-f', '--format', default='zip',
-                       choices=['zip', 'tar', 'gztar', 'bztar', 'xztar'],
-                       help='Định dạng nén (mặc định: zip)')
+                       choices=list(ARCHIVE_EXTENSIONS),
+                       help='Định dạng nén (mặc định: zip; zsttar/pgztar nén nhiều thread)')
+    parser.add_argument('--level', type=int, help='Mức nén (mặc định theo định dạng: zstd 3, gzip 6)')
+    parser.add_argument('--threads', type=int, default=0,
+                       help='Số thread nén cho zsttar/pgztar/repository (mặc định: số CPU)')
     parser.add_argument('-e', '--exclude', help='Patterns loại trừ (phân cách bởi dấu phẩy)')
+    parser.add_argument('-m', '--mode', default='full', choices=BACKUP_MODES,
+                       help='Kiểu backup (mặc định: full)')
     parser.add_argument('-q', '--quiet', action='store_true', help='Không hiển thị progress')
+    parser.add_argument('--restore', help='File backup cần restore (tự áp dụng chuỗi backup)')
+    parser.add_argument('--restore-to', default='./restored', help='Vị trí restore (mặc định: ./restored)')
+    parser.add_argument('-i', '--include',
+                       help='Chỉ restore/liệt kê các đường dẫn hoặc glob (phân cách bởi dấu phẩy)')
+    parser.add_argument('--workers', type=int, default=0,
+                       help='Số thread khi restore/verify (mặc định: số CPU)')
+    parser.add_argument('--list', help='Liệt kê nội dung file backup (không giải nén)')
+    parser.add_argument('--verify', nargs='+', metavar='PATH',
+                       help='Kiểm tra checksum file backup hoặc cả thư mục backup (không giải nén ra đĩa)')
+    parser.add_argument('repo_command', nargs='?', choices=REPO_COMMANDS,
+                       help='Lệnh repository (dùng với --repo, mặc định: backup)')
+    parser.add_argument('--repo', help='Repository khử trùng lặp (backup dạng snapshot)')
+    parser.add_argument('--snapshot', help='ID snapshot cần restore (mặc định: mới nhất)')
+    parser.add_argument('--keep-last', type=int,
+                       help='Retention: giữ N backup (hoặc snapshot với --repo) gần nhất của mỗi thư mục nguồn')
+    parser.add_argument('--keep-daily', type=int, help='Retention: giữ 1 backup/ngày cho N ngày gần nhất')
+    parser.add_argument('--keep-weekly', type=int, help='Retention: giữ 1 backup/tuần cho N tuần gần nhất')
+    parser.add_argument('--keep-monthly', type=int, help='Retention: giữ 1 backup/tháng cho N tháng gần nhất')
+    parser.add_argument('--prune', action='store_true',
+                       help='Chỉ dọn backup cũ trong -o theo --keep-* (không tạo backup mới)')
+    parser.add_argument('--dry-run', action='store_true', help='Retention: chỉ liệt kê, không xóa')
+    parser.add_argument('--read-data', action='store_true', help='check: đọc lại và kiểm tra hash mọi chunk')
     
     args, unknown = parser.parse_known_args()
     
-    if args.source:
+    if args.source or args.restore or args.repo or args.list or args.verify or args.prune:
         sys.exit(main_cli(args))
     else:
         try:
@@ -5,9 +5,15 @@ Tool: Dọn dẹp file tạm, cache, file rác
 """
 
 import os
+import sys
 import shutil
 from pathlib import Path
 
+# Thêm thư mục cha vào sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import parallel_scan_files
+
 
 def print_header():
     print("=" * 60)
@@ -29,16 +35,7 @@ def get_size(path):
     if os.path.isfile(path):
         return os.path.getsize(path)
     
-    total = 0
-    try:
-        for dirpath, dirnames, filenames in os.walk(path):
-            for filename in filenames:
-                file_path = os.path.join(dirpath, filename)
-                if os.path.exists(file_path):
-                    total += os.path.getsize(file_path)
-    except Exception:
-        pass
-    return total
+    return sum(entry.size for entry in parallel_scan_files(path))
 
 
 def find_temp_files(directory):
@@ -50,15 +47,10 @@ def find_temp_files(directory):
     
     temp_files = []
     
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if any(file.endswith(pattern) or file == pattern for pattern in temp_patterns):
-                file_path = os.path.join(root, file)
-                try:
-                    size = os.path.getsize(file_path)
-                    temp_files.append((file_path, size))
-                except Exception:
-                    pass
+    for entry in parallel_scan_files(directory):
+        file = entry.name
+        if any(file.endswith(pattern) or file == pattern for pattern in temp_patterns):
+            temp_files.append((entry.path, entry.size))
     
     return temp_files
 
@@ -75,15 +67,16 @@ def find_cache_folders(directory):
     
     cache_folders = []
     
-    for root, dirs, files in os.walk(directory):
-        for dir_name in dirs:
-            if dir_name in cache_names:
-                folder_path = os.path.join(root, dir_name)
-                try:
-                    size = get_size(folder_path)
-                    cache_folders.append((folder_path, size))
-                except Exception:
-                    pass
+    # Không đi vào thư mục cache đã tìm thấy (xóa thư mục cha là xóa luôn thư mục con)
+    is_cache = lambda entry: entry.name in cache_names
+    
+    for entry in parallel_scan_files(directory, yield_dirs=True, skip_dir=is_cache):
+        if entry.is_dir and is_cache(entry):
+            try:
+                size = get_size(entry.path)
+                cache_folders.append((entry.path, size))
+            except Exception:
+                pass
     
     return cache_folders
 
@@ -93,15 +86,9 @@ def find_large_files(directory, min_size_mb=10):
     large_files = []
     min_size_bytes = min_size_mb * 1024 * 1024
     
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            file_path = os.path.join(root, file)
-            try:
-                size = os.path.getsize(file_path)
-                if size >= min_size_bytes:
-                    large_files.append((file_path, size))
-            except Exception:
-                pass
+    for entry in parallel_scan_files(directory):
+        if entry.size >= min_size_bytes:
+            large_files.append((entry.path, entry.size))
     
     return large_files
 
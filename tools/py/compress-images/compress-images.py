@@ -7,21 +7,26 @@ Mục đích: Giảm dung lượng ảnh, resize, đổi format
 Lý do: Tối ưu ảnh cho web, tiết kiệm dung lượng
 """
 
+import io
 import os
 import sys
+import json
+import time
+import sqlite3
 import datetime
 import argparse
 from pathlib import Path
-from typing import Optional, Tuple, List
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator, Optional, Tuple, List
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
 
 # Thêm thư mục cha vào sys.path để import utils
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils import (
     print_header, format_size, get_user_input, confirm_action,
-    get_file_list, ensure_directory_exists, ProgressBar, 
-    log_info, log_error, setup_logger, normalize_path
+    scan_files, ensure_directory_exists, ProgressBar,
+    log_info, log_error, setup_logger, normalize_path,
+    hash_file, get_fastest_algorithm, available_algorithms, FileEntry
 )
 
 # Kiểm tra thư viện PIL
@@ -33,6 +38,572 @@ except ImportError:
     sys.exit(1)
 
 
+# Plugin AVIF cho Pillow cũ (Pillow >= 11.3 đã có sẵn AVIF)
+try:
+    import pillow_avif  # noqa: F401 (import để đăng ký plugin)
+except ImportError:
+    pass
+
+Image.init()
+AVIF_AVAILABLE = 'AVIF' in Image.SAVE
+
+# NumPy để tính SSIM/PSNR (chế độ chọn file nhỏ nhất đạt chất lượng)
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+# Phần mở rộng ảnh được xử lý
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif', '.tiff']
+
+# Số task tối đa đang chờ mỗi worker (giới hạn RAM khi xử lý cây thư mục lớn)
+MAX_PENDING_PER_WORKER = 4
+
+# Manifest của chế độ incremental (nằm trong thư mục đầu ra)
+MANIFEST_FILE = '.compress-images.db'
+
+# Số bản ghi manifest gom lại trước khi ghi xuống đĩa
+MANIFEST_BATCH_SIZE = 500
+
+# Ma trận encoder: tên -> format Pillow, phần mở rộng, có tham số quality không,
+# giữ nguyên pixel không (exact = không cần kiểm tra SSIM/PSNR)
+ENCODERS = {
+    'jpeg': {'format': 'JPEG', 'ext': 'jpg', 'lossy': True, 'exact': False},
+    'jpeg-progressive': {'format': 'JPEG', 'ext': 'jpg', 'lossy': True, 'exact': False},
+    'webp': {'format': 'WEBP', 'ext': 'webp', 'lossy': True, 'exact': False},
+    'webp-lossless': {'format': 'WEBP', 'ext': 'webp', 'lossy': False, 'exact': True},
+    'webp-near-lossless': {'format': 'WEBP', 'ext': 'webp', 'lossy': False, 'exact': False},
+    'avif': {'format': 'AVIF', 'ext': 'avif', 'lossy': True, 'exact': False},
+    'png': {'format': 'PNG', 'ext': 'png', 'lossy': False, 'exact': True},
+    'png-palette': {'format': 'PNG', 'ext': 'png', 'lossy': False, 'exact': False},
+}
+
+# Ngưỡng SSIM mặc định của chế độ chọn file nhỏ nhất đạt chất lượng
+DEFAULT_MIN_SSIM = 0.95
+
+# Cửa sổ (px) khi tính SSIM
+SSIM_WINDOW = 8
+
+# Số dòng mỗi dải khi tính SSIM/PSNR (giới hạn RAM của mảng tạm)
+SSIM_STRIP_ROWS = 256
+
+# Số bit thấp bị làm tròn của webp-near-lossless (tương đương near_lossless=60 của cwebp)
+NEAR_LOSSLESS_BITS = 2
+
+# Effort (tham số quality) khi nén WebP lossless
+WEBP_LOSSLESS_EFFORT = 50
+
+# Mode ảnh PNG lưu được trực tiếp (mode khác đổi sang RGB/RGBA)
+PNG_MODES = ("1", "L", "LA", "I", "I;16", "P", "RGB", "RGBA")
+
+# Số màu tối đa khi lượng tử hóa PNG về bảng màu
+PALETTE_COLORS = 256
+
+# Quality thấp nhất khi tìm quality để đạt max_size_kb
+MIN_QUALITY = 10
+
+# Số lần giảm kích thước tối đa khi quality thấp nhất vẫn vượt max_size_kb
+MAX_DOWNSCALE_STEPS = 5
+
+# Kích thước nhỏ nhất (px) khi tự giảm kích thước
+MIN_DOWNSCALE_SIDE = 16
+
+# reducing_gap của Image.resize: thu nhỏ nhanh bằng reduce() (số nguyên lần) trước,
+# chỉ chạy LANCZOS ở bước cuối; >= 3.0 cho kết quả gần như không khác LANCZOS thuần
+RESIZE_REDUCING_GAP = 3.0
+
+
+def compute_target_size(
+    orig_size: Tuple[int, int],
+    resize_width: Optional[int] = None,
+    resize_height: Optional[int] = None
+) -> Optional[Tuple[int, int]]:
+    """
+    Tính kích thước đích khi resize
+    
+    Args:
+        orig_size: Kích thước gốc (width, height)
+        resize_width: Chiều rộng mới (None = theo tỷ lệ)
+        resize_height: Chiều cao mới (None = theo tỷ lệ)
+    
+    Returns:
+        tuple: (width, height) hoặc None nếu không resize
+    """
+    if not (resize_width or resize_height):
+        return None
+    
+    orig_w, orig_h = orig_size
+    if resize_width and resize_height:
+        # Resize theo đúng width & height nhập vào
+        return resize_width, resize_height
+    if resize_width:
+        # Resize theo width, giữ tỷ lệ
+        return resize_width, max(1, int(orig_h * resize_width / orig_w))
+    # Resize theo height, giữ tỷ lệ
+    return max(1, int(orig_w * resize_height / orig_h)), resize_height
+
+
+def open_image(
+    input_path: str,
+    resize_width: Optional[int] = None,
+    resize_height: Optional[int] = None,
+    fast_downscale: bool = True
+) -> Tuple[Image.Image, Optional[str]]:
+    """
+    Mở ảnh và resize (nếu có yêu cầu)
+    
+    Args:
+        input_path: Đường dẫn ảnh
+        resize_width: Chiều rộng mới (None = giữ nguyên / theo tỷ lệ)
+        resize_height: Chiều cao mới (None = giữ nguyên / theo tỷ lệ)
+        fast_downscale: Giải mã ở độ phân giải thấp khi thu nhỏ (False = cách cũ, để so sánh)
+    
+    Returns:
+        tuple: (ảnh, format gốc)
+    
+    Giải thích:
+    - JPEG: Image.draft() cho bộ giải mã chạy ở tỷ lệ 1/2, 1/4, 1/8 (vẫn >= kích thước đích)
+      -> ảnh 24 MP thu về 1920 px chỉ giải mã ~1/4 số pixel, tốn ít RAM hơn nhiều
+    - Các format khác: resize với reducing_gap (reduce() số nguyên lần rồi mới LANCZOS)
+    - Bước cuối luôn là LANCZOS đến đúng kích thước đích
+    """
+    img = Image.open(input_path)
+    original_format = img.format
+    target_size = compute_target_size(img.size, resize_width, resize_height)
+    
+    if target_size is None:
+        return img, original_format
+    
+    shrinking = target_size[0] < img.size[0] and target_size[1] < img.size[1]
+    
+    if fast_downscale and shrinking:
+        if original_format == 'JPEG':
+            img.draft(img.mode, target_size)
+        img = img.resize(target_size, Image.Resampling.LANCZOS, reducing_gap=RESIZE_REDUCING_GAP)
+    else:
+        img = img.resize(target_size, Image.Resampling.LANCZOS)
+    
+    return img, original_format
+
+
+def encode_image(img: Image.Image, save_kwargs: dict) -> bytes:
+    """
+    Nén ảnh vào bộ nhớ (không ghi đĩa)
+    
+    Args:
+        img: Ảnh PIL
+        save_kwargs: Tham số cho Image.save (format, quality, optimize...)
+    
+    Returns:
+        bytes: Dữ liệu file ảnh
+    """
+    buffer = io.BytesIO()
+    img.save(buffer, **save_kwargs)
+    return buffer.getvalue()
+
+
+def encode_within_size(
+    img: Image.Image,
+    save_kwargs: dict,
+    max_bytes: int,
+    allow_downscale: bool = False
+) -> Tuple[bytes, Optional[int], int, Tuple[int, int]]:
+    """
+    Nén ảnh sao cho không vượt quá max_bytes, giữ quality cao nhất có thể
+    
+    Args:
+        img: Ảnh PIL
+        save_kwargs: Tham số cho Image.save; 'quality' là quality mong muốn (cận trên)
+        max_bytes: Dung lượng tối đa (byte)
+        allow_downscale: Cho phép giảm kích thước khi quality thấp nhất vẫn vượt
+    
+    Returns:
+        tuple: (dữ liệu, quality đã dùng, số lần encode, kích thước ảnh)
+    
+    Giải thích:
+    - Encode vào BytesIO, không ghi file nháp ra đĩa
+    - Thử quality mong muốn trước, vượt thì tìm nhị phân trong [MIN_QUALITY, quality - 1]
+      -> khoảng log2(90) ≈ 7 lần encode thay vì tối đa 18 lần giảm từng 5 đơn vị
+    - Vẫn vượt ở MIN_QUALITY và allow_downscale: thu nhỏ ảnh theo tỷ lệ
+      sqrt(max_bytes / dung lượng ở quality mong muốn) rồi thử lại
+      (ưu tiên giữ quality mong muốn ở kích thước nhỏ hơn)
+    - Không đạt được: trả về bản nhỏ nhất đã thử
+    """
+    lossy = 'quality' in save_kwargs
+    quality = save_kwargs.get('quality')
+    encodes = 0
+    
+    def encode(image: Image.Image, q: Optional[int]) -> bytes:
+        nonlocal encodes
+        encodes += 1
+        kwargs = dict(save_kwargs)
+        if lossy:
+            kwargs['quality'] = q
+        return encode_image(image, kwargs)
+    
+    data = encode(img, quality)
+    if len(data) <= max_bytes:
+        return data, quality, encodes, img.size
+    
+    image = img
+    top_size = len(data)
+    smallest = (data, quality, image.size)
+    
+    for step in range(MAX_DOWNSCALE_STEPS + 1):
+        if step > 0:
+            factor = min(0.9, (max_bytes / top_size) ** 0.5)
+            width, height = image.size
+            new_size = (int(width * factor), int(height * factor))
+            if min(new_size) < MIN_DOWNSCALE_SIDE:
+                break
+            image = img.resize(new_size, Image.Resampling.LANCZOS)
+            
+            data = encode(image, quality)
+            if len(data) <= max_bytes:
+                return data, quality, encodes, image.size
+            top_size = len(data)
+            if len(data) < len(smallest[0]):
+                smallest = (data, quality, image.size)
+        
+        if lossy:
+            lo, hi = MIN_QUALITY, quality - 1
+            best = None
+            while lo <= hi:
+                mid = (lo + hi) // 2
+                data = encode(image, mid)
+                if len(data) <= max_bytes:
+                    best = (data, mid)
+                    lo = mid + 1
+                else:
+                    hi = mid - 1
+                    if len(data) < len(smallest[0]):
+                        smallest = (data, mid, image.size)
+            
+            if best:
+                return best[0], best[1], encodes, image.size
+        
+        if not allow_downscale:
+            break
+    
+    return smallest[0], smallest[1], encodes, smallest[2]
+
+
+def available_encoders() -> List[str]:
+    """
+    Danh sách encoder dùng được trên máy này
+    
+    Returns:
+        list: Tên encoder (avif chỉ có khi Pillow hỗ trợ AVIF)
+    """
+    return [name for name, spec in ENCODERS.items()
+            if spec['format'] != 'AVIF' or AVIF_AVAILABLE]
+
+
+def has_alpha(img: Image.Image) -> bool:
+    """Ảnh có kênh alpha / màu trong suốt không"""
+    return "A" in img.getbands() or "transparency" in img.info
+
+
+def flatten_alpha(img: Image.Image) -> Image.Image:
+    """
+    Ghép ảnh có kênh alpha lên nền trắng (cho format không có alpha như JPEG)
+    
+    Args:
+        img: Ảnh PIL
+    
+    Returns:
+        Image: Ảnh RGB (ảnh không có alpha thì trả về nguyên ảnh)
+    """
+    if img.mode not in ("RGBA", "LA", "P"):
+        return img
+    
+    background = Image.new("RGB", img.size, (255, 255, 255))
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+    background.paste(img, mask=img.split()[-1])
+    return background
+
+
+def prepare_encoder(
+    img: Image.Image,
+    encoder: str,
+    quality: int,
+    optimize: bool = True
+) -> Tuple[Image.Image, dict]:
+    """
+    Chuẩn bị ảnh và tham số Image.save cho một encoder trong ENCODERS
+    
+    Args:
+        img: Ảnh PIL (đã resize)
+        encoder: Tên encoder
+        quality: Quality cho encoder lossy
+        optimize: Có optimize không
+    
+    Returns:
+        tuple: (ảnh đã đổi mode nếu cần, save_kwargs)
+    
+    Giải thích:
+    - jpeg-progressive: progressive + optimize (bảng Huffman tối ưu), hiện dần khi tải
+      trên web, ảnh lớn thường nhỏ hơn baseline một chút
+    - webp-lossless: effort WEBP_LOSSLESS_EFFORT (effort cao nhất chậm hơn ~20 lần,
+      chỉ nhỏ hơn < 1%)
+    - webp-near-lossless: Pillow không có near_lossless của libwebp nên làm tròn
+      NEAR_LOSSLESS_BITS bit thấp của mỗi kênh màu rồi nén lossless
+    - png-palette: lượng tử hóa về PALETTE_COLORS màu (có dither) rồi nén PNG
+    """
+    spec = ENCODERS[encoder]
+    save_kwargs = {'format': spec['format']}
+    
+    if spec['format'] == 'PNG' and img.mode not in PNG_MODES:
+        # CMYK, YCbCr... PNG không lưu được
+        img = img.convert("RGBA" if has_alpha(img) else "RGB")
+    elif spec['format'] in ('WEBP', 'AVIF') and img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if has_alpha(img) else "RGB")
+    
+    if spec['format'] == 'JPEG':
+        img = flatten_alpha(img)
+        if img.mode not in ("RGB", "L", "CMYK"):
+            img = img.convert("RGB")
+        save_kwargs['optimize'] = optimize
+        if encoder == 'jpeg-progressive':
+            save_kwargs['progressive'] = True
+            save_kwargs['optimize'] = True
+    elif spec['format'] == 'WEBP':
+        if encoder != 'webp':
+            save_kwargs.update(lossless=True, quality=WEBP_LOSSLESS_EFFORT)
+            if encoder == 'webp-near-lossless':
+                img = img.convert("RGBA" if has_alpha(img) else "RGB")
+                mask = 0xFF ^ ((1 << NEAR_LOSSLESS_BITS) - 1)
+                half = 1 << (NEAR_LOSSLESS_BITS - 1)
+                lut = [min(255, v + half) & mask for v in range(256)]
+                if img.mode == "RGBA":
+                    # Giữ nguyên kênh alpha
+                    lut = lut * 3 + list(range(256))
+                else:
+                    lut = lut * 3
+                img = img.point(lut)
+    elif spec['format'] == 'PNG':
+        save_kwargs['optimize'] = optimize
+        if encoder == 'png-palette' and img.mode not in ("P", "1", "L"):
+            alpha = has_alpha(img)
+            img = img.convert("RGBA" if alpha else "RGB")
+            # MEDIANCUT không hỗ trợ RGBA
+            method = Image.Quantize.FASTOCTREE if alpha else Image.Quantize.MEDIANCUT
+            img = img.quantize(PALETTE_COLORS, method=method, dither=Image.Dither.FLOYDSTEINBERG)
+    
+    if spec['lossy']:
+        save_kwargs['quality'] = quality
+    
+    return img, save_kwargs
+
+
+class QualityCheck:
+    """
+    So sánh ảnh đã nén với ảnh gốc bằng SSIM/PSNR (NumPy)
+    
+    Giải thích:
+    - Ảnh có alpha được ghép lên nền trắng trước khi so (như khi hiển thị trên web)
+    - SSIM tính trên độ sáng 8 bit (mode L của Pillow, hệ số BT.601), cửa sổ
+      SSIM_WINDOW x SSIM_WINDOW dùng ảnh tích phân (cumsum) -> không cần scipy/scikit-image
+    - PSNR tính trên cả 3 kênh RGB
+    - Ảnh gốc chỉ giữ dạng uint8: kênh sáng (1 byte/pixel), thêm RGB khi có ngưỡng PSNR
+    - Tính theo dải SSIM_STRIP_ROWS dòng: mảng float tạm chỉ bằng một dải, không bằng cả ảnh
+      (ảnh 24 MP không tốn hàng GB RAM mỗi process)
+    """
+    
+    def __init__(self, reference: Image.Image, min_ssim: Optional[float] = None,
+                 min_psnr: Optional[float] = None):
+        """
+        Args:
+            reference: Ảnh gốc (đã resize)
+            min_ssim: SSIM tối thiểu (None = không kiểm tra)
+            min_psnr: PSNR tối thiểu (dB, None = không kiểm tra)
+        """
+        self.min_ssim = min_ssim
+        self.min_psnr = min_psnr
+        
+        reference = self._flatten(reference)
+        self.reference_luma = np.asarray(reference.convert("L"))
+        self.reference_rgb = np.asarray(reference.convert("RGB")) if min_psnr is not None else None
+        self.window = min(SSIM_WINDOW, *self.reference_luma.shape)
+    
+    @staticmethod
+    def _flatten(img: Image.Image) -> Image.Image:
+        """Ghép alpha lên nền trắng (ảnh không có alpha giữ nguyên)"""
+        if has_alpha(img):
+            img = flatten_alpha(img.convert("RGBA"))
+        return img
+    
+    @staticmethod
+    def _box_mean(a: 'np.ndarray', size: int) -> 'np.ndarray':
+        """Trung bình trong mọi cửa sổ size x size (ảnh tích phân)"""
+        c = np.pad(a, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+        return (c[size:, size:] - c[:-size, size:] - c[size:, :-size] + c[:-size, :-size]) / (size * size)
+    
+    def ssim(self, luma: 'np.ndarray') -> float:
+        """
+        SSIM trung bình giữa ảnh gốc và ảnh nén (kênh độ sáng uint8)
+        """
+        size = self.window
+        c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+        rows = self.reference_luma.shape[0] - size + 1
+        total = 0.0
+        count = 0
+        
+        for top in range(0, rows, SSIM_STRIP_ROWS):
+            # Dải dòng kết quả [top, bottom) cần dữ liệu [top, bottom + size - 1)
+            bottom = min(top + SSIM_STRIP_ROWS, rows)
+            x = self.reference_luma[top:bottom + size - 1].astype(np.float64)
+            y = luma[top:bottom + size - 1].astype(np.float64)
+            
+            mu_x, mu_y = self._box_mean(x, size), self._box_mean(y, size)
+            var_x = self._box_mean(x * x, size) - mu_x * mu_x
+            var_y = self._box_mean(y * y, size) - mu_y * mu_y
+            cov = self._box_mean(x * y, size) - mu_x * mu_y
+            
+            ssim_map = ((2 * mu_x * mu_y + c1) * (2 * cov + c2)) / \
+                       ((mu_x * mu_x + mu_y * mu_y + c1) * (var_x + var_y + c2))
+            total += float(ssim_map.sum())
+            count += ssim_map.size
+        
+        return total / count
+    
+    def psnr(self, rgb: 'np.ndarray') -> float:
+        """
+        PSNR (dB) giữa ảnh gốc và ảnh nén; ảnh giống hệt -> inf
+        """
+        squared = 0
+        for top in range(0, rgb.shape[0], SSIM_STRIP_ROWS):
+            diff = self.reference_rgb[top:top + SSIM_STRIP_ROWS].astype(np.int32) - rgb[top:top + SSIM_STRIP_ROWS]
+            squared += int((diff * diff).sum(dtype=np.int64))
+        
+        mse = squared / rgb.size
+        return float('inf') if mse == 0 else float(10 * np.log10(255 * 255 / mse))
+    
+    def measure(self, data: bytes) -> Tuple[bool, dict]:
+        """
+        Giải mã dữ liệu đã nén và kiểm tra ngưỡng
+        
+        Args:
+            data: Dữ liệu file ảnh đã nén
+        
+        Returns:
+            tuple: (đạt ngưỡng, {'ssim': ..., 'psnr': ...} - chỉ các chỉ số có ngưỡng)
+        """
+        with Image.open(io.BytesIO(data)) as decoded:
+            if decoded.size[::-1] != self.reference_luma.shape:
+                return False, {}
+            decoded = self._flatten(decoded)
+            luma = np.asarray(decoded.convert("L")) if self.min_ssim is not None else None
+            rgb = np.asarray(decoded.convert("RGB")) if self.min_psnr is not None else None
+        
+        metrics = {}
+        passed = True
+        if luma is not None:
+            metrics['ssim'] = self.ssim(luma)
+            passed = passed and metrics['ssim'] >= self.min_ssim
+        if rgb is not None:
+            metrics['psnr'] = self.psnr(rgb)
+            passed = passed and metrics['psnr'] >= self.min_psnr
+        return passed, metrics
+
+
+def encode_smallest_acceptable(
+    img: Image.Image,
+    encoders: List[str],
+    quality: int,
+    optimize: bool,
+    check: QualityCheck
+) -> Tuple[bytes, str, Optional[int], int, dict]:
+    """
+    Thử các encoder trong bộ nhớ, giữ file nhỏ nhất vẫn đạt ngưỡng chất lượng
+    
+    Args:
+        img: Ảnh PIL (đã resize)
+        encoders: Các encoder cần thử (tên trong ENCODERS)
+        quality: Quality cao nhất cho encoder lossy
+        optimize: Có optimize không
+        check: Ngưỡng SSIM/PSNR
+    
+    Returns:
+        tuple: (dữ liệu, encoder đã chọn, quality đã dùng, số lần encode, chỉ số chất lượng)
+    
+    Giải thích:
+    - Encoder lossy: thử quality cao nhất, đạt thì tìm nhị phân quality thấp nhất
+      vẫn đạt ngưỡng trong [MIN_QUALITY, quality - 1]
+    - Encoder giữ nguyên pixel (png, webp-lossless): luôn đạt, không cần giải mã để so
+    - Khi tìm nhị phân, bản nén đã lớn hơn ứng viên tốt nhất thì bỏ qua bước so SSIM/PSNR
+    - Không encoder nào đạt: dùng encoder đầu tiên (encode được) ở quality chỉ định
+    - Encoder không nén được ảnh này (mode không hỗ trợ, lỗi thư viện...) bị bỏ qua,
+      chỉ báo lỗi khi không encoder nào nén được
+    """
+    encodes = 0
+    best = None
+    fallback = None
+    failures = []
+    
+    for encoder in encoders:
+        try:
+            image, save_kwargs = prepare_encoder(img, encoder, quality, optimize)
+        except (OSError, ValueError) as e:
+            failures.append(f"{encoder}: {e}")
+            continue
+        
+        def attempt(q: Optional[int], skip_larger: bool = False) -> Tuple[Optional[bytes], Optional[bool], dict]:
+            nonlocal encodes
+            encodes += 1
+            kwargs = dict(save_kwargs)
+            if q is not None:
+                kwargs['quality'] = q
+            try:
+                data = encode_image(image, kwargs)
+            except (OSError, ValueError) as e:
+                failures.append(f"{encoder}: {e}")
+                return None, False, {}
+            if ENCODERS[encoder]['exact']:
+                return data, True, {}
+            if skip_larger and best and len(data) >= len(best[0]):
+                # Lớn hơn ứng viên tốt nhất: không cần giải mã để so chất lượng
+                return data, None, {}
+            passed, metrics = check.measure(data)
+            return data, passed, metrics
+        
+        top_quality = quality if ENCODERS[encoder]['lossy'] else None
+        data, passed, metrics = attempt(top_quality)
+        if data is None:
+            continue
+        if fallback is None:
+            fallback = (data, encoder, top_quality, metrics)
+        if not passed:
+            continue
+        
+        candidate = (data, encoder, top_quality, metrics)
+        if top_quality is not None:
+            lo, hi = MIN_QUALITY, top_quality - 1
+            while lo <= hi:
+                mid = (lo + hi) // 2
+                data, passed, metrics = attempt(mid, skip_larger=True)
+                if passed is None:
+                    # Quality cao hơn chỉ lớn hơn nữa -> chỉ còn phía dưới
+                    hi = mid - 1
+                elif passed:
+                    candidate = (data, encoder, mid, metrics)
+                    hi = mid - 1
+                else:
+                    lo = mid + 1
+        
+        if best is None or len(candidate[0]) < len(best[0]):
+            best = candidate
+    
+    if best is None and fallback is None:
+        raise OSError("Không encoder nào nén được ảnh: " + "; ".join(failures))
+    
+    data, encoder, used_quality, metrics = best or fallback
+    return data, encoder, used_quality, encodes, metrics
+
+
 def compress_single_image(
     input_path: str,
     output_path: str,
@@ -41,8 +612,13 @@ def compress_single_image(
     max_size_kb: Optional[int] = None,
     convert_format: Optional[str] = None,
     resize_width: Optional[int] = None,
-    resize_height: Optional[int] = None
-) -> Tuple[bool, str, int, int]:
+    resize_height: Optional[int] = None,
+    allow_downscale: bool = False,
+    encoders: Optional[List[str]] = None,
+    min_ssim: Optional[float] = None,
+    min_psnr: Optional[float] = None,
+    keep_source_ext: bool = False
+) -> Tuple[bool, str, int, int, int, Optional[str]]:
     """
     Nén và xử lý một ảnh
     
@@ -52,97 +628,369 @@ def compress_single_image(
         quality: Chất lượng nén (1-100)
         optimize: Có optimize không
         max_size_kb: Dung lượng tối đa (KB)
-        convert_format: Định dạng đích (jpg, png, webp)
+        convert_format: Định dạng đích (jpg, png, webp, avif)
         resize_width: Chiều rộng mới (None = giữ nguyên)
         resize_height: Chiều cao mới (None = giữ nguyên)
+        allow_downscale: Cho phép thu nhỏ ảnh nếu quality thấp nhất vẫn vượt max_size_kb
+        encoders: Encoder trong ENCODERS (thay cho convert_format); phần mở rộng
+                  của output_path đổi theo encoder được dùng
+        min_ssim: SSIM tối thiểu (chế độ chọn file nhỏ nhất đạt chất lượng)
+        min_psnr: PSNR tối thiểu (dB)
+        keep_source_ext: Với encoders: thêm đuôi encoder sau tên đầy đủ của output_path
+                         (photo.png -> photo.png.webp) thay vì thay đuôi cũ
     
     Returns:
-        tuple: (success, message, old_size, new_size)
+        tuple: (success, message, old_size, new_size, encode_count, file đầu ra đã ghi)
     
     Giải thích:
-    - Mở ảnh và xử lý resize nếu cần
+    - Mở ảnh và xử lý resize nếu cần (thu nhỏ JPEG thì giải mã ở độ phân giải thấp)
     - Đổi format nếu cần
-    - Nén với quality chỉ định
-    - Nếu có max_size_kb, giảm dần quality cho đến khi đạt
-    - Trả về kết quả và kích thước file
+    - Nén với quality chỉ định (trong bộ nhớ)
+    - Nếu có max_size_kb, tìm nhị phân quality cao nhất vẫn đạt (xem encode_within_size)
+    - Nhiều encoder hoặc có ngưỡng SSIM/PSNR: chọn file nhỏ nhất đạt ngưỡng
+      (xem encode_smallest_acceptable, không có ngưỡng thì dùng DEFAULT_MIN_SSIM,
+      max_size_kb không áp dụng)
+    - Ghi file đầu ra một lần, trả về kết quả, kích thước file và số lần encode
     """
     try:
-        # Bước 1: Mở ảnh gốc
-        img = Image.open(input_path)
-        original_format = img.format
+        # Bước 1-2: Mở ảnh gốc, resize nếu có yêu cầu
         old_size = os.path.getsize(input_path)
-        
-        # Bước 2: Resize nếu có yêu cầu
-        if resize_width or resize_height:
-            orig_w, orig_h = img.size
-            
-            if resize_width and resize_height:
-                # Resize theo đúng width & height nhập vào
-                new_size = (resize_width, resize_height)
-            elif resize_width:
-                # Resize theo width, giữ tỷ lệ
-                ratio = resize_width / orig_w
-                new_size = (resize_width, int(orig_h * ratio))
-            else:  # resize_height
-                # Resize theo height, giữ tỷ lệ
-                ratio = resize_height / orig_h
-                new_size = (int(orig_w * ratio), resize_height)
-            
-            img = img.resize(new_size, Image.Resampling.LANCZOS)
+        img, original_format = open_image(input_path, resize_width, resize_height)
         
         # Bước 3: Xác định format đầu ra
-        if convert_format:
+        used_encoder = None
+        select_best = False
+        metrics = {}
+        if encoders:
+            unknown = [name for name in encoders if name not in available_encoders()]
+            if unknown:
+                return False, f"Encoder không hỗ trợ: {', '.join(unknown)}", 0, 0, 0, None
+            
+            select_best = len(encoders) > 1 or min_ssim is not None or min_psnr is not None
+            if select_best and not NUMPY_AVAILABLE:
+                return False, "Cần NumPy để tính SSIM/PSNR (pip install numpy)", 0, 0, 0, None
+        elif convert_format:
             target_format = convert_format.upper()
             if target_format == "JPG":
                 target_format = "JPEG"
             
-            # Convert sang RGB nếu cần thiết cho JPEG
-            if target_format == "JPEG" and img.mode in ("RGBA", "LA", "P"):
-                # Tạo background trắng
-                background = Image.new("RGB", img.size, (255, 255, 255))
-                if img.mode == "P":
-                    img = img.convert("RGBA")
-                background.paste(img, mask=img.split()[-1] if img.mode == "RGBA" else None)
-                img = background
+            # Convert sang RGB nếu cần thiết cho JPEG (ghép lên nền trắng)
+            if target_format == "JPEG":
+                img = flatten_alpha(img)
         else:
             target_format = original_format or "JPEG"
         
         # Bước 4: Đảm bảo thư mục đầu ra tồn tại
         ensure_directory_exists(os.path.dirname(output_path))
         
-        # Bước 5: Lưu ảnh với nén
-        save_kwargs = {
-            'format': target_format,
-            'optimize': optimize
-        }
-        
-        # Thêm quality cho các format hỗ trợ
-        if target_format in ['JPEG', 'WEBP']:
-            save_kwargs['quality'] = quality
+        # Bước 5: Lưu ảnh với nén (chọn file nhỏ nhất thì tham số do từng encoder quyết định)
+        if select_best:
+            save_kwargs = None
+        elif encoders:
+            used_encoder = encoders[0]
+            img, save_kwargs = prepare_encoder(img, used_encoder, quality, optimize)
+        else:
+            save_kwargs = {
+                'format': target_format,
+                'optimize': optimize
+            }
+            
+            # Thêm quality cho các format hỗ trợ
+            if target_format in ['JPEG', 'WEBP', 'AVIF']:
+                save_kwargs['quality'] = quality
         
-        img.save(output_path, **save_kwargs)
+        # Bước 6: Nén trong bộ nhớ (nhiều encoder / có ngưỡng chất lượng thì chọn
+        # file nhỏ nhất đạt ngưỡng, có max_size_kb thì tìm quality phù hợp)
+        if select_best:
+            if min_ssim is None and min_psnr is None:
+                min_ssim = DEFAULT_MIN_SSIM
+            check = QualityCheck(img, min_ssim, min_psnr)
+            data, used_encoder, used_quality, encodes, metrics = encode_smallest_acceptable(
+                img, encoders, quality, optimize, check
+            )
+            final_size = img.size
+        elif max_size_kb:
+            data, used_quality, encodes, final_size = encode_within_size(
+                img, save_kwargs, max_size_kb * 1024, allow_downscale
+            )
+        else:
+            data = encode_image(img, save_kwargs)
+            used_quality, encodes, final_size = save_kwargs.get('quality'), 1, img.size
         
-        # Bước 6: Nếu có max_size_kb, giảm dần quality
-        if max_size_kb and target_format in ['JPEG', 'WEBP']:
-            current_quality = quality
-            max_size_bytes = max_size_kb * 1024
-            
-            while os.path.getsize(output_path) > max_size_bytes and current_quality > 10:
-                current_quality -= 5
-                save_kwargs['quality'] = current_quality
-                img.save(output_path, **save_kwargs)
+        # Bước 7: Ghi file đầu ra một lần
+        if used_encoder:
+            stem = output_path if keep_source_ext else os.path.splitext(output_path)[0]
+            output_path = f"{stem}.{ENCODERS[used_encoder]['ext']}"
+        with open(output_path, 'wb') as f:
+            f.write(data)
         
-        new_size = os.path.getsize(output_path)
+        new_size = len(data)
         
         # Tính tỷ lệ nén
         reduction = ((old_size - new_size) / old_size) * 100 if old_size > 0 else 0
         
-        message = f"{format_size(old_size)} → {format_size(new_size)} (-{reduction:.1f}%)"
+        details = [f"{encodes} encode"]
+        if used_quality is not None:
+            details.insert(0, f"q={used_quality}")
+        if used_encoder:
+            details.insert(0, used_encoder)
+        if 'ssim' in metrics:
+            details.append(f"SSIM {metrics['ssim']:.4f}")
+        if 'psnr' in metrics:
+            details.append(f"PSNR {metrics['psnr']:.1f} dB")
+        if final_size != img.size:
+            details.append(f"{final_size[0]}x{final_size[1]}")
         
-        return True, message, old_size, new_size
+        message = (f"{format_size(old_size)} → {format_size(new_size)} (-{reduction:.1f}%) "
+                   f"[{', '.join(details)}]")
         
+        return True, message, old_size, new_size, encodes, output_path
+    
     except Exception as e:
-        return False, str(e), 0, 0
+        return False, str(e), 0, 0, 0, None
+
+
+class ImageManifest:
+    """
+    Manifest các ảnh đã nén của một thư mục đầu ra (SQLite)
+    
+    Mục đích: Chạy lại trên cùng thư mục chỉ nén ảnh mới/đã đổi
+    Lý do: Thư viện ảnh lớn chạy tối ưu hằng đêm, phần lớn ảnh không đổi
+    
+    Giải thích:
+    - Mỗi ảnh: đường dẫn tương đối, size, mtime_ns, hash nội dung, cài đặt nén,
+      file đầu ra; lưu trong <thư mục đầu ra>/.compress-images.db
+    - Ảnh được bỏ qua khi: cài đặt giống, file đầu ra còn, size + mtime giống
+      (mtime khác nhưng nội dung giống -> cũng bỏ qua, cập nhật mtime)
+    """
+    
+    def __init__(self, output_dir: str):
+        """
+        Mở (hoặc tạo) manifest của thư mục đầu ra
+        
+        Args:
+            output_dir: Thư mục đầu ra (file đầu ra lưu theo đường dẫn tương đối
+                        -> đổi tên/chuyển thư mục đầu ra vẫn dùng lại được)
+        """
+        self.output_dir = output_dir
+        self.db_path = os.path.join(output_dir, MANIFEST_FILE)
+        ensure_directory_exists(output_dir)
+        
+        self.conn = sqlite3.connect(self.db_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                rel_path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                algo TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                settings TEXT NOT NULL,
+                output_file TEXT NOT NULL,
+                output_size INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self._pending = []
+    
+    def is_unchanged(self, rel_path: str, input_path: str, stat: os.stat_result,
+                     settings: str) -> bool:
+        """
+        Kiểm tra ảnh có thể bỏ qua không
+        
+        Args:
+            rel_path: Đường dẫn tương đối của ảnh gốc
+            input_path: Đường dẫn ảnh gốc
+            stat: Kết quả stat của ảnh gốc (lấy lúc quét)
+            settings: Cài đặt nén (xem settings_key)
+        
+        Returns:
+            bool: True nếu ảnh gốc và cài đặt không đổi, file đầu ra còn
+        """
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, algo, digest, settings, output_file FROM images WHERE rel_path = ?",
+            (rel_path,)
+        ).fetchone()
+        if row is None:
+            return False
+        
+        size, mtime_ns, algo, digest, old_settings, old_output = row
+        if old_settings != settings or size != stat.st_size:
+            return False
+        # File đầu ra đã ghi (phần mở rộng có thể do encoder được chọn quyết định)
+        if not os.path.exists(os.path.join(self.output_dir, old_output)):
+            return False
+        if mtime_ns == stat.st_mtime_ns:
+            return True
+        
+        # mtime đổi (copy, touch...): so nội dung
+        if algo not in available_algorithms():
+            return False
+        try:
+            if hash_file(input_path, algo) != digest:
+                return False
+        except OSError:
+            return False
+        
+        with self.conn:
+            self.conn.execute("UPDATE images SET mtime_ns = ? WHERE rel_path = ?",
+                              (stat.st_mtime_ns, rel_path))
+        return True
+    
+    def add(self, rel_path: str, stat: os.stat_result, algo: str, digest: str,
+            settings: str, output_path: str, output_size: int) -> None:
+        """Ghi nhận ảnh đã nén (ghi xuống đĩa theo lô MANIFEST_BATCH_SIZE)"""
+        self._pending.append((rel_path, stat.st_size, stat.st_mtime_ns, algo, digest, settings,
+                              os.path.relpath(output_path, self.output_dir), output_size, time.time()))
+        if len(self._pending) >= MANIFEST_BATCH_SIZE:
+            self.flush()
+    
+    def flush(self) -> None:
+        """Ghi các bản ghi đang chờ trong một transaction"""
+        if not self._pending:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO images "
+                "(rel_path, size, mtime_ns, algo, digest, settings, output_file, output_size, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self._pending
+            )
+        self._pending = []
+    
+    def close(self) -> None:
+        """Ghi nốt và đóng kết nối"""
+        self.flush()
+        self.conn.close()
+
+
+def settings_key(task: dict) -> str:
+    """
+    Chuỗi đại diện cho cài đặt nén của một task (so sánh giữa các lần chạy)
+    
+    Returns:
+        str: JSON các tham số trừ đường dẫn vào/ra
+    """
+    settings = {k: v for k, v in task.items() if k not in ('input_path', 'output_path')}
+    return json.dumps(settings, sort_keys=True)
+
+
+def process_image_task(
+    task: dict,
+    hash_algo: Optional[str] = None
+) -> Tuple[bool, str, int, int, int, Optional[str], Optional[str]]:
+    """
+    Nén một ảnh trong worker, kèm hash nội dung ảnh gốc (cho manifest)
+    
+    Args:
+        task: Tham số của compress_single_image
+        hash_algo: Thuật toán hash (None = không hash)
+    
+    Returns:
+        tuple: Kết quả compress_single_image + digest
+    """
+    digest = None
+    if hash_algo:
+        try:
+            digest = hash_file(task['input_path'], hash_algo)
+        except OSError as e:
+            return False, str(e), 0, 0, 0, None, None
+    return compress_single_image(**task) + (digest,)
+
+
+def count_image_stems(dir_path: str) -> dict:
+    """
+    Đếm số ảnh theo tên không đuôi trong một thư mục
+    
+    Args:
+        dir_path: Thư mục cần đếm
+    
+    Returns:
+        dict: {tên không đuôi (chữ thường): số ảnh}
+    
+    Giải thích:
+    - photo.png và photo.jpg cùng tên 'photo' -> đổi đuôi thì file đầu ra bị trùng
+    - Không phân biệt hoa/thường (Windows/macOS coi Photo.webp và photo.webp là một)
+    """
+    counts = {}
+    try:
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                stem, ext = os.path.splitext(entry.name)
+                if ext.lower() in IMAGE_EXTENSIONS and entry.is_file():
+                    counts[stem.lower()] = counts.get(stem.lower(), 0) + 1
+    except OSError:
+        pass
+    return counts
+
+
+def iter_image_tasks(
+    input_dir: str,
+    output_dir: str,
+    recursive: bool = False,
+    convert_format: Optional[str] = None,
+    **options
+) -> Iterator[Tuple[FileEntry, dict]]:
+    """
+    Sinh task nén cho từng ảnh trong lúc đang quét thư mục
+    
+    Args:
+        input_dir: Thư mục chứa ảnh gốc
+        output_dir: Thư mục đầu ra
+        recursive: Quét cả thư mục con (đầu ra giữ nguyên cấu trúc thư mục)
+        convert_format: Định dạng đích (đổi phần mở rộng file đầu ra)
+        **options: Các tham số còn lại của compress_single_image
+    
+    Yields:
+        tuple: (entry của ảnh gốc, tham số gọi compress_single_image(**task))
+    
+    Giải thích:
+    - Dùng scan_files (generator): không chờ quét xong, không giữ danh sách file trong RAM
+    - Bỏ qua thư mục đầu ra nếu nằm trong thư mục đầu vào (không nén lại ảnh vừa nén)
+    - Đổi đuôi (convert_format/encoders) mà thư mục có ảnh cùng tên khác đuôi
+      (photo.png, photo.jpg): giữ đuôi gốc trong tên đầu ra (photo.png.webp) để
+      ảnh sau không ghi đè ảnh trước
+    """
+    output_abs = os.path.abspath(output_dir)
+    changes_ext = bool(convert_format or options.get('encoders'))
+    # scan_files trả hết file của một thư mục rồi mới sang thư mục khác -> chỉ cần nhớ thư mục gần nhất
+    stems = {'dir': None, 'counts': {}}
+    
+    for entry in scan_files(
+        input_dir,
+        extensions=IMAGE_EXTENSIONS,
+        recursive=recursive,
+        skip_dir=lambda entry: os.path.abspath(entry.path) == output_abs
+    ):
+        rel_path = os.path.relpath(entry.path, input_dir)
+        
+        ambiguous = False
+        if changes_ext:
+            dir_path = os.path.dirname(entry.path)
+            if stems['dir'] != dir_path:
+                stems['dir'], stems['counts'] = dir_path, count_image_stems(dir_path)
+            ambiguous = stems['counts'].get(os.path.splitext(entry.name)[0].lower(), 0) > 1
+        
+        # Đổi extension nếu convert format
+        if convert_format:
+            ext = convert_format.lower()
+            if ext == "jpeg":
+                ext = "jpg"
+            stem = rel_path if ambiguous else os.path.splitext(rel_path)[0]
+            rel_path = f"{stem}.{ext}"
+        
+        task = {
+            'input_path': entry.path,
+            'output_path': os.path.join(output_dir, rel_path),
+            'convert_format': convert_format,
+            **options
+        }
+        if ambiguous and options.get('encoders'):
+            # Chỉ thêm khi cần: không làm đổi settings_key của các ảnh khác
+            task['keep_source_ext'] = True
+        yield entry, task
 
 
 def batch_compress_images(
@@ -155,8 +1003,14 @@ def batch_compress_images(
     resize_width: Optional[int] = None,
     resize_height: Optional[int] = None,
     use_multiprocessing: bool = True,
-    max_workers: Optional[int] = None
-) -> Tuple[int, int, int, int]:
+    max_workers: Optional[int] = None,
+    allow_downscale: bool = False,
+    recursive: bool = False,
+    incremental: bool = False,
+    encoders: Optional[List[str]] = None,
+    min_ssim: Optional[float] = None,
+    min_psnr: Optional[float] = None
+) -> Tuple[int, int, int, int, int, int]:
     """
     Nén ảnh hàng loạt
     
@@ -171,141 +1025,135 @@ def batch_compress_images(
         resize_height: Chiều cao mới
         use_multiprocessing: Có dùng multiprocessing không
         max_workers: Số workers (None = auto)
+        allow_downscale: Cho phép thu nhỏ ảnh để đạt max_size_kb
+        recursive: Xử lý cả thư mục con, đầu ra giữ nguyên cấu trúc thư mục
+        incremental: Bỏ qua ảnh đã nén ở lần chạy trước (xem ImageManifest)
+        encoders: Encoder cần dùng/thử (xem ENCODERS, thay cho convert_format)
+        min_ssim: SSIM tối thiểu khi chọn file nhỏ nhất đạt chất lượng
+        min_psnr: PSNR tối thiểu (dB)
     
     Returns:
-        tuple: (success_count, error_count, total_old_size, total_new_size)
+        tuple: (success_count, error_count, total_old_size, total_new_size, total_encodes,
+                skipped_count)
     
     Giải thích:
-    - Quét tất cả ảnh trong thư mục
-    - Xử lý song song với multiprocessing (nếu enabled)
-    - Hiển thị progress bar
+    - Quét và nén cùng lúc: worker bắt đầu ngay khi tìm thấy ảnh đầu tiên
+    - Chỉ giữ tối đa max_workers * MAX_PENDING_PER_WORKER task đang chờ
+      -> RAM không tăng theo số ảnh (cây hàng triệu ảnh vẫn chạy được)
+    - Progress bar: tổng số ảnh tăng dần trong lúc quét
+    - incremental: ảnh không đổi bị bỏ qua ngay lúc quét (không gửi sang worker),
+      worker hash ảnh gốc cùng lúc với nén, manifest ghi theo lô
     - Trả về thống kê
     """
-    # Bước 1: Lấy danh sách ảnh
-    image_extensions = ['.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif', '.tiff']
-    image_files = get_file_list(
-        input_dir,
-        extensions=image_extensions,
-        recursive=False  # Chỉ quét thư mục hiện tại
+    ensure_directory_exists(output_dir)
+    log_info(f"Bắt đầu nén ảnh: {input_dir} -> {output_dir} (recursive={recursive})")
+    
+    tasks = iter_image_tasks(
+        input_dir, output_dir, recursive, convert_format,
+        quality=quality,
+        optimize=optimize,
+        max_size_kb=max_size_kb,
+        resize_width=resize_width,
+        resize_height=resize_height,
+        allow_downscale=allow_downscale,
+        encoders=encoders,
+        min_ssim=min_ssim,
+        min_psnr=min_psnr
     )
     
-    if not image_files:
-        print("❌ Không tìm thấy ảnh nào!")
-        return 0, 0, 0, 0
+    stats = {'found': 0, 'success': 0, 'errors': 0, 'old_size': 0, 'new_size': 0, 'encodes': 0,
+             'skipped': 0, 'scanning': True}
+    progress = ProgressBar(1, prefix="Đang xử lý:")
     
-    print(f"📸 Tìm thấy {len(image_files)} ảnh\n")
-    log_info(f"Bắt đầu nén {len(image_files)} ảnh")
+    manifest = ImageManifest(output_dir) if incremental else None
+    hash_algo = get_fastest_algorithm() if incremental else None
     
-    # Bước 2: Tạo thư mục đầu ra
-    ensure_directory_exists(output_dir)
+    def update_total():
+        # Đang quét thì tổng tạm tính hơn 1 (chưa xuống dòng giữa chừng)
+        progress.total = max(stats['found'] + (1 if stats['scanning'] else 0), 1)
     
-    # Bước 3: Chuẩn bị tasks
-    tasks = []
-    for img_path in image_files:
-        filename = os.path.basename(img_path)
-        
-        # Đổi extension nếu convert format
-        if convert_format:
-            name_without_ext = os.path.splitext(filename)[0]
-            ext = convert_format.lower()
-            if ext == "jpeg":
-                ext = "jpg"
-            filename = f"{name_without_ext}.{ext}"
-        
-        output_path = os.path.join(output_dir, filename)
+    def should_skip(entry: FileEntry, task: dict) -> bool:
+        if manifest is None:
+            return False
+        filename = os.path.relpath(entry.path, input_dir)
+        if not manifest.is_unchanged(filename, entry.path, entry.stat, settings_key(task)):
+            return False
+        stats['skipped'] += 1
+        update_total()
+        progress.update(message=f"⏭️  {filename}")
+        return True
+    
+    def record(entry: FileEntry, task: dict, result: Tuple):
+        success, message, old_size, new_size, encodes, written_path, digest = result
+        filename = os.path.relpath(task['input_path'], input_dir)
+        update_total()
         
-        tasks.append({
-            'input_path': img_path,
-            'output_path': output_path,
-            'quality': quality,
-            'optimize': optimize,
-            'max_size_kb': max_size_kb,
-            'convert_format': convert_format,
-            'resize_width': resize_width,
-            'resize_height': resize_height
-        })
-    
-    # Bước 4: Xử lý ảnh
-    success_count = 0
-    error_count = 0
-    total_old_size = 0
-    total_new_size = 0
-    
-    progress = ProgressBar(len(tasks), prefix="Đang xử lý:")
-    
-    if use_multiprocessing and len(tasks) > 1:
-        # Xử lý song song với multiprocessing
-        import multiprocessing
-        if max_workers is None:
-            max_workers = min(multiprocessing.cpu_count(), len(tasks))
-        
-        with ProcessPoolExecutor(max_workers=max_workers) as executor:
-            futures = {
-                executor.submit(
-                    compress_single_image,
-                    task['input_path'],
-                    task['output_path'],
-                    task['quality'],
-                    task['optimize'],
-                    task['max_size_kb'],
-                    task['convert_format'],
-                    task['resize_width'],
-                    task['resize_height']
-                ): task for task in tasks
-            }
-            
-            for future in as_completed(futures):
-                task = futures[future]
-                filename = os.path.basename(task['input_path'])
-                
-                try:
-                    success, message, old_size, new_size = future.result()
-                    
-                    if success:
-                        success_count += 1
-                        total_old_size += old_size
-                        total_new_size += new_size
-                        progress.update(message=f"✅ {filename}")
-                        log_info(f"Nén thành công: {filename} - {message}")
-                    else:
-                        error_count += 1
-                        progress.update(message=f"❌ {filename}: {message}")
-                        log_error(f"Lỗi nén {filename}: {message}")
-                
-                except Exception as e:
-                    error_count += 1
-                    progress.update(message=f"❌ {filename}: {str(e)}")
-                    log_error(f"Exception khi nén {filename}: {str(e)}")
-    else:
-        # Xử lý tuần tự
-        for task in tasks:
-            filename = os.path.basename(task['input_path'])
+        if success:
+            stats['success'] += 1
+            stats['old_size'] += old_size
+            stats['new_size'] += new_size
+            stats['encodes'] += encodes
+            progress.update(message=f"✅ {filename}")
+            log_info(f"Nén thành công: {filename} - {message}")
+            if manifest is not None and digest:
+                manifest.add(filename, entry.stat, hash_algo, digest,
+                             settings_key(task), written_path, new_size)
+        else:
+            stats['errors'] += 1
+            progress.update(message=f"❌ {filename}: {message}")
+            log_error(f"Lỗi nén {filename}: {message}")
+    
+    try:
+        if use_multiprocessing:
+            # Xử lý song song, nạp task dần từ generator
+            max_workers = max_workers or os.cpu_count() or 1
+            max_pending = max_workers * MAX_PENDING_PER_WORKER
+            pending = {}
             
-            success, message, old_size, new_size = compress_single_image(
-                task['input_path'],
-                task['output_path'],
-                task['quality'],
-                task['optimize'],
-                task['max_size_kb'],
-                task['convert_format'],
-                task['resize_width'],
-                task['resize_height']
-            )
+            def collect(futures):
+                for future in futures:
+                    entry, task = pending.pop(future)
+                    try:
+                        record(entry, task, future.result())
+                    except Exception as e:
+                        record(entry, task, (False, str(e), 0, 0, 0, None, None))
             
-            if success:
-                success_count += 1
-                total_old_size += old_size
-                total_new_size += new_size
-                progress.update(message=f"✅ {filename}")
-                log_info(f"Nén thành công: {filename} - {message}")
-            else:
-                error_count += 1
-                progress.update(message=f"❌ {filename}: {message}")
-                log_error(f"Lỗi nén {filename}: {message}")
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                for entry, task in tasks:
+                    stats['found'] += 1
+                    if should_skip(entry, task):
+                        continue
+                    if len(pending) >= max_pending:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    pending[executor.submit(process_image_task, task, hash_algo)] = (entry, task)
+                
+                stats['scanning'] = False
+                collect(list(as_completed(pending)))
+        else:
+            # Xử lý tuần tự
+            for entry, task in tasks:
+                stats['found'] += 1
+                if not should_skip(entry, task):
+                    record(entry, task, process_image_task(task, hash_algo))
+    finally:
+        if manifest is not None:
+            manifest.close()
+    
+    stats['scanning'] = False
+    if stats['found'] == 0:
+        print("❌ Không tìm thấy ảnh nào!")
+        return 0, 0, 0, 0, 0, 0
     
-    progress.finish()
+    progress.total = stats['found']
+    if stats['skipped']:
+        progress.finish(f"Đã xử lý {stats['found']} ảnh ({stats['skipped']} ảnh không đổi, bỏ qua)")
+    else:
+        progress.finish(f"Đã xử lý {stats['found']} ảnh")
+    log_info(f"Bỏ qua {stats['skipped']} ảnh không đổi (incremental={incremental})")
     
-    return success_count, error_count, total_old_size, total_new_size
+    return (stats['success'], stats['errors'], stats['old_size'], stats['new_size'],
+            stats['encodes'], stats['skipped'])
 
 
 def main_interactive():
@@ -354,16 +1202,47 @@ def main_interactive():
     
     # Convert format
     convert_format = get_user_input(
-        "Muốn đổi sang định dạng nào? (jpg, png, webp - Enter để giữ nguyên)",
+        "Muốn đổi sang định dạng nào? (jpg, png, webp, avif - Enter để giữ nguyên)",
         default=None
     )
-    if convert_format and convert_format.lower() not in ['jpg', 'jpeg', 'png', 'webp', 'bmp']:
+    if convert_format and convert_format.lower() not in ['jpg', 'jpeg', 'png', 'webp', 'bmp', 'avif']:
         print("⚠️  Format không hợp lệ, giữ nguyên format gốc")
         convert_format = None
+    elif convert_format and convert_format.lower() == 'avif' and not AVIF_AVAILABLE:
+        print("⚠️  Pillow chưa hỗ trợ AVIF (pip install pillow-avif-plugin), giữ nguyên format gốc")
+        convert_format = None
+    
+    # Chọn file nhỏ nhất đạt chất lượng (thay cho đổi format)
+    encoders = None
+    min_ssim = None
+    if not convert_format and NUMPY_AVAILABLE:
+        best_input = get_user_input(
+            "Thử nhiều encoder, giữ file nhỏ nhất đạt ngưỡng SSIM? (y/N)", default="n"
+        )
+        if best_input.lower() == "y":
+            print(f"   Encoder có sẵn: {', '.join(available_encoders())}")
+            encoders_input = get_user_input("Nhập encoder cần thử (cách nhau bởi dấu cách, Enter = tất cả)",
+                                            default=None)
+            encoders = [name for name in (encoders_input or '').split() if name in ENCODERS] \
+                or available_encoders()
+            ssim_input = get_user_input(f"SSIM tối thiểu (0-1, mặc định {DEFAULT_MIN_SSIM})",
+                                        default=str(DEFAULT_MIN_SSIM))
+            try:
+                min_ssim = max(0.0, min(1.0, float(ssim_input)))
+            except ValueError:
+                min_ssim = DEFAULT_MIN_SSIM
     
     # Max size
-    max_size_input = get_user_input("Nhập dung lượng tối đa mỗi ảnh (KB, Enter để bỏ qua)", default=None)
-    max_size_kb = int(max_size_input) if max_size_input and max_size_input.isdigit() else None
+    max_size_kb = None
+    if not encoders:
+        max_size_input = get_user_input("Nhập dung lượng tối đa mỗi ảnh (KB, Enter để bỏ qua)", default=None)
+        max_size_kb = int(max_size_input) if max_size_input and max_size_input.isdigit() else None
+    allow_downscale = False
+    if max_size_kb:
+        downscale_input = get_user_input(
+            "Cho phép thu nhỏ ảnh nếu quality thấp nhất vẫn vượt dung lượng? (y/N)", default="n"
+        )
+        allow_downscale = downscale_input.lower() == "y"
     
     # Resize
     resize_w_input = get_user_input("Nhập chiều rộng (px, Enter để bỏ qua)", default=None)
@@ -372,6 +1251,16 @@ def main_interactive():
     resize_h_input = get_user_input("Nhập chiều cao (px, Enter để bỏ qua)", default=None)
     resize_height = int(resize_h_input) if resize_h_input and resize_h_input.isdigit() else None
     
+    # Thư mục con
+    recursive_input = get_user_input("Xử lý cả thư mục con (giữ nguyên cấu trúc)? (y/N)", default="n")
+    recursive = recursive_input.lower() == "y"
+    
+    # Incremental
+    incremental_input = get_user_input(
+        "Bỏ qua ảnh đã nén ở lần chạy trước vào cùng thư mục đầu ra? (y/N)", default="n"
+    )
+    incremental = incremental_input.lower() == "y"
+    
     # Multiprocessing
     use_mp = get_user_input("Sử dụng multiprocessing? (Y/n, mặc định Yes)", default="y")
     use_multiprocessing = use_mp.lower() != "n"
@@ -384,10 +1273,14 @@ def main_interactive():
     print(f"⚡ Optimize: {'Có' if optimize else 'Không'}")
     if convert_format:
         print(f"🔄 Format: {convert_format.upper()}")
+    if encoders:
+        print(f"🏆 Chọn file nhỏ nhất (SSIM >= {min_ssim}): {', '.join(encoders)}")
     if max_size_kb:
-        print(f"📊 Dung lượng tối đa: {max_size_kb} KB")
+        print(f"📊 Dung lượng tối đa: {max_size_kb} KB{' (cho phép thu nhỏ ảnh)' if allow_downscale else ''}")
     if resize_width or resize_height:
         print(f"📏 Resize: {resize_width or 'auto'}x{resize_height or 'auto'} px")
+    print(f"📂 Thư mục con: {'Có' if recursive else 'Không'}")
+    print(f"⏭️  Incremental: {'Có' if incremental else 'Không'}")
     print(f"⚡ Multiprocessing: {'Có' if use_multiprocessing else 'Không'}")
     
     if not confirm_action("Bắt đầu xử lý?"):
@@ -397,9 +1290,11 @@ def main_interactive():
     # Xử lý
     print(f"\n🚀 Bắt đầu nén ảnh...\n")
     
-    success, errors, old_size, new_size = batch_compress_images(
+    success, errors, old_size, new_size, encodes, skipped = batch_compress_images(
         input_dir, output_dir, quality, optimize, max_size_kb,
-        convert_format, resize_width, resize_height, use_multiprocessing
+        convert_format, resize_width, resize_height, use_multiprocessing,
+        allow_downscale=allow_downscale, recursive=recursive, incremental=incremental,
+        encoders=encoders, min_ssim=min_ssim
     )
     
     # Hiển thị kết quả
@@ -407,11 +1302,15 @@ def main_interactive():
     print(f"✅ Hoàn thành!")
     print(f"   - Thành công: {success} ảnh")
     print(f"   - Lỗi: {errors} ảnh")
+    if skipped:
+        print(f"   - Bỏ qua (không đổi): {skipped} ảnh")
     print(f"   - Dung lượng gốc: {format_size(old_size)}")
     print(f"   - Dung lượng mới: {format_size(new_size)}")
     if old_size > 0:
         reduction = ((old_size - new_size) / old_size) * 100
         print(f"   - Tiết kiệm: {format_size(old_size - new_size)} ({reduction:.1f}%)")
+    if success > 0:
+        print(f"   - Số lần encode: {encodes} (trung bình {encodes / success:.1f}/ảnh)")
     print(f"   - Thư mục: {output_dir}")
     print(f"{'='*60}")
     
@@ -434,8 +1333,28 @@ def main_cli(args):
         print(f"❌ Thư mục không tồn tại: {args.input}")
         return 1
     
+    # Validate encoder / ngưỡng chất lượng
+    select_best = bool(args.encoders) and (
+        len(args.encoders) > 1 or args.min_ssim is not None or args.min_psnr is not None
+    )
+    if (args.min_ssim is not None or args.min_psnr is not None) and not args.encoders:
+        args.encoders = available_encoders()
+        select_best = True
+    if args.encoders and args.format:
+        print("❌ Không dùng chung -f với --encoders")
+        return 1
+    if select_best and args.max_size:
+        print("❌ Không dùng chung --max-size với chế độ chọn file nhỏ nhất (--encoders/--min-ssim/--min-psnr)")
+        return 1
+    if select_best and not NUMPY_AVAILABLE:
+        print("❌ Cần NumPy để tính SSIM/PSNR: pip install numpy")
+        return 1
+    if 'avif' in (args.encoders or []) + [args.format] and not AVIF_AVAILABLE:
+        print("❌ Pillow chưa hỗ trợ AVIF: pip install pillow-avif-plugin (hoặc Pillow >= 11.3)")
+        return 1
+    
     # Xử lý
-    success, errors, old_size, new_size = batch_compress_images(
+    success, errors, old_size, new_size, encodes, skipped = batch_compress_images(
         args.input,
         args.output,
         args.quality,
@@ -444,14 +1363,23 @@ def main_cli(args):
         args.format,
         args.width,
         args.height,
-        not args.no_multiprocessing
+        not args.no_multiprocessing,
+        max_workers=args.workers,
+        allow_downscale=args.downscale,
+        recursive=args.recursive,
+        incremental=args.incremental,
+        encoders=args.encoders,
+        min_ssim=args.min_ssim,
+        min_psnr=args.min_psnr
     )
     
     # Hiển thị kết quả ngắn gọn
-    print(f"\n✅ {success} thành công, ❌ {errors} lỗi")
+    print(f"\n✅ {success} thành công, ❌ {errors} lỗi" + (f", ⏭️  {skipped} bỏ qua" if skipped else ""))
     if old_size > 0:
         reduction = ((old_size - new_size) / old_size) * 100
         print(f"💾 Tiết kiệm: {format_size(old_size - new_size)} ({reduction:.1f}%)")
+    if success > 0:
+        print(f"🔁 Encode: {encodes} lần (trung bình {encodes / success:.1f}/ảnh)")
     
     return 0 if errors == 0 else 1
 
@@ -484,6 +1412,24 @@ Ví dụ:
   
   # Giới hạn dung lượng tối đa 500KB
   python compress-images.py -i ./images -o ./output --max-size 500
+  
+  # Cả cây thư mục con, đầu ra giữ nguyên cấu trúc
+  python compress-images.py -i ./uploads -o ./optimized -r -w 1920
+  
+  # Chạy hằng đêm: chỉ nén ảnh mới/đã đổi (cần -o cố định)
+  python compress-images.py -i ./media -o ./media_optimized -r --incremental
+  
+  # Thử mọi encoder, giữ file nhỏ nhất có SSIM >= 0.97
+  python compress-images.py -i ./images -o ./output --min-ssim 0.97
+  
+  # Chỉ so WebP lossless/near-lossless và PNG bảng màu, PSNR >= 40 dB
+  python compress-images.py -i ./icons -o ./output -e webp-lossless webp-near-lossless png-palette --min-psnr 40
+  
+  # JPEG progressive
+  python compress-images.py -i ./images -o ./output -e jpeg-progressive -q 80
+  
+  # Tối đa 200KB, cho phép thu nhỏ ảnh nếu cần
+  python compress-images.py -i ./images -o ./output --max-size 200 --downscale
         """
     )
     
@@ -493,13 +1439,26 @@ Ví dụ:
                        help='Chất lượng nén (1-100, mặc định: 70)')
     parser.add_argument('--no-optimize', dest='optimize', action='store_false',
                        help='Tắt optimization')
-    parser.add_argument('-f', '--format', choices=['jpg', 'jpeg', 'png', 'webp'],
+    parser.add_argument('-f', '--format', choices=['jpg', 'jpeg', 'png', 'webp', 'avif'],
                        help='Đổi sang định dạng khác')
+    parser.add_argument('-e', '--encoders', nargs='+', choices=list(ENCODERS),
+                       help='Encoder cần dùng; nhiều encoder -> giữ file nhỏ nhất đạt ngưỡng chất lượng')
+    parser.add_argument('--min-ssim', type=float,
+                       help=f'SSIM tối thiểu khi chọn file nhỏ nhất (mặc định: {DEFAULT_MIN_SSIM}, cần numpy)')
+    parser.add_argument('--min-psnr', type=float,
+                       help='PSNR tối thiểu (dB) khi chọn file nhỏ nhất (cần numpy)')
     parser.add_argument('--max-size', type=int, help='Dung lượng tối đa (KB)')
+    parser.add_argument('--downscale', action='store_true',
+                       help='Cho phép thu nhỏ ảnh nếu quality thấp nhất vẫn vượt --max-size')
     parser.add_argument('-w', '--width', type=int, help='Chiều rộng mới (px)')
     parser.add_argument('-H', '--height', type=int, help='Chiều cao mới (px)')
     parser.add_argument('--no-multiprocessing', action='store_true',
                        help='Tắt multiprocessing')
+    parser.add_argument('--workers', type=int, help='Số process nén (mặc định: số CPU)')
+    parser.add_argument('-r', '--recursive', action='store_true',
+                       help='Xử lý cả thư mục con, đầu ra giữ nguyên cấu trúc thư mục')
+    parser.add_argument('--incremental', action='store_true',
+                       help=f'Bỏ qua ảnh không đổi so với lần chạy trước (manifest {MANIFEST_FILE} trong thư mục đầu ra)')
     
     # Parse arguments
     args, unknown = parser.parse_known_args()
@@ -507,6 +1466,8 @@ Ví dụ:
     # Nếu có -i thì dùng CLI mode
     if args.input:
         if not args.output:
+            if args.incremental:
+                print("⚠️  --incremental cần -o cố định (thư mục mặc định đổi theo thời gian)")
             timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
             args.output = os.path.join(args.input, f"compressed_{timestamp}")
         
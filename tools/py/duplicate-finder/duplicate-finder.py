@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-Tool: Tìm file trùng lặp dựa trên hash (MD5/SHA256)
+Tool: Tìm file trùng lặp dựa trên hash (MD5/SHA256/xxHash/BLAKE3)
 
 Mục đích: Phát hiện và xóa file trùng lặp để tiết kiệm dung lượng
 Lý do: Dọn dẹp ổ đĩa, tối ưu không gian lưu trữ
@@ -9,485 +9,2635 @@ Lý do: Dọn dẹp ổ đĩa, tối ưu không gian lưu trữ
 
 import os
 import sys
-import hashlib
+import csv
+import json
+import time
+import shutil
+import sqlite3
+import filecmp
 import argparse
 from pathlib import Path
+from itertools import combinations
 from collections import defaultdict
-from typing import Dict, List, Tuple, Optional
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Tuple, Optional
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# Pillow + NumPy (tùy chọn): cần cho chế độ tìm ảnh gần giống
+try:
+    from PIL import Image
+    import numpy as np
+    IMAGE_HASH_AVAILABLE = True
+except ImportError:
+    IMAGE_HASH_AVAILABLE = False
+
+# fcntl chỉ có trên Unix (cần cho reflink qua ioctl FICLONE)
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
 
 # Thêm thư mục cha vào sys.path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils import (
     print_header, format_size, get_user_input, confirm_action,
-    ProgressBar, log_info, log_error, setup_logger, safe_delete, normalize_path
+    ProgressBar, log_info, log_error, log_warning, setup_logger, safe_delete, normalize_path,
+    parallel_scan_files, DEFAULT_SCAN_WORKERS,
+    get_hasher, resolve_algorithm, known_algorithms, get_fastest_algorithm, is_cryptographic,
+    hash_file, benchmark_hash_engines, IO_ENGINES, DEFAULT_BLOCK_SIZE
 )
 
 
-def get_file_hash(file_path: str, hash_algo: str = 'md5', chunk_size: int = 8192) -> Optional[str]:
+# Kích thước khối mặc định cho bước lọc nhanh (hash khối đầu/cuối)
+PREFILTER_BLOCK_SIZE = 4096
+
+# Giới hạn mỗi batch gửi sang worker process (số file / tổng bytes cần đọc)
+HASH_BATCH_MAX_FILES = 256
+HASH_BATCH_MAX_BYTES = 64 * 1024 * 1024
+
+# Số batch tối đa đang chờ xử lý trên mỗi worker
+HASH_BATCHES_PER_WORKER = 2
+
+# Số file tối đa mỗi đợt khi ghi báo cáo streaming (mỗi đợt gồm trọn các nhóm size)
+STREAM_WAVE_MAX_FILES = 4096
+
+# Định dạng báo cáo hỗ trợ
+REPORT_FORMATS = ['text', 'ndjson', 'csv']
+
+# Chế độ tìm ảnh gần giống: số bit hash và ngưỡng Hamming mặc định
+PERCEPTUAL_HASH_BITS = 64
+DEFAULT_SIMILAR_THRESHOLD = 8
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif', '.tif', '.tiff']
+
+# Cache ma trận DCT theo kích thước
+_dct_matrices = {}
+
+
+def get_user_cache_dir() -> str:
     """
-    Tính hash của file
-    
-    Args:
-        file_path: Đường dẫn file
-        hash_algo: Thuật toán hash (md5, sha1, sha256)
-        chunk_size: Kích thước chunk đọc file (bytes)
+    Thư mục cache theo user (không phụ thuộc thư mục đang chạy tool)
     
     Returns:
-        str: Hash string hoặc None nếu lỗi
-    
-    Giải thích:
-    - Đọc file theo chunk để tránh tràn RAM với file lớn
-    - Hash từng chunk và cập nhật vào hasher
-    - Trả về hex digest
+        str: %LOCALAPPDATA%\\myPythonTool trên Windows,
+             $XDG_CACHE_HOME/myPythonTool hoặc ~/.cache/myPythonTool trên Linux/macOS
     """
-    # Chọn thuật toán hash
-    if hash_algo == 'md5':
-        hasher = hashlib.md5()
-    elif hash_algo == 'sha1':
-        hasher = hashlib.sha1()
-    elif hash_algo == 'sha256':
-        hasher = hashlib.sha256()
+    if os.name == 'nt' and os.environ.get('LOCALAPPDATA'):
+        base = os.environ['LOCALAPPDATA']
     else:
-        hasher = hashlib.md5()
-    
-    try:
-        with open(file_path, 'rb') as f:
-            while True:
-                chunk = f.read(chunk_size)
-                if not chunk:
-                    break
-                hasher.update(chunk)
-        return hasher.hexdigest()
-    except (IOError, OSError, PermissionError) as e:
-        log_error(f"Lỗi đọc file {file_path}: {e}")
-        return None
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'myPythonTool')
 
 
-def get_file_hash_with_size(args: Tuple[str, int, str]) -> Tuple[str, Optional[str], int]:
-    """
-    Wrapper function cho multiprocessing
-    
-    Args:
-        args: tuple (file_path, size, hash_algo)
-    
-    Returns:
-        tuple: (file_path, hash, size)
-    
-    Giải thích:
-    - Wrapper để dùng với ProcessPoolExecutor
-    - Trả về cả path và hash và size
-    """
-    file_path, size, hash_algo = args
-    file_hash = get_file_hash(file_path, hash_algo)
-    return file_path, file_hash, size
+# File cache hash mặc định (theo user, dùng chung cho mọi thư mục chạy)
+DEFAULT_CACHE_FILE = os.path.join(get_user_cache_dir(), 'duplicate-finder_hashes.db')
 
+# Chu kỳ ghi checkpoint của lần quét (giây)
+CHECKPOINT_INTERVAL = 30
 
-class DuplicateFinder:
+# Cách thay file trùng lặp bằng liên kết
+LINK_METHODS = ['hardlink', 'reflink']
+
+# ioctl FICLONE (linux/fs.h): chia sẻ extent giữa 2 file trên btrfs/XFS
+FICLONE = 0x40049409
+
+# Hậu tố file tạm khi swap (tạo cạnh file đích để os.replace là atomic)
+LINK_TEMP_SUFFIX = '.dupfinder-tmp'
+
+
+class HashCache:
     """
-    Class tìm file trùng lặp
+    Cache hash lưu trên đĩa (SQLite)
     
-    Mục đích: Tập trung logic tìm duplicate, dễ mở rộng
+    Mục đích: Không phải hash lại file không đổi giữa các lần quét
+    Lý do: Quét lại thư mục lớn chỉ tốn một lượt stat thay vì đọc toàn bộ dữ liệu
+    
+    Giải thích:
+    - Khóa: (st_dev, st_ino, algo), kèm size và mtime_ns để phát hiện file đã đổi
+    - Row có size/mtime_ns khác với stat hiện tại bị coi là cũ và bị ghi đè
+    - Lưu thêm path để prune các row của file đã bị xóa
     """
     
-    def __init__(self, folder_path: str, recursive: bool = True, 
-                 min_size: int = 0, hash_algo: str = 'md5'):
+    def __init__(self, db_path: str, readonly: bool = False):
         """
-        Khởi tạo DuplicateFinder
+        Mở (hoặc tạo) file cache
         
         Args:
-            folder_path: Thư mục cần quét
-            recursive: Có quét thư mục con không
-            min_size: Kích thước tối thiểu (bytes)
-            hash_algo: Thuật toán hash
+            db_path: Đường dẫn file SQLite
+            readonly: Chỉ đọc (dùng trong worker process)
         """
-        self.folder_path = Path(folder_path).resolve()
-        self.recursive = recursive
-        self.min_size = min_size
-        self.hash_algo = hash_algo
-        self.file_count = 0
+        self.db_path = db_path
+        
+        if not readonly:
+            db_dir = os.path.dirname(os.path.abspath(db_path))
+            Path(db_dir).mkdir(parents=True, exist_ok=True)
+        
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        
+        if not readonly:
+            # WAL cho phép worker đọc trong khi process chính ghi
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS file_hashes (
+                    dev INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    algo TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    digest TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (dev, inode, algo)
+                )
+            """)
+            self.conn.commit()
     
-    def find_by_size_first(self, use_multiprocessing: bool = True) -> Dict[str, List[Tuple[str, int]]]:
+    def lookup(self, stat_key: Tuple[int, int, int, int], algo: str) -> Optional[str]:
         """
-        Tìm duplicate bằng cách filter theo size trước
+        Tìm digest đã cache
         
         Args:
-            use_multiprocessing: Có dùng multiprocessing không
+            stat_key: (st_dev, st_ino, st_size, st_mtime_ns) của file
+            algo: Tên thuật toán (có thể kèm hậu tố cho hash khối đầu)
         
         Returns:
-            dict: {hash: [(file_path, size), ...]}
+            str: Digest nếu cache còn hợp lệ, None nếu không có hoặc đã cũ
+        """
+        dev, inode, size, mtime_ns = stat_key
+        try:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, digest FROM file_hashes "
+                "WHERE dev = ? AND inode = ? AND algo = ?",
+                (dev, inode, algo)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
         
-        Giải thích:
-        - Bước 1: Group files theo size
-        - Bước 2: Chỉ hash các file có size trùng nhau
-        - Tối ưu hơn so với hash tất cả file
+        if row and row[0] == size and row[1] == mtime_ns:
+            return row[2]
+        return None
+    
+    def store_many(self, rows: List[Tuple[Tuple[int, int, int, int], str, str, str]]) -> None:
         """
-        log_info(f"Bắt đầu quét thư mục: {self.folder_path}")
+        Ghi nhiều digest vào cache trong một transaction
         
-        # Bước 1: Group theo size
-        print("🔍 Bước 1: Quét và group theo kích thước...\n")
-        size_dict = defaultdict(list)
+        Args:
+            rows: Danh sách (stat_key, algo, digest, file_path)
         
-        if self.recursive:
-            for root, dirs, files in os.walk(self.folder_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    try:
-                        size = os.path.getsize(file_path)
-                        
-                        if size < self.min_size:
-                            continue
-                        
-                        size_dict[size].append(file_path)
-                        self.file_count += 1
-                        
-                        if self.file_count % 100 == 0:
-                            print(f"   Đã quét {self.file_count} file...", end='\r')
-                    
-                    except (OSError, PermissionError):
-                        pass
-        else:
-            for file in os.listdir(self.folder_path):
-                file_path = os.path.join(self.folder_path, file)
-                if os.path.isfile(file_path):
-                    try:
-                        size = os.path.getsize(file_path)
-                        
-                        if size < self.min_size:
-                            continue
-                        
-                        size_dict[size].append(file_path)
-                        self.file_count += 1
-                    
-                    except (OSError, PermissionError):
-                        pass
+        Giải thích:
+        - INSERT OR REPLACE ghi đè row cũ của cùng inode (invalidate tự động)
+        """
+        if not rows:
+            return
         
-        print(f"   Đã quét {self.file_count} file.       ")
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO file_hashes "
+                "(dev, inode, algo, size, mtime_ns, digest, path, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (key[0], key[1], algo, key[2], key[3], digest, file_path, now)
+                    for key, algo, digest, file_path in rows
+                ]
+            )
+    
+    def prune(self) -> Tuple[int, int]:
+        """
+        Xóa các row của file không còn tồn tại hoặc đã thay đổi
         
-        # Lọc chỉ lấy size có nhiều hơn 1 file (potential duplicates)
-        potential_duplicates = {s: files for s, files in size_dict.items() if len(files) > 1}
+        Returns:
+            tuple: (removed, kept)
+        """
+        stale = []
+        kept = 0
         
-        if not potential_duplicates:
-            print("\n✅ Không có file nào có cùng kích thước!")
-            return {}
+        rows = self.conn.execute(
+            "SELECT DISTINCT dev, inode, size, mtime_ns, path FROM file_hashes"
+        ).fetchall()
         
-        # Đếm số file cần hash
-        files_to_hash = sum(len(files) for files in potential_duplicates.values())
-        print(f"\n🔍 Bước 2: Tìm thấy {files_to_hash} file có cùng kích thước")
-        print(f"   Đang tính hash...\n")
+        for dev, inode, size, mtime_ns, file_path in rows:
+            if get_stat_key(file_path) == (dev, inode, size, mtime_ns):
+                kept += 1
+            else:
+                stale.append((dev, inode, size, mtime_ns))
         
-        log_info(f"Tìm thấy {files_to_hash} file potential duplicate")
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM file_hashes WHERE dev = ? AND inode = ? AND size = ? AND mtime_ns = ?",
+                stale
+            )
         
-        # Bước 2: Hash các file có cùng size
-        hash_dict = defaultdict(list)
+        return len(stale), kept
+    
+    def compact(self) -> None:
+        """Thu gọn file cache sau khi prune (VACUUM)"""
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.conn.execute("VACUUM")
+    
+    def close(self) -> None:
+        """Đóng kết nối"""
+        self.conn.close()
+
+
+class ScanState:
+    """
+    Checkpoint của một lần quét (SQLite)
+    
+    Mục đích: Quét bị ngắt (Ctrl+C, crash, mất SSH) thì chạy --resume để làm tiếp
+    Lý do: Quét ổ mạng chậm có thể mất nhiều giờ, không nên làm lại từ đầu
+    
+    Giải thích:
+    - meta: tùy chọn quét và phase hiện tại ('scan' -> 'hash' -> 'done')
+    - dirs: thư mục đã ghi xong toàn bộ file (resume không stat lại file trong đó)
+    - files: file đã quét (path, size, inode, mtime), kèm thư mục cha
+    - hashes: digest đã tính theo từng bước (khối đầu/cuối, toàn bộ file), kèm
+      (st_dev, st_ino, st_size, st_mtime_ns) lúc hash -> resume chỉ dùng lại digest
+      khi file không đổi (giống HashCache)
+    - Commit theo chu kỳ CHECKPOINT_INTERVAL giây và khi chuyển phase/đóng
+    """
+    
+    def __init__(self, db_path: str):
+        """
+        Mở (hoặc tạo) file trạng thái
         
-        if use_multiprocessing and files_to_hash > 5:
-            # Sử dụng multiprocessing
-            progress = ProgressBar(files_to_hash, prefix="Tính hash:")
-            
-            # Chuẩn bị tasks
-            tasks = []
-            for size, file_paths in potential_duplicates.items():
-                for file_path in file_paths:
-                    tasks.append((file_path, size, self.hash_algo))
-            
-            # Xử lý song song
-            import multiprocessing
-            max_workers = min(multiprocessing.cpu_count(), files_to_hash)
-            
-            with ProcessPoolExecutor(max_workers=max_workers) as executor:
-                futures = [executor.submit(get_file_hash_with_size, task) for task in tasks]
-                
-                for future in as_completed(futures):
-                    try:
-                        file_path, file_hash, size = future.result()
-                        
-                        if file_hash:
-                            hash_dict[file_hash].append((file_path, size))
-                        
-                        progress.update()
-                    
-                    except Exception as e:
-                        log_error(f"Lỗi khi hash: {e}")
-                        progress.update()
-            
-            progress.finish()
+        Args:
+            db_path: Đường dẫn file SQLite
+        """
+        self.db_path = db_path
+        Path(os.path.dirname(os.path.abspath(db_path))).mkdir(parents=True, exist_ok=True)
         
-        else:
-            # Xử lý tuần tự
-            progress = ProgressBar(files_to_hash, prefix="Tính hash:")
-            
-            for size, file_paths in potential_duplicates.items():
-                for file_path in file_paths:
-                    file_hash = get_file_hash(file_path, self.hash_algo)
-                    if file_hash:
-                        hash_dict[file_hash].append((file_path, size))
-                    progress.update()
-            
-            progress.finish()
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                dir TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                dev INTEGER,
+                inode INTEGER,
+                mtime_ns INTEGER
+            );
+        """)
         
-        # Lọc chỉ lấy hash có nhiều hơn 1 file (thực sự duplicate)
-        duplicates = {h: files for h, files in hash_dict.items() if len(files) > 1}
+        # Checkpoint cũ: digest không kèm stat -> không kiểm tra được, bỏ để hash lại
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(hashes)")}
+        if columns and 'mtime_ns' not in columns:
+            self.conn.execute("DROP TABLE hashes")
+        if 'mtime_ns' not in {row[1] for row in self.conn.execute("PRAGMA table_info(files)")}:
+            self.conn.execute("ALTER TABLE files ADD COLUMN mtime_ns INTEGER")
         
-        log_info(f"Tìm thấy {len(duplicates)} nhóm file trùng lặp")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS hashes (
+                stage TEXT NOT NULL,
+                path TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                dev INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                PRIMARY KEY (stage, path)
+            )
+        """)
+        self.conn.commit()
         
-        return duplicates
+        self._hashes: Dict[str, Dict[str, Tuple[str, Tuple[int, int, int, int]]]] = {}
+        self._last_commit = time.monotonic()
     
-    def find_by_size_only(self) -> Dict[int, List[str]]:
+    def get_meta(self, key: str, default=None):
+        """Đọc một giá trị meta (lưu dạng JSON)"""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+    
+    def set_meta(self, key: str, value) -> None:
+        """Ghi một giá trị meta và commit ngay"""
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                              (key, json.dumps(value, ensure_ascii=False)))
+    
+    def _maybe_commit(self) -> None:
+        """Commit nếu đã quá CHECKPOINT_INTERVAL giây kể từ lần commit trước"""
+        if time.monotonic() - self._last_commit >= CHECKPOINT_INTERVAL:
+            self.checkpoint()
+    
+    def checkpoint(self) -> None:
+        """Ghi xuống đĩa các thay đổi đang chờ"""
+        self.conn.commit()
+        self._last_commit = time.monotonic()
+    
+    def load_scan(self) -> Tuple[Dict[int, List[Tuple[str, Optional[Tuple[int, int]]]]], set]:
         """
-        Tìm duplicate chỉ dựa vào size (nhanh nhưng không chính xác)
+        Đọc kết quả quét đã lưu
         
         Returns:
-            dict: {size: [file_paths]}
+            tuple: ({size: [(file_path, inode_key), ...]}, set thư mục đã xong)
         
         Giải thích:
-        - Chỉ so sánh size, không hash
-        - Nhanh nhưng có thể false positive
-        - Hữu ích cho quick scan
+        - File thuộc thư mục chưa xong bị xóa khỏi state, lần quét tiếp sẽ ghi lại
+          (tránh một file xuất hiện 2 lần)
         """
-        print("🔍 Đang quét file theo kích thước...\n")
-        log_info("Quét theo size only")
+        with self.conn:
+            self.conn.execute("DELETE FROM files WHERE dir NOT IN (SELECT path FROM dirs)")
         
         size_dict = defaultdict(list)
+        for file_path, size, dev, inode in self.conn.execute(
+                "SELECT path, size, dev, inode FROM files"):
+            size_dict[size].append((file_path, (dev, inode) if inode else None))
         
-        if self.recursive:
-            for root, dirs, files in os.walk(self.folder_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    try:
-                        size = os.path.getsize(file_path)
-                        
-                        if size < self.min_size:
-                            continue
-                        
-                        size_dict[size].append(file_path)
-                        self.file_count += 1
-                        
-                        if self.file_count % 100 == 0:
-                            print(f"   Đã quét {self.file_count} file...", end='\r')
-                    
-                    except (OSError, PermissionError):
-                        pass
-        else:
-            for file in os.listdir(self.folder_path):
-                file_path = os.path.join(self.folder_path, file)
-                if os.path.isfile(file_path):
-                    try:
-                        size = os.path.getsize(file_path)
-                        
-                        if size < self.min_size:
-                            continue
-                        
-                        size_dict[size].append(file_path)
-                        self.file_count += 1
-                    
-                    except (OSError, PermissionError):
-                        pass
+        done_dirs = {row[0] for row in self.conn.execute("SELECT path FROM dirs")}
+        return size_dict, done_dirs
+    
+    def add_file(self, file_path: str, size: int, inode_key: Optional[Tuple[int, int]],
+                 mtime_ns: Optional[int] = None) -> None:
+        """Ghi một file đã quét"""
+        dev, inode = inode_key if inode_key else (None, None)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files (path, dir, size, dev, inode, mtime_ns) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (file_path, os.path.dirname(file_path), size, dev, inode, mtime_ns)
+        )
+    
+    def mark_dir_done(self, dir_path: str) -> None:
+        """Đánh dấu thư mục đã ghi xong file (gọi sau file cuối cùng của thư mục)"""
+        self.conn.execute("INSERT OR IGNORE INTO dirs (path) VALUES (?)", (dir_path,))
+        self._maybe_commit()
+    
+    def get_hashes(self, stage: str) -> Dict[str, Tuple[str, Tuple[int, int, int, int]]]:
+        """
+        Digest đã tính của một bước
         
-        print(f"   Đã quét {self.file_count} file.       ")
+        Args:
+            stage: Tên bước (khóa cache của thuật toán, vd: 'md5:head4096')
         
-        # Lọc chỉ lấy size có nhiều hơn 1 file
-        duplicates = {s: files for s, files in size_dict.items() if len(files) > 1}
+        Returns:
+            dict: {file_path: (digest, stat_key lúc hash)}
+        """
+        if stage not in self._hashes:
+            self._hashes[stage] = {
+                file_path: (digest, (dev, inode, size, mtime_ns))
+                for file_path, digest, dev, inode, size, mtime_ns in self.conn.execute(
+                    "SELECT path, digest, dev, inode, size, mtime_ns FROM hashes WHERE stage = ?",
+                    (stage,)
+                )
+            }
+        return self._hashes[stage]
+    
+    def add_hashes(self, stage: str, rows: List[Tuple[str, str, Tuple[int, int, int, int]]]) -> None:
+        """
+        Ghi digest vừa tính
         
-        return duplicates
+        Args:
+            stage: Tên bước
+            rows: Danh sách (file_path, digest, stat_key lấy trước khi đọc file)
+        """
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO hashes (stage, path, digest, dev, inode, size, mtime_ns) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(stage, file_path, digest) + tuple(stat_key) for file_path, digest, stat_key in rows]
+        )
+        self._maybe_commit()
+    
+    def close(self) -> None:
+        """Commit và đóng kết nối"""
+        self.conn.commit()
+        self.conn.close()
+    
+    def remove(self) -> None:
+        """Đóng và xóa file trạng thái (khi quét đã hoàn tất)"""
+        self.close()
+        for suffix in ('', '-wal', '-shm'):
+            _remove_quietly(self.db_path + suffix)
 
 
-def display_duplicates(duplicates: dict, by_hash: bool = True, limit: int = 20) -> Tuple[int, int]:
+# Cache connection theo từng process worker (mỗi process mở 1 lần)
+_worker_caches: Dict[str, HashCache] = {}
+
+
+def get_worker_cache(cache_path: str) -> HashCache:
     """
-    Hiển thị danh sách file trùng lặp
+    Lấy HashCache chỉ đọc cho process hiện tại
     
     Args:
-        duplicates: Dictionary chứa duplicates
-        by_hash: True = duplicates theo hash, False = theo size
-        limit: Số nhóm tối đa hiển thị
+        cache_path: Đường dẫn file cache
     
     Returns:
-        tuple: (total_duplicates, wasted_space)
+        HashCache: Instance dùng lại trong cùng process
+    """
+    cache = _worker_caches.get(cache_path)
+    if cache is None:
+        cache = HashCache(cache_path, readonly=True)
+        _worker_caches[cache_path] = cache
+    return cache
+
+
+def get_stat_key(file_path: str) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Lấy khóa cache (st_dev, st_ino, st_size, st_mtime_ns) của file
+    
+    Args:
+        file_path: Đường dẫn file
+    
+    Returns:
+        tuple: Khóa cache, None nếu lỗi hoặc filesystem không có inode
+    """
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    
+    if not st.st_ino:
+        return None
+    return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def get_inode_key(file_path: str) -> Optional[Tuple[int, int]]:
+    """
+    Lấy định danh inode của file
+    
+    Args:
+        file_path: Đường dẫn file
+    
+    Returns:
+        tuple: (st_dev, st_ino) hoặc None nếu lỗi/filesystem không có inode
     
     Giải thích:
-    - Hiển thị từng nhóm duplicate
-    - Tính toán dung lượng lãng phí
-    - Giới hạn số nhóm hiển thị để không quá dài
+    - Dùng os.stat vì trên Windows DirEntry.stat() luôn trả st_ino = 0
+    - Các hardlink của cùng một file có chung (st_dev, st_ino)
     """
-    if not duplicates:
-        print("\n✅ Không tìm thấy file trùng lặp!")
-        return 0, 0
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
     
-    duplicate_groups = len(duplicates)
-    total_duplicates = sum(len(files) - 1 for files in duplicates.values())
-    wasted_space = 0
+    if not st.st_ino:
+        return None
     
-    print(f"\n{'='*60}")
-    print(f"📊 Tìm thấy {duplicate_groups} nhóm file trùng lặp")
-    print(f"{'='*60}\n")
+    return (st.st_dev, st.st_ino)
+
+
+def _hash_with_cache(file_path: str, size: int, cache_algo: str,
+                     cache_path: Optional[str], compute) -> Tuple[str, Optional[str], int, bool, Optional[tuple]]:
+    """
+    Tra cache trước khi hash, trả về kết quả kèm khóa để ghi cache
     
-    log_info(f"Tìm thấy {duplicate_groups} nhóm, {total_duplicates} file duplicate")
+    Args:
+        file_path: Đường dẫn file
+        size: Kích thước file
+        cache_algo: Tên thuật toán dùng làm khóa cache
+        cache_path: Đường dẫn file cache (None = không dùng cache,
+                    '' = không dùng cache nhưng vẫn lấy stat_key cho checkpoint)
+        compute: Hàm không tham số tính hash khi cache miss
     
-    for idx, (key, files) in enumerate(list(duplicates.items())[:limit], 1):
-        if by_hash:
-            # files là list của tuple (path, size)
-            file_size = files[0][1]
-            file_paths = [f[0] for f in files]
-        else:
-            # files là list của path, key là size
-            file_size = key
-            file_paths = files
-        
-        group_waste = file_size * (len(file_paths) - 1)
-        wasted_space += group_waste
-        
-        print(f"Nhóm {idx}: {len(file_paths)} file ({format_size(file_size)}) - Lãng phí: {format_size(group_waste)}")
-        
-        if by_hash:
-            print(f"   Hash: {key[:16]}...")
-        
-        for file_path in file_paths:
-            print(f"   - {file_path}")
-        
-        print()
+    Returns:
+        tuple: (file_path, hash, size, from_cache, stat_key)
+    
+    Giải thích:
+    - stat_key lấy trước khi đọc file: nếu file bị sửa trong lúc hash,
+      lần quét sau mtime khác nên row bị coi là cũ
+    """
+    stat_key = get_stat_key(file_path) if cache_path is not None else None
+    
+    if stat_key and cache_path:
+        cached = get_worker_cache(cache_path).lookup(stat_key, cache_algo)
+        if cached:
+            return file_path, cached, size, True, stat_key
+    
+    return file_path, compute(), size, False, stat_key
+
+
+def get_file_hash(file_path: str, hash_algo: str = 'md5', chunk_size: int = DEFAULT_BLOCK_SIZE,
+                  io_engine: str = 'auto') -> Optional[str]:
+    """
+    Tính hash của file
+    
+    Args:
+        file_path: Đường dẫn file
+        hash_algo: Thuật toán hash (xem utils.hashing, vd: md5, sha256, xxh3_128, blake3)
+        chunk_size: Kích thước block đọc file (bytes)
+        io_engine: Cách đọc file (auto, read, readinto, mmap)
+    
+    Returns:
+        str: Hash string hoặc None nếu lỗi
+    
+    Giải thích:
+    - Đọc file theo block để tránh tràn RAM với file lớn
+    - Mặc định đọc vào buffer dùng lại (readinto), mmap với file lớn
+    - Trả về hex digest
+    """
+    try:
+        return hash_file(file_path, hash_algo, io_engine, chunk_size)
+    except (IOError, OSError, PermissionError) as e:
+        log_error(f"Lỗi đọc file {file_path}: {e}")
+        return None
+
+
+def get_file_hash_with_size(args: tuple) -> Tuple[str, Optional[str], int, bool, Optional[tuple]]:
+    """
+    Wrapper function cho multiprocessing
+    
+    Args:
+        args: tuple (file_path, size, hash_algo, io_engine, block_size[, cache_path])
+    
+    Returns:
+        tuple: (file_path, hash, size, from_cache, stat_key)
+    
+    Giải thích:
+    - Wrapper để dùng với ProcessPoolExecutor
+    - Nếu có cache_path: dùng lại digest đã cache khi inode/size/mtime không đổi
+    - Trả về cả path, hash, size và khóa stat để process chính ghi cache
+    """
+    file_path, size, hash_algo, io_engine, block_size = args[:5]
+    cache_path = args[5] if len(args) > 5 else None
+    
+    return _hash_with_cache(
+        file_path, size, hash_algo, cache_path,
+        lambda: get_file_hash(file_path, hash_algo, block_size, io_engine)
+    )
+
+
+def get_file_partial_hash(file_path: str, hash_algo: str = 'md5',
+                          block_size: int = PREFILTER_BLOCK_SIZE,
+                          include_tail: bool = False) -> Optional[str]:
+    """
+    Tính hash của khối đầu (và khối cuối) của file
+    
+    Args:
+        file_path: Đường dẫn file
+        hash_algo: Thuật toán hash (xem utils.hashing)
+        block_size: Kích thước mỗi khối đọc (bytes)
+        include_tail: Có hash thêm khối cuối file không
+    
+    Returns:
+        str: Hash string hoặc None nếu lỗi
+    
+    Giải thích:
+    - Chỉ đọc block_size bytes đầu (và block_size bytes cuối nếu include_tail)
+    - Khối cuối bắt đầu sau khối đầu nên các byte được hash đúng thứ tự, không trùng
+    - Nếu file nhỏ hơn phần được đọc thì kết quả bằng đúng get_file_hash()
+    """
+    hasher = get_hasher(hash_algo)
+    
+    try:
+        with open(file_path, 'rb') as f:
+            hasher.update(f.read(block_size))
+            
+            if include_tail:
+                size = os.fstat(f.fileno()).st_size
+                if size > block_size:
+                    f.seek(max(block_size, size - block_size))
+                    hasher.update(f.read(block_size))
+        return hasher.hexdigest()
+    except (IOError, OSError, PermissionError) as e:
+        log_error(f"Lỗi đọc file {file_path}: {e}")
+        return None
+
+
+def get_partial_cache_algo(hash_algo: str, block_size: int, include_tail: bool) -> str:
+    """
+    Tên thuật toán dùng làm khóa cache cho hash khối đầu/cuối
+    
+    Ví dụ:
+        get_partial_cache_algo('md5', 4096, True) -> "md5:head4096:tail"
+    """
+    return f"{hash_algo}:head{block_size}" + (":tail" if include_tail else "")
+
+
+def get_partial_hash_with_size(args: tuple) -> Tuple[str, Optional[str], int, bool, Optional[tuple]]:
+    """
+    Wrapper function cho multiprocessing (hash khối đầu/cuối)
+    
+    Args:
+        args: tuple (file_path, size, hash_algo, block_size, include_tail[, cache_path])
+    
+    Returns:
+        tuple: (file_path, hash, size, from_cache, stat_key)
+    """
+    file_path, size, hash_algo, block_size, include_tail = args[:5]
+    cache_path = args[5] if len(args) > 5 else None
+    
+    return _hash_with_cache(
+        file_path, size, get_partial_cache_algo(hash_algo, block_size, include_tail), cache_path,
+        lambda: get_file_partial_hash(file_path, hash_algo, block_size, include_tail)
+    )
+
+
+def hash_file_batch(args: tuple) -> List[Tuple[Optional[str], bool, Optional[tuple]]]:
+    """
+    Hash một batch file trong worker process
+    
+    Args:
+        args: tuple (worker, files, extra_args)
+            - worker: get_file_hash_with_size hoặc get_partial_hash_with_size
+            - files: Danh sách (file_path, size)
+            - extra_args: Tham số bổ sung cho worker
+    
+    Returns:
+        list: (hash, from_cache, stat_key) theo đúng thứ tự files
+    
+    Giải thích:
+    - Một task chứa nhiều file -> giảm overhead IPC với file nhỏ
+    - Không gửi lại path/size (process chính đã có) để kết quả gọn hơn
+    """
+    worker, files, extra_args = args
+    results = []
+    
+    for file_path, size in files:
+        try:
+            _, file_hash, _, from_cache, stat_key = worker((file_path, size) + extra_args)
+        except Exception as e:
+            log_error(f"Lỗi khi hash {file_path}: {e}")
+            file_hash, from_cache, stat_key = None, False, None
+        results.append((file_hash, from_cache, stat_key))
+    
+    return results
+
+
+def iter_hash_batches(files: List[Tuple[str, int]], read_cost,
+                      max_files: int = HASH_BATCH_MAX_FILES,
+                      max_bytes: int = HASH_BATCH_MAX_BYTES):
+    """
+    Chia danh sách file thành các batch theo size bucket
+    
+    Args:
+        files: Danh sách (file_path, size), các file cùng size nằm liền nhau
+        read_cost: Hàm size -> số bytes sẽ đọc khi hash file đó
+        max_files: Số file tối đa mỗi batch
+        max_bytes: Tổng bytes đọc tối đa mỗi batch
+    
+    Yields:
+        list: Batch (file_path, size)
+    
+    Giải thích:
+    - Cắt batch khi đổi size bucket nếu batch đã đủ lớn -> một bucket ít khi bị chia nhỏ
+    - File lớn hơn max_bytes nằm riêng một batch
+    """
+    batch = []
+    batch_bytes = 0
+    last_size = None
+    
+    for file_path, size in files:
+        cost = read_cost(size)
+        
+        if batch and (
+            len(batch) >= max_files
+            or batch_bytes + cost > max_bytes
+            or (size != last_size and len(batch) >= max_files // 2)
+        ):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        
+        batch.append((file_path, size))
+        batch_bytes += cost
+        last_size = size
+    
+    if batch:
+        yield batch
+
+
+def get_partial_read_size(size: int, block_size: int, include_tail: bool) -> int:
+    """
+    Số bytes thực sự được đọc khi hash khối đầu/cuối của file
+    
+    Args:
+        size: Kích thước file (bytes)
+        block_size: Kích thước mỗi khối
+        include_tail: Có đọc khối cuối không
+    
+    Returns:
+        int: Số bytes đọc (bằng size nếu khối đầu/cuối phủ hết file)
+    """
+    covered = block_size * 2 if include_tail else block_size
+    return min(size, covered)
+
+
+def get_image_cache_algo(kind: str) -> str:
+    """Tên thuật toán dùng làm khóa cache cho hash ảnh (vd: 'phash64')"""
+    return f"{kind}{PERCEPTUAL_HASH_BITS}"
+
+
+def _load_gray_image(file_path: str, width: int, height: int):
+    """
+    Đọc ảnh, chuyển grayscale và thu nhỏ về width x height
+    
+    Giải thích:
+    - draft() để Pillow giải mã JPEG ở độ phân giải thấp (nhanh hơn nhiều với ảnh lớn)
+    - Ảnh động (GIF) chỉ lấy frame đầu
+    """
+    with Image.open(file_path) as img:
+        img.draft('L', (width * 4, height * 4))
+        gray = img.convert('L').resize((width, height), Image.LANCZOS)
+    return np.asarray(gray, dtype=np.float64)
+
+
+def _bits_to_hex(bits) -> str:
+    """Chuyển mảng bool 64 phần tử thành chuỗi hex 16 ký tự"""
+    value = 0
+    for bit in bits.flatten():
+        value = (value << 1) | int(bit)
+    return f"{value:0{PERCEPTUAL_HASH_BITS // 4}x}"
+
+
+def compute_dhash(file_path: str) -> str:
+    """
+    Tính difference hash (dHash) 64 bit của ảnh
+    
+    Args:
+        file_path: Đường dẫn ảnh
+    
+    Returns:
+        str: Hash dạng hex
+    
+    Giải thích:
+    - Thu nhỏ về 9x8, mỗi bit = pixel bên trái sáng hơn pixel bên phải
+    - Rất nhanh, bền với resize/nén lại, kém hơn pHash khi chỉnh màu/độ sáng
+    """
+    pixels = _load_gray_image(file_path, 9, 8)
+    return _bits_to_hex(pixels[:, :-1] > pixels[:, 1:])
+
+
+def _dct_matrix(n: int):
+    """Ma trận DCT-II kích thước n x n (tính một lần rồi dùng lại)"""
+    matrix = _dct_matrices.get(n)
+    if matrix is None:
+        k = np.arange(n).reshape(-1, 1)
+        i = np.arange(n).reshape(1, -1)
+        matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+        _dct_matrices[n] = matrix
+    return matrix
+
+
+def compute_phash(file_path: str) -> str:
+    """
+    Tính perceptual hash (pHash) 64 bit của ảnh
+    
+    Args:
+        file_path: Đường dẫn ảnh
+    
+    Returns:
+        str: Hash dạng hex
+    
+    Giải thích:
+    - Thu nhỏ về 32x32, biến đổi DCT 2 chiều (NumPy), giữ 8x8 tần số thấp
+    - Mỗi bit = hệ số lớn hơn median (bỏ hệ số DC khi tính median)
+    - Bền với resize, nén lại JPEG/WebP, chỉnh độ sáng nhẹ
+    """
+    pixels = _load_gray_image(file_path, 32, 32)
+    dct = _dct_matrix(32)
+    low = (dct @ pixels @ dct.T)[:8, :8]
+    median = np.median(low.flatten()[1:])
+    return _bits_to_hex(low > median)
+
+
+PERCEPTUAL_HASHERS = {
+    'phash': compute_phash,
+    'dhash': compute_dhash
+}
+
+
+def get_image_hash_with_size(args: tuple) -> Tuple[str, Optional[str], int, bool, Optional[tuple]]:
+    """
+    Wrapper function cho multiprocessing (hash ảnh perceptual)
+    
+    Args:
+        args: tuple (file_path, size, kind[, cache_path])
+    
+    Returns:
+        tuple: (file_path, hash, size, from_cache, stat_key) - hash None nếu không đọc được ảnh
+    """
+    file_path, size, kind = args[:3]
+    cache_path = args[3] if len(args) > 3 else None
+    
+    def compute():
+        try:
+            return PERCEPTUAL_HASHERS[kind](file_path)
+        except Exception:
+            return None
+    
+    return _hash_with_cache(file_path, size, get_image_cache_algo(kind), cache_path, compute)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Số bit khác nhau giữa 2 hash"""
+    return bin(a ^ b).count('1')
+
+
+class MultiIndexHash:
+    """
+    Chỉ mục multi-index hashing để tìm hash gần nhau theo khoảng cách Hamming
+    
+    Mục đích: Tìm các hash cách một hash cho trước không quá threshold bit
+    Lý do: So từng cặp là O(n²); BK-tree với ngưỡng 8/64 bit vẫn phải duyệt
+           gần hết cây, không dùng được với hàng trăm nghìn ảnh
+    
+    Giải thích:
+    - Chia hash thành m đoạn; 2 hash cách nhau <= threshold thì có ít nhất
+      một đoạn cách nhau <= threshold // m bit (nguyên lý Dirichlet)
+    - Mỗi đoạn có một bảng dict; tra các khóa lệch <= radius bit trong từng bảng
+      rồi chỉ tính Hamming đầy đủ cho các ứng viên tìm được
+    - m = ceil((threshold + 1) / 3) để radius <= 2, số khóa cần tra nhỏ
+    """
+    
+    def __init__(self, threshold: int, bits: int = PERCEPTUAL_HASH_BITS):
+        """
+        Args:
+            threshold: Khoảng cách Hamming tối đa khi tìm
+            bits: Số bit của hash
+        """
+        self.threshold = threshold
+        chunk_count = max(1, -(-(threshold + 1) // 3))
+        self.radius = threshold // chunk_count
+        
+        self._chunks = []
+        self._probes = []
+        offset = 0
+        for idx in range(chunk_count):
+            width = bits // chunk_count + (1 if idx < bits % chunk_count else 0)
+            self._chunks.append((offset, (1 << width) - 1))
+            
+            probes = [0]
+            for flips in range(1, self.radius + 1):
+                for positions in combinations(range(width), flips):
+                    probes.append(sum(1 << pos for pos in positions))
+            self._probes.append(probes)
+            offset += width
+        
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in self._chunks]
+    
+    def add(self, value: int):
+        """Thêm một hash vào chỉ mục"""
+        for (offset, mask), table in zip(self._chunks, self._tables):
+            table.setdefault((value >> offset) & mask, []).append(value)
+    
+    def search(self, value: int) -> List[int]:
+        """
+        Tìm các hash trong chỉ mục cách value không quá threshold bit
+        
+        Args:
+            value: Hash cần tìm
+        
+        Returns:
+            list: Các hash tìm được
+        """
+        results = []
+        seen = set()
+        
+        for (offset, mask), table, probes in zip(self._chunks, self._tables, self._probes):
+            key = (value >> offset) & mask
+            for probe in probes:
+                for other in table.get(key ^ probe, ()):
+                    if other not in seen:
+                        seen.add(other)
+                        if hamming_distance(value, other) <= self.threshold:
+                            results.append(other)
+        
+        return results
+
+
+def cluster_similar_hashes(hash_items: Dict[int, list], threshold: int) -> Dict[int, list]:
+    """
+    Gom các hash gần nhau thành nhóm (thành phần liên thông)
+    
+    Args:
+        hash_items: {hash: [item, ...]} - các item cùng hash đã gộp sẵn
+        threshold: Khoảng cách Hamming tối đa giữa 2 hash được coi là giống
+    
+    Returns:
+        dict: {hash đại diện: [item, ...]} - chỉ các nhóm có từ 2 item trở lên
+    
+    Giải thích:
+    - Mỗi hash tra MultiIndexHash các hash đã thêm trước, nối nhóm bằng union-find
+    - Nhóm có tính bắc cầu: A~B, B~C thì A, B, C cùng nhóm
+    """
+    parent = {h: h for h in hash_items}
+    
+    def find(h):
+        while parent[h] != h:
+            parent[h] = parent[parent[h]]
+            h = parent[h]
+        return h
+    
+    index = MultiIndexHash(threshold)
+    for value in hash_items:
+        for other in index.search(value):
+            root_a, root_b = find(value), find(other)
+            if root_a != root_b:
+                parent[root_b] = root_a
+        index.add(value)
+    
+    groups = defaultdict(list)
+    for value, items in hash_items.items():
+        groups[find(value)].extend(items)
+    
+    return {root: items for root, items in groups.items() if len(items) > 1}
+
+
+def iter_size_waves(size_groups: Dict[int, List[str]], max_files: int):
+    """
+    Chia các nhóm size thành từng đợt để xử lý và ghi kết quả dần
+    
+    Args:
+        size_groups: {size: [file_paths]}
+        max_files: Số file tối đa mỗi đợt (nhóm lớn hơn được xếp thành một đợt riêng)
+    
+    Yields:
+        list: Danh sách (file_path, size) của một đợt
+    
+    Giải thích:
+    - Một nhóm size không bao giờ bị chia đôi, nên mỗi đợt xác định trọn
+      vẹn các nhóm trùng lặp của nó
+    """
+    wave = []
+    
+    for size, file_paths in size_groups.items():
+        if wave and len(wave) + len(file_paths) > max_files:
+            yield wave
+            wave = []
+        
+        wave.extend((file_path, size) for file_path in file_paths)
+    
+    if wave:
+        yield wave
+
+
+class DuplicateFinder:
+    """
+    Class tìm file trùng lặp
+    
+    Mục đích: Tập trung logic tìm duplicate, dễ mở rộng
+    """
+    
+    def __init__(self, folder_path: str, recursive: bool = True, 
+                 min_size: int = 0, hash_algo: str = 'md5',
+                 prefilter: bool = True, prefilter_block_size: int = PREFILTER_BLOCK_SIZE,
+                 prefilter_tail: bool = False, cache_path: Optional[str] = None,
+                 io_engine: str = 'auto', block_size: int = DEFAULT_BLOCK_SIZE,
+                 scan_workers: int = DEFAULT_SCAN_WORKERS, state: Optional[ScanState] = None):
+        """
+        Khởi tạo DuplicateFinder
+        
+        Args:
+            folder_path: Thư mục cần quét
+            recursive: Có quét thư mục con không
+            min_size: Kích thước tối thiểu (bytes)
+            hash_algo: Thuật toán hash
+            prefilter: Có hash khối đầu trước khi hash toàn bộ file không
+            prefilter_block_size: Kích thước khối đầu/cuối (bytes)
+            prefilter_tail: Có hash thêm khối cuối ở bước lọc nhanh không
+            cache_path: File cache hash SQLite (None = không dùng cache)
+            io_engine: Cách đọc file khi hash toàn bộ (auto, read, readinto, mmap)
+            block_size: Kích thước block đọc khi hash toàn bộ (bytes)
+            scan_workers: Số thread quét thư mục song song (1 = tuần tự)
+            state: Checkpoint để tiếp tục khi bị ngắt (None = không checkpoint)
+        """
+        self.folder_path = Path(folder_path).resolve()
+        self.recursive = recursive
+        self.min_size = min_size
+        self.hash_algo = resolve_algorithm(hash_algo)
+        # Chỉ cảnh báo khi thật sự phải dùng thuật toán khác (không tính khác hoa/thường)
+        if self.hash_algo != hash_algo.strip().lower():
+            print(f"⚠️  Chưa cài backend cho {hash_algo}, dùng {self.hash_algo} thay thế")
+            log_warning(f"Thiếu backend {hash_algo}, dùng {self.hash_algo}")
+        self.prefilter = prefilter
+        self.prefilter_block_size = prefilter_block_size
+        self.prefilter_tail = prefilter_tail
+        self.file_count = 0
+        self.stage_stats: List[dict] = []
+        self.io_engine = io_engine
+        self.block_size = block_size
+        self.scan_workers = scan_workers
+        self.cache_path = cache_path
+        self.cache = HashCache(cache_path) if cache_path else None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.hardlinks: Dict[str, List[str]] = {}
+        self.hardlink_groups: List[Tuple[int, List[str]]] = []
+        self.hash_workers = 1
+        self.state = state
+    
+    def get_options(self) -> dict:
+        """
+        Tùy chọn quét (lưu vào checkpoint để --resume tạo lại finder y hệt)
+        
+        Returns:
+            dict: Tham số khởi tạo DuplicateFinder
+        """
+        return {
+            'folder_path': str(self.folder_path),
+            'recursive': self.recursive,
+            'min_size': self.min_size,
+            'hash_algo': self.hash_algo,
+            'prefilter': self.prefilter,
+            'prefilter_block_size': self.prefilter_block_size,
+            'prefilter_tail': self.prefilter_tail,
+            'io_engine': self.io_engine,
+            'block_size': self.block_size
+        }
+    
+    def _scan_size_groups(self, extensions: Optional[List[str]] = None
+                          ) -> Dict[int, List[Tuple[str, Optional[Tuple[int, int]]]]]:
+        """
+        Quét thư mục và group file theo kích thước
+        
+        Args:
+            extensions: Chỉ lấy file có đuôi này (None = tất cả)
+        
+        Returns:
+            dict: {size: [(file_path, inode_key), ...]}
+        
+        Giải thích:
+        - Dùng parallel_scan_files (os.scandir): size lấy từ stat của entry, không stat lại
+        - Quét nhiều thư mục con song song (nhanh hơn nhiều trên ổ mạng)
+        - Bỏ qua file nhỏ hơn min_size
+        - inode_key = (st_dev, st_ino); None nếu stat của scandir không có inode (Windows)
+        - Có checkpoint: ghi từng file vào state, resume bỏ qua thư mục đã quét xong
+        """
+        size_dict = defaultdict(list)
+        skip_files = None
+        on_dir_done = None
+        
+        if self.state:
+            size_dict, done_dirs = self.state.load_scan()
+            self.file_count = sum(len(files) for files in size_dict.values())
+            
+            if self.state.get_meta('phase') in ('hash', 'done'):
+                print(f"   Dùng lại kết quả quét từ checkpoint: {self.file_count} file")
+                return size_dict
+            
+            if done_dirs:
+                print(f"   Tiếp tục quét: đã có {self.file_count} file trong {len(done_dirs)} thư mục")
+            
+            skip_files = done_dirs.__contains__
+            on_dir_done = self.state.mark_dir_done
+        
+        for entry in parallel_scan_files(str(self.folder_path), extensions=extensions,
+                                         recursive=self.recursive, skip_files=skip_files,
+                                         on_dir_done=on_dir_done, workers=self.scan_workers):
+            size = entry.size
+            
+            if size < self.min_size:
+                continue
+            
+            st = entry.stat
+            inode_key = (st.st_dev, st.st_ino) if st and st.st_ino else None
+            size_dict[size].append((entry.path, inode_key))
+            self.file_count += 1
+            
+            if self.state:
+                self.state.add_file(entry.path, size, inode_key, entry.mtime_ns)
+            
+            if self.file_count % 100 == 0:
+                print(f"   Đã quét {self.file_count} file...", end='\r')
+        
+        print(f"   Đã quét {self.file_count} file.       ")
+        
+        if self.state:
+            self.state.set_meta('phase', 'hash')
+        
+        return size_dict
+    
+    def _collapse_hardlinks(self, size_dict: Dict[int, List[Tuple[str, Optional[Tuple[int, int]]]]]
+                            ) -> Dict[int, List[str]]:
+        """
+        Gộp các đường dẫn cùng inode (hardlink) thành một file đại diện
+        
+        Args:
+            size_dict: Kết quả của _scan_size_groups()
+        
+        Returns:
+            dict: {size: [file_path đại diện, ...]} - chỉ các size có >= 2 inode khác nhau
+        
+        Giải thích:
+        - Hardlink là cùng một dữ liệu trên đĩa: chỉ cần đọc/hash một lần
+        - Xóa một hardlink không giải phóng dung lượng nên không tính là trùng lặp
+        - Các đường dẫn còn lại lưu trong self.hardlinks[đại diện], tập hardlink
+          lưu trong self.hardlink_groups để báo cáo riêng
+        - Chỉ stat lại (os.stat) khi scandir không trả inode, và chỉ với nhóm cùng size
+        """
+        result = {}
+        
+        for size, entries in size_dict.items():
+            if len(entries) < 2:
+                continue
+            
+            by_inode: Dict[Tuple[int, int], List[str]] = {}
+            representatives = []
+            
+            for file_path, inode_key in entries:
+                if inode_key is None:
+                    inode_key = get_inode_key(file_path)
+                
+                if inode_key is None:
+                    representatives.append(file_path)
+                elif inode_key in by_inode:
+                    by_inode[inode_key].append(file_path)
+                else:
+                    by_inode[inode_key] = [file_path]
+                    representatives.append(file_path)
+            
+            for file_paths in by_inode.values():
+                if len(file_paths) > 1:
+                    self.hardlinks[file_paths[0]] = file_paths[1:]
+                    self.hardlink_groups.append((size, file_paths))
+            
+            if len(representatives) > 1:
+                result[size] = representatives
+        
+        return result
+    
+    def _add_stage_stats(self, name: str, files_in: int, files_out: int,
+                         bytes_read: int, bytes_saved: int):
+        """
+        Ghi lại thống kê của một bước lọc
+        
+        Args:
+            name: Tên bước
+            files_in: Số file đưa vào bước này
+            files_out: Số file còn lại cần xử lý ở bước sau
+            bytes_read: Số bytes đã đọc từ đĩa ở bước này
+            bytes_saved: Số bytes không phải hash toàn bộ nhờ bước này
+                         (không trừ bytes_read, luôn >= 0)
+        
+        Giải thích:
+        - Khi xử lý theo đợt (streaming), số liệu của cùng một bước được cộng dồn
+        """
+        for stats in self.stage_stats:
+            if stats['name'] == name:
+                stats['files_in'] += files_in
+                stats['files_out'] += files_out
+                stats['bytes_read'] += bytes_read
+                stats['bytes_saved'] += bytes_saved
+                return
+        
+        self.stage_stats.append({
+            'name': name,
+            'files_in': files_in,
+            'files_out': files_out,
+            'bytes_read': bytes_read,
+            'bytes_saved': bytes_saved
+        })
+    
+    def _hash_files(self, files: List[Tuple[str, int]], worker, extra_args: tuple,
+                    executor: Optional[ProcessPoolExecutor], prefix: str, cache_algo: str,
+                    read_cost=None, show_progress: bool = True
+                    ) -> List[Tuple[str, Optional[str], int, bool, Optional[tuple]]]:
+        """
+        Chạy một hàm hash trên danh sách file (tuần tự hoặc song song)
+        
+        Args:
+            files: Danh sách (file_path, size)
+            worker: Hàm wrapper nhận tuple (file_path, size, *extra_args[, cache_path])
+            extra_args: Tham số bổ sung truyền cho worker
+            executor: Process pool dùng chung (None = chạy tuần tự)
+            prefix: Prefix của progress bar
+            cache_algo: Tên thuật toán dùng làm khóa cache
+            read_cost: Hàm size -> bytes đọc, dùng để chia batch (None = size)
+            show_progress: Có hiện progress bar không
+        
+        Returns:
+            list: Danh sách (file_path, hash, size, from_cache, stat_key)
+        
+        Giải thích:
+        - Dùng chung cho bước hash khối đầu và bước hash toàn bộ
+        - worker phải là hàm top-level để pickle được
+        - Multiprocessing: gửi theo batch, giới hạn số batch đang chạy để
+          không giữ hàng triệu future/tuple trong RAM cùng lúc
+        - Worker chỉ đọc cache, process chính ghi digest mới trong một transaction
+        - Có checkpoint: bỏ qua file đã có digest trong state và stat không đổi
+          (file đã sửa sau khi checkpoint thì hash lại), ghi digest mới theo từng batch
+          (mọi file đã có digest thì không tạo progress bar)
+        """
+        if self.cache_path:
+            extra_args = extra_args + (self.cache_path,)
+        elif self.state:
+            # Không dùng cache nhưng vẫn cần stat_key để ghi checkpoint
+            extra_args = extra_args + ('',)
+        
+        results = []
+        
+        if self.state:
+            known = self.state.get_hashes(cache_algo)
+            if known:
+                remaining = []
+                for file_path, size in files:
+                    digest, stat_key = known.get(file_path, (None, None))
+                    if digest and get_stat_key(file_path) == stat_key:
+                        results.append((file_path, digest, size, True, None))
+                    else:
+                        remaining.append((file_path, size))
+                files = remaining
+        
+        # Resume: cả bước có thể đã có đủ digest trong checkpoint -> không còn file cần hash
+        progress = ProgressBar(len(files), prefix=prefix) if show_progress and files else None
+        
+        if executor is not None and len(files) > 5:
+            max_in_flight = self.hash_workers * HASH_BATCHES_PER_WORKER
+            
+            batches = iter_hash_batches(files, read_cost or (lambda size: size))
+            in_flight = {}
+            done_count = 0
+            
+            while True:
+                # Giữ tối đa max_in_flight batch trong hàng đợi
+                for batch in batches:
+                    future = executor.submit(hash_file_batch, (worker, batch, extra_args))
+                    in_flight[future] = batch
+                    if len(in_flight) >= max_in_flight:
+                        break
+                
+                if not in_flight:
+                    break
+                
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                
+                for future in finished:
+                    batch = in_flight.pop(future)
+                    try:
+                        batch_results = future.result()
+                    except Exception as e:
+                        log_error(f"Lỗi khi hash batch {len(batch)} file: {e}")
+                        batch_results = [(None, False, None)] * len(batch)
+                    
+                    batch_start = len(results)
+                    for (file_path, size), (file_hash, from_cache, stat_key) in zip(batch, batch_results):
+                        results.append((file_path, file_hash, size, from_cache, stat_key))
+                    self._checkpoint_hashes(cache_algo, results[batch_start:])
+                    
+                    done_count += len(batch)
+                    if progress:
+                        progress.update(done_count)
+        else:
+            for file_path, size in files:
+                results.append(worker((file_path, size) + extra_args))
+                self._checkpoint_hashes(cache_algo, results[-1:])
+                if progress:
+                    progress.update()
+        
+        if progress:
+            progress.finish()
+        
+        if self.cache:
+            new_rows = []
+            for file_path, file_hash, size, from_cache, stat_key in results:
+                if from_cache:
+                    self.cache_hits += 1
+                else:
+                    self.cache_misses += 1
+                    if file_hash and stat_key:
+                        new_rows.append((stat_key, cache_algo, file_hash, file_path))
+            self.cache.store_many(new_rows)
+        
+        return results
+    
+    def _checkpoint_hashes(self, cache_algo: str,
+                           results: List[Tuple[str, Optional[str], int, bool, Optional[tuple]]]):
+        """Ghi digest vừa tính vào checkpoint (nếu có)"""
+        if self.state:
+            self.state.add_hashes(cache_algo, [
+                (file_path, file_hash, stat_key)
+                for file_path, file_hash, _, _, stat_key in results if file_hash and stat_key
+            ])
+    
+    def _create_executor(self, use_multiprocessing: bool, file_count: int
+                         ) -> Optional[ProcessPoolExecutor]:
+        """
+        Tạo process pool dùng chung cho các bước hash
+        
+        Args:
+            use_multiprocessing: Có dùng multiprocessing không
+            file_count: Số file cần hash
+        
+        Returns:
+            ProcessPoolExecutor hoặc None (chạy tuần tự khi ít file)
+        """
+        if not use_multiprocessing or file_count <= 5:
+            return None
+        
+        import multiprocessing
+        self.hash_workers = min(multiprocessing.cpu_count(), file_count)
+        return ProcessPoolExecutor(max_workers=self.hash_workers)
+    
+    def _resolve_candidates(self, candidates: List[Tuple[str, int]],
+                            executor: Optional[ProcessPoolExecutor],
+                            verbose: bool = True) -> Dict[str, List[Tuple[str, int]]]:
+        """
+        Hash một tập file cùng size (bước 2 + 3) và trả về các nhóm trùng lặp
+        
+        Args:
+            candidates: Danh sách (file_path, size), chứa trọn vẹn các nhóm size
+            executor: Process pool dùng chung (None = chạy tuần tự)
+            verbose: In tiêu đề bước và progress bar của từng bước
+        
+        Returns:
+            dict: {hash: [(file_path, size), ...]}
+        """
+        hash_dict = defaultdict(list)
+        
+        # Bước 2: Hash khối đầu/cuối để loại các file khác nhau ngay từ đầu
+        if self.prefilter:
+            if verbose:
+                print(f"   Đang hash khối đầu{' và cuối' if self.prefilter_tail else ''} "
+                      f"({format_size(self.prefilter_block_size)})...\n")
+            
+            results = self._hash_files(
+                candidates,
+                get_partial_hash_with_size,
+                (self.hash_algo, self.prefilter_block_size, self.prefilter_tail),
+                executor,
+                "Hash khối đầu:",
+                get_partial_cache_algo(self.hash_algo, self.prefilter_block_size, self.prefilter_tail),
+                lambda size: get_partial_read_size(size, self.prefilter_block_size, self.prefilter_tail),
+                show_progress=verbose
+            )
+            
+            partial_groups = defaultdict(list)
+            partial_read = 0
+            for file_path, partial_hash, size, from_cache, _ in results:
+                if partial_hash:
+                    partial_groups[(size, partial_hash)].append((file_path, size))
+                if not from_cache:
+                    partial_read += get_partial_read_size(
+                        size, self.prefilter_block_size, self.prefilter_tail
+                    )
+            
+            survivors = []
+            for (size, partial_hash), files in partial_groups.items():
+                if len(files) < 2:
+                    continue
+                
+                if get_partial_read_size(size, self.prefilter_block_size, self.prefilter_tail) == size:
+                    # Khối đầu/cuối đã phủ hết file -> partial hash chính là hash toàn bộ
+                    hash_dict[partial_hash].extend(files)
+                else:
+                    survivors.extend(files)
+            
+            # Ghi riêng bytes đọc và bytes loại được: đọc khối đầu/cuối có thể tốn hơn
+            # phần loại được (nhiều file nhỏ), hiệu số khi đó là số âm vô nghĩa
+            eliminated_bytes = sum(size for _, size in candidates) - sum(size for _, size in survivors)
+            self._add_stage_stats(
+                'Khối đầu/cuối', len(candidates), len(survivors),
+                partial_read, eliminated_bytes
+            )
+            
+            log_info(f"Lọc khối đầu: {len(candidates)} -> {len(survivors)} file cần hash toàn bộ")
+            candidates = survivors
+        
+        # Bước 3: Hash toàn bộ các file còn lại
+        if candidates:
+            if verbose:
+                print(f"\n🔍 Bước 3: Hash toàn bộ {len(candidates)} file")
+                print(f"   Đang tính hash...\n")
+            
+            results = self._hash_files(
+                candidates,
+                get_file_hash_with_size,
+                (self.hash_algo, self.io_engine, self.block_size),
+                executor,
+                "Tính hash:",
+                self.hash_algo,
+                show_progress=verbose
+            )
+            
+            full_read = 0
+            cached_bytes = 0
+            for file_path, file_hash, size, from_cache, _ in results:
+                if file_hash:
+                    hash_dict[file_hash].append((file_path, size))
+                if from_cache:
+                    cached_bytes += size
+                else:
+                    full_read += size
+            
+            self._add_stage_stats(
+                'Toàn bộ file', len(candidates), len(candidates),
+                full_read, cached_bytes
+            )
+        
+        # Lọc chỉ lấy hash có nhiều hơn 1 file (thực sự duplicate)
+        return {h: files for h, files in hash_dict.items() if len(files) > 1}
+    
+    def find_by_size_first(self, use_multiprocessing: bool = True,
+                           on_group: Optional[Callable[[str, List[Tuple[str, int]]], None]] = None
+                           ) -> Dict[str, List[Tuple[str, int]]]:
+        """
+        Tìm duplicate bằng cách filter theo size trước
+        
+        Args:
+            use_multiprocessing: Có dùng multiprocessing không
+            on_group: Hàm gọi với (hash, [(file_path, size), ...]) ngay khi một nhóm
+                      được xác định (None = gom tất cả rồi trả về)
+        
+        Returns:
+            dict: {hash: [(file_path, size), ...]} (rỗng nếu dùng on_group)
+        
+        Giải thích:
+        - Bước 1: Group files theo size, gộp hardlink (cùng inode) thành một file
+        - Bước 2: Hash khối đầu (và khối cuối) để tách nhóm cùng size
+        - Bước 3: Chỉ hash toàn bộ các file còn trùng sau bước 2
+        - Thống kê bytes đọc/bỏ qua của từng bước lưu trong self.stage_stats
+        - Mỗi nhóm chỉ chứa một đường dẫn cho mỗi inode, hardlink xem self.hardlinks
+        - Có on_group: xử lý theo đợt tối đa STREAM_WAVE_MAX_FILES file (trọn nhóm size),
+          nhóm trùng lặp được trả ra ngay, không giữ toàn bộ kết quả trong RAM
+        """
+        log_info(f"Bắt đầu quét thư mục: {self.folder_path}")
+        self.stage_stats = []
+        self.hardlinks = {}
+        self.hardlink_groups = []
+        
+        # Bước 1: Group theo size
+        print("🔍 Bước 1: Quét và group theo kích thước...\n")
+        size_dict = self._scan_size_groups()
+        
+        same_size_count = sum(len(files) for files in size_dict.values() if len(files) > 1)
+        unique_size_bytes = sum(s for s, files in size_dict.items() if len(files) == 1)
+        self._add_stage_stats('Kích thước', self.file_count, same_size_count, 0, unique_size_bytes)
+        
+        # Gộp hardlink, chỉ giữ size có ít nhất 2 inode khác nhau (potential duplicates)
+        potential_duplicates = self._collapse_hardlinks(size_dict)
+        del size_dict
+        
+        if self.hardlink_groups:
+            linked_paths = sum(len(paths) - 1 for _, paths in self.hardlink_groups)
+            self._add_stage_stats(
+                'Hardlink (inode)', same_size_count, same_size_count - linked_paths,
+                0, sum(size * (len(paths) - 1) for size, paths in self.hardlink_groups)
+            )
+            log_info(f"Tìm thấy {len(self.hardlink_groups)} tập hardlink ({linked_paths} đường dẫn thêm)")
+        
+        if not potential_duplicates:
+            print("\n✅ Không có file nào có cùng kích thước!")
+            return {}
+        
+        # Đếm số file cần hash
+        files_to_hash = sum(len(files) for files in potential_duplicates.values())
+        print(f"\n🔍 Bước 2: Tìm thấy {files_to_hash} file có cùng kích thước")
+        
+        log_info(f"Tìm thấy {files_to_hash} file potential duplicate")
+        
+        executor = self._create_executor(use_multiprocessing, files_to_hash)
+        
+        duplicates = {}
+        group_count = 0
+        
+        try:
+            if on_group is None:
+                candidates = [
+                    (file_path, size)
+                    for size, file_paths in potential_duplicates.items()
+                    for file_path in file_paths
+                ]
+                duplicates = self._resolve_candidates(candidates, executor)
+                group_count = len(duplicates)
+            else:
+                print(f"   Xử lý theo đợt, nhóm trùng lặp được ghi ngay khi xác định...\n")
+                progress = ProgressBar(files_to_hash, prefix="Xử lý nhóm:")
+                
+                for wave in iter_size_waves(potential_duplicates, STREAM_WAVE_MAX_FILES):
+                    for file_hash, files in self._resolve_candidates(wave, executor, verbose=False).items():
+                        on_group(file_hash, files)
+                        group_count += 1
+                    progress.update(progress.current + len(wave))
+                
+                progress.finish()
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        
+        if self.state:
+            self.state.set_meta('phase', 'done')
+        
+        log_info(f"Tìm thấy {group_count} nhóm file trùng lặp")
+        
+        return duplicates
+    
+    def find_similar_images(self, kind: str = 'phash', threshold: int = DEFAULT_SIMILAR_THRESHOLD,
+                            use_multiprocessing: bool = True) -> Dict[str, List[Tuple[str, int]]]:
+        """
+        Tìm ảnh gần giống nhau (resize, nén lại, đổi định dạng) bằng perceptual hash
+        
+        Args:
+            kind: 'phash' hoặc 'dhash'
+            threshold: Khoảng cách Hamming tối đa (trên 64 bit) để coi là giống
+            use_multiprocessing: Có dùng multiprocessing không
+        
+        Returns:
+            dict: {"kind:hash": [(file_path, size), ...]} - mỗi nhóm xếp file lớn nhất trước
+        
+        Giải thích:
+        - Chỉ quét file có đuôi trong IMAGE_EXTENSIONS, hardlink chỉ hash một lần
+        - Hash ảnh lưu trong cache hash như các thuật toán khác (khóa 'phash64'/'dhash64')
+        - Ghép nhóm bằng multi-index hashing: mỗi ảnh chỉ so với các hash gần nó, không so từng cặp
+        """
+        log_info(f"Tìm ảnh gần giống ({kind}, ngưỡng {threshold}): {self.folder_path}")
+        self.stage_stats = []
+        self.hardlinks = {}
+        self.hardlink_groups = []
+        
+        print("🔍 Bước 1: Quét file ảnh...\n")
+        size_dict = self._scan_size_groups(extensions=IMAGE_EXTENSIONS)
+        
+        images = []
+        seen_inodes: Dict[Tuple[int, int], str] = {}
+        for size, entries in size_dict.items():
+            for file_path, inode_key in entries:
+                if inode_key is not None:
+                    if inode_key in seen_inodes:
+                        self.hardlinks.setdefault(seen_inodes[inode_key], []).append(file_path)
+                        continue
+                    seen_inodes[inode_key] = file_path
+                images.append((file_path, size))
+        del size_dict, seen_inodes
+        
+        if len(images) < 2:
+            print("\n✅ Không đủ ảnh để so sánh!")
+            return {}
+        
+        print(f"\n🔍 Bước 2: Tính {kind} cho {len(images)} ảnh...\n")
+        executor = self._create_executor(use_multiprocessing, len(images))
+        try:
+            results = self._hash_files(
+                images, get_image_hash_with_size, (kind,), executor,
+                "Hash ảnh:", get_image_cache_algo(kind)
+            )
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        
+        hash_items = defaultdict(list)
+        bytes_read = 0
+        failed = 0
+        for file_path, image_hash, size, from_cache, _ in results:
+            if image_hash:
+                hash_items[int(image_hash, 16)].append((file_path, size))
+            else:
+                failed += 1
+            if not from_cache:
+                bytes_read += size
+        
+        if failed:
+            log_warning(f"Không đọc được {failed} ảnh")
+        
+        print(f"\n🔍 Bước 3: Ghép nhóm {len(hash_items)} hash khác nhau (Hamming <= {threshold})...")
+        groups = cluster_similar_hashes(hash_items, threshold)
+        
+        similar = {}
+        for root_hash, files in groups.items():
+            files.sort(key=lambda f: f[1], reverse=True)
+            similar[f"{kind}:{root_hash:016x}"] = files
+        
+        self._add_stage_stats(
+            f'Ảnh ({kind})', len(images), sum(len(files) for files in groups.values()), bytes_read, 0
+        )
+        log_info(f"Tìm thấy {len(similar)} nhóm ảnh gần giống")
+        
+        return similar
+    
+    def find_by_size_only(self) -> Dict[int, List[str]]:
+        """
+        Tìm duplicate chỉ dựa vào size (nhanh nhưng không chính xác)
+        
+        Returns:
+            dict: {size: [file_paths]}
+        
+        Giải thích:
+        - Chỉ so sánh size, không hash
+        - Nhanh nhưng có thể false positive
+        - Hữu ích cho quick scan
+        - Hardlink (cùng inode) được gộp như find_by_size_first
+        """
+        print("🔍 Đang quét file theo kích thước...\n")
+        log_info("Quét theo size only")
+        self.hardlinks = {}
+        self.hardlink_groups = []
+        
+        size_dict = self._scan_size_groups()
+        
+        # Lọc chỉ lấy size có nhiều hơn 1 inode
+        duplicates = self._collapse_hardlinks(size_dict)
+        
+        return duplicates
+
+
+def display_duplicates(duplicates: dict, by_hash: bool = True, limit: int = 20,
+                       hardlinks: Optional[Dict[str, List[str]]] = None) -> Tuple[int, int]:
+    """
+    Hiển thị danh sách file trùng lặp
+    
+    Args:
+        duplicates: Dictionary chứa duplicates
+        by_hash: True = duplicates theo hash, False = theo size
+        limit: Số nhóm tối đa hiển thị
+        hardlinks: {đường dẫn đại diện: [hardlink khác]} từ DuplicateFinder.hardlinks
+    
+    Returns:
+        tuple: (total_duplicates, wasted_space)
+    
+    Giải thích:
+    - Hiển thị từng nhóm duplicate
+    - Tính toán dung lượng lãng phí (mỗi inode chỉ tính một lần)
+    - Giới hạn số nhóm hiển thị để không quá dài
+    """
+    hardlinks = hardlinks or {}
+    
+    if not duplicates:
+        print("\n✅ Không tìm thấy file trùng lặp!")
+        return 0, 0
+    
+    duplicate_groups = len(duplicates)
+    total_duplicates = sum(len(files) - 1 for files in duplicates.values())
+    wasted_space = 0
+    
+    print(f"\n{'='*60}")
+    print(f"📊 Tìm thấy {duplicate_groups} nhóm file trùng lặp")
+    print(f"{'='*60}\n")
+    
+    log_info(f"Tìm thấy {duplicate_groups} nhóm, {total_duplicates} file duplicate")
+    
+    for idx, (key, files) in enumerate(list(duplicates.items())[:limit], 1):
+        if by_hash:
+            # files là list của tuple (path, size)
+            file_size = files[0][1]
+            file_paths = [f[0] for f in files]
+        else:
+            # files là list của path, key là size
+            file_size = key
+            file_paths = files
+        
+        group_waste = file_size * (len(file_paths) - 1)
+        wasted_space += group_waste
+        
+        print(f"Nhóm {idx}: {len(file_paths)} file ({format_size(file_size)}) - Lãng phí: {format_size(group_waste)}")
+        
+        if by_hash:
+            print(f"   Hash: {key[:16]}...")
+        
+        for file_path in file_paths:
+            print(f"   - {file_path}")
+            for link_path in hardlinks.get(file_path, []):
+                print(f"     🔗 {link_path} (hardlink)")
+        
+        print()
+    
+    if len(duplicates) > limit:
+        remaining = len(duplicates) - limit
+        print(f"... và {remaining} nhóm khác (dùng -a để hiển thị tất cả)\n")
+    
+    return total_duplicates, wasted_space
+
+
+def verify_group(file_hash: str, files: List[Tuple[str, int]], progress=None) -> Dict[str, List[Tuple[str, int]]]:
+    """
+    So sánh từng byte các file của một nhóm cùng hash
+    
+    Args:
+        file_hash: Hash của nhóm
+        files: [(file_path, size), ...]
+        progress: ProgressBar cần cập nhật (tùy chọn)
+    
+    Returns:
+        dict: Các nhóm con thực sự trùng lặp, key dạng hash hoặc hash#n
+    
+    Giải thích:
+    - Mỗi file được so với đại diện của các nhóm con đã có
+    - Nhóm bị tách (va chạm hash) được ghi log
+    """
+    subgroups: List[List[Tuple[str, int]]] = []
+    
+    for file_path, size in files:
+        for subgroup in subgroups:
+            try:
+                if filecmp.cmp(subgroup[0][0], file_path, shallow=False):
+                    subgroup.append((file_path, size))
+                    break
+            except OSError as e:
+                log_error(f"Lỗi so sánh {file_path}: {e}")
+                break
+        else:
+            subgroups.append([(file_path, size)])
+        if progress:
+            progress.update()
+    
+    if len(subgroups) > 1:
+        log_warning(f"Va chạm hash {file_hash}: tách thành {len(subgroups)} nhóm")
+    
+    verified = {}
+    for idx, subgroup in enumerate(subgroups):
+        if len(subgroup) > 1:
+            key = file_hash if idx == 0 else f"{file_hash}#{idx}"
+            verified[key] = subgroup
+    
+    return verified
+
+
+def verify_duplicates(duplicates: Dict[str, List[Tuple[str, int]]]) -> Dict[str, List[Tuple[str, int]]]:
+    """
+    So sánh từng byte các file trong mỗi nhóm trùng lặp
+    
+    Args:
+        duplicates: {hash: [(file_path, size), ...]}
+    
+    Returns:
+        dict: Các nhóm đã xác nhận trùng lặp thực sự
+    
+    Giải thích:
+    - Hash nhanh (xxh3) không chống va chạm, cần so sánh byte trước khi xóa
+    - Từng nhóm được kiểm tra bằng verify_group()
+    """
+    if not duplicates:
+        return {}
+    
+    verified = {}
+    total_files = sum(len(files) for files in duplicates.values())
+    
+    print(f"\n🔬 Đang so sánh từng byte {total_files} file...\n")
+    progress = ProgressBar(total_files, prefix="So sánh byte:")
+    
+    for file_hash, files in duplicates.items():
+        verified.update(verify_group(file_hash, files, progress))
+    
+    progress.finish("So sánh hoàn thành")
+    log_info(f"Xác nhận byte: {len(duplicates)} -> {len(verified)} nhóm")
+    
+    return verified
+
+
+def display_stage_stats(stage_stats: List[dict]):
+    """
+    Hiển thị thống kê bytes đọc/bỏ qua của từng bước lọc
+    
+    Args:
+        stage_stats: Danh sách thống kê từ DuplicateFinder.stage_stats
+    
+    Giải thích:
+    - Bytes bỏ qua = bytes không phải hash toàn bộ nhờ bước đó, in riêng với bytes đọc
+    - Giúp đánh giá hiệu quả của bước lọc khối đầu/cuối (có lợi khi bỏ qua > đọc)
+    """
+    if not stage_stats:
+        return
+    
+    print(f"📈 Thống kê các bước lọc:")
+    for stats in stage_stats:
+        print(f"   - {stats['name']}: {stats['files_in']} → {stats['files_out']} file, "
+              f"đọc {format_size(stats['bytes_read'])}, "
+              f"bỏ qua {format_size(stats['bytes_saved'])}")
+        log_info(f"Bước {stats['name']}: {stats['files_in']} -> {stats['files_out']} file, "
+                 f"đọc {stats['bytes_read']} bytes, bỏ qua {stats['bytes_saved']} bytes")
+    print()
+
+
+def display_cache_stats(finder: 'DuplicateFinder'):
+    """
+    Hiển thị số lần dùng lại digest từ cache hash
+    
+    Args:
+        finder: DuplicateFinder đã chạy xong
+    """
+    if not finder.cache:
+        return
+    
+    total = finder.cache_hits + finder.cache_misses
+    if total == 0:
+        return
+    
+    print(f"🗄️  Cache hash: {finder.cache_hits}/{total} lần dùng lại "
+          f"({finder.cache_hits / total * 100:.1f}%)\n")
+    log_info(f"Cache hash: {finder.cache_hits} hit, {finder.cache_misses} miss")
+
+
+def display_hardlinks(hardlink_groups: List[Tuple[int, List[str]]], limit: int = 20):
+    """
+    Hiển thị các tập hardlink (nhiều đường dẫn cùng một inode)
+    
+    Args:
+        hardlink_groups: Danh sách (size, [file_paths]) từ DuplicateFinder.hardlink_groups
+        limit: Số tập tối đa hiển thị
+    
+    Giải thích:
+    - Hardlink không chiếm thêm dung lượng nên không tính vào dung lượng lãng phí
+    - Báo riêng để người dùng biết các đường dẫn này là cùng một file
+    """
+    if not hardlink_groups:
+        return
+    
+    extra_paths = sum(len(paths) - 1 for _, paths in hardlink_groups)
+    print(f"🔗 {len(hardlink_groups)} tập hardlink ({extra_paths} đường dẫn thêm, "
+          f"không chiếm thêm dung lượng):")
+    
+    for size, file_paths in hardlink_groups[:limit]:
+        print(f"   [{format_size(size)}] {' = '.join(file_paths)}")
+    
+    if len(hardlink_groups) > limit:
+        print(f"   ... và {len(hardlink_groups) - limit} tập khác")
+    print()
+
+
+def display_similar_images(similar: Dict[str, List[Tuple[str, int]]], limit: int = 20) -> Tuple[int, int]:
+    """
+    Hiển thị các nhóm ảnh gần giống
+    
+    Args:
+        similar: Kết quả của DuplicateFinder.find_similar_images()
+        limit: Số nhóm tối đa hiển thị
+    
+    Returns:
+        tuple: (số ảnh thừa, dung lượng giải phóng nếu chỉ giữ ảnh lớn nhất mỗi nhóm)
+    """
+    if not similar:
+        print("\n✅ Không tìm thấy ảnh gần giống!")
+        return 0, 0
+    
+    total_extra = sum(len(files) - 1 for files in similar.values())
+    reclaimable = sum(size for files in similar.values() for _, size in files[1:])
+    
+    print(f"\n{'='*60}")
+    print(f"🖼️  Tìm thấy {len(similar)} nhóm ảnh gần giống ({total_extra} ảnh thừa)")
+    print(f"{'='*60}\n")
+    
+    for idx, (key, files) in enumerate(list(similar.items())[:limit], 1):
+        print(f"Nhóm {idx}: {len(files)} ảnh - {key}")
+        for file_path, size in files:
+            print(f"   - {file_path} ({format_size(size)})")
+        print()
+    
+    if len(similar) > limit:
+        print(f"... và {len(similar) - limit} nhóm khác (dùng -a để hiển thị tất cả)\n")
+    
+    return total_extra, reclaimable
+
+
+def save_report(duplicates: dict, output_file: str, by_hash: bool = True,
+                hardlink_groups: Optional[List[Tuple[int, List[str]]]] = None):
+    """
+    Lưu báo cáo file trùng lặp ra file
+    
+    Args:
+        duplicates: Dictionary chứa duplicates
+        output_file: Tên file output
+        by_hash: True = duplicates theo hash
+        hardlink_groups: Các tập hardlink (ghi thành mục riêng)
+    
+    Giải thích:
+    - Xuất toàn bộ kết quả ra file text
+    - Dễ xem lại và phân tích sau
+    """
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write("=" * 60 + "\n")
+        f.write("  BÁO CÁO FILE TRÙNG LẶP\n")
+        f.write("=" * 60 + "\n\n")
+        
+        duplicate_groups = len(duplicates)
+        total_duplicates = sum(len(files) - 1 for files in duplicates.values())
+        
+        f.write(f"Tổng số nhóm trùng lặp: {duplicate_groups}\n")
+        f.write(f"Tổng số file trùng lặp: {total_duplicates}\n\n")
+        
+        for idx, (key, files) in enumerate(duplicates.items(), 1):
+            if by_hash:
+                file_size = files[0][1]
+                file_paths = [f[0] for f in files]
+            else:
+                file_size = key
+                file_paths = files
+            
+            group_waste = file_size * (len(file_paths) - 1)
+            
+            f.write(f"\nNhóm {idx}: {len(file_paths)} file ({format_size(file_size)})\n")
+            if by_hash:
+                f.write(f"Hash: {key}\n")
+            
+            for file_path in file_paths:
+                f.write(f"  - {file_path}\n")
+        
+        if hardlink_groups:
+            f.write("\n" + "=" * 60 + "\n")
+            f.write(f"  HARDLINK (CÙNG INODE): {len(hardlink_groups)} tập\n")
+            f.write("=" * 60 + "\n")
+            
+            for idx, (size, file_paths) in enumerate(hardlink_groups, 1):
+                f.write(f"\nTập {idx}: {len(file_paths)} đường dẫn ({format_size(size)})\n")
+                for file_path in file_paths:
+                    f.write(f"  - {file_path}\n")
+    
+    log_info(f"Đã lưu báo cáo: {output_file}")
+
+
+class StreamingReport:
+    """
+    Ghi báo cáo dạng máy đọc được (NDJSON/CSV), mỗi nhóm một dòng
+    
+    Mục đích: Ghi từng nhóm ngay khi xác định, không giữ toàn bộ kết quả trong RAM
+    Lý do: Quét hàng triệu file, job phía sau có thể xử lý trước khi quét xong
+    
+    Giải thích:
+    - NDJSON: {"type", "hash", "size", "count", "wasted_bytes", "files", "hardlinks"}
+    - CSV: type, hash, size, count, wasted_bytes, rồi mỗi đường dẫn một cột
+    - type = "duplicate" (nhóm trùng lặp) hoặc "hardlink" (tập cùng inode)
+    - Flush sau mỗi dòng để có thể đọc file trong lúc đang quét (tail -f)
+    """
+    
+    CSV_HEADER = ['type', 'hash', 'size', 'count', 'wasted_bytes', 'paths']
+    
+    def __init__(self, output_file: str, fmt: str = 'ndjson'):
+        """
+        Mở file báo cáo
+        
+        Args:
+            output_file: File output
+            fmt: 'ndjson' hoặc 'csv'
+        """
+        self.output_file = output_file
+        self.fmt = fmt
+        self.group_count = 0
+        self.duplicate_count = 0
+        self.wasted_space = 0
+        self.file = open(output_file, 'w', encoding='utf-8', newline='' if fmt == 'csv' else None)
+        
+        if fmt == 'csv':
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(self.CSV_HEADER)
+    
+    def _write(self, record: dict):
+        """Ghi một record theo định dạng đã chọn"""
+        if self.fmt == 'csv':
+            self.writer.writerow([
+                record['type'], record['hash'] or '', record['size'],
+                record['count'], record['wasted_bytes']
+            ] + record['files'])
+        else:
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+    
+    def write_group(self, key: Optional[str], file_paths: List[str], size: int,
+                    hardlinks: Optional[Dict[str, List[str]]] = None,
+                    wasted_bytes: Optional[int] = None):
+        """
+        Ghi một nhóm file trùng lặp
+        
+        Args:
+            key: Hash của nhóm (None nếu chỉ so theo size)
+            file_paths: Các đường dẫn (mỗi inode một đường dẫn)
+            size: Kích thước mỗi file
+            hardlinks: {đường dẫn đại diện: [hardlink khác]}
+            wasted_bytes: Dung lượng thừa (None = size * (số file - 1))
+        """
+        if wasted_bytes is None:
+            wasted_bytes = size * (len(file_paths) - 1)
+        
+        record = {
+            'type': 'duplicate',
+            'hash': key,
+            'size': size,
+            'count': len(file_paths),
+            'wasted_bytes': wasted_bytes,
+            'files': file_paths
+        }
+        
+        if hardlinks:
+            links = {p: hardlinks[p] for p in file_paths if p in hardlinks}
+            if links:
+                record['hardlinks'] = links
+        
+        self._write(record)
+        self.group_count += 1
+        self.duplicate_count += len(file_paths) - 1
+        self.wasted_space += record['wasted_bytes']
+    
+    def write_hardlinks(self, hardlink_groups: List[Tuple[int, List[str]]]):
+        """
+        Ghi các tập hardlink (không tính vào dung lượng lãng phí)
+        
+        Args:
+            hardlink_groups: Danh sách (size, [file_paths])
+        """
+        for size, file_paths in hardlink_groups:
+            self._write({
+                'type': 'hardlink',
+                'hash': None,
+                'size': size,
+                'count': len(file_paths),
+                'wasted_bytes': 0,
+                'files': file_paths
+            })
+    
+    def close(self):
+        """Đóng file báo cáo"""
+        self.file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+def get_report_format(output_file: Optional[str], fmt: Optional[str] = None) -> str:
+    """
+    Xác định định dạng báo cáo
+    
+    Args:
+        output_file: File output
+        fmt: Định dạng chỉ định rõ (None = đoán theo đuôi file)
+    
+    Returns:
+        str: 'text', 'ndjson' hoặc 'csv'
+    """
+    if fmt:
+        return fmt
+    
+    ext = os.path.splitext(output_file or '')[1].lower()
+    if ext in ('.ndjson', '.jsonl'):
+        return 'ndjson'
+    if ext == '.csv':
+        return 'csv'
+    return 'text'
+
+
+def delete_duplicates_interactive(duplicates: dict, by_hash: bool = True,
+                                  hardlinks: Optional[Dict[str, List[str]]] = None):
+    """
+    Xóa file trùng lặp với tương tác
+    
+    Args:
+        duplicates: Dictionary chứa duplicates
+        by_hash: True = duplicates theo hash
+        hardlinks: {đường dẫn đại diện: [hardlink khác]} từ DuplicateFinder.hardlinks
+    
+    Giải thích:
+    - Cho phép người dùng chọn cách xóa
+    - Xác nhận trước khi xóa
+    - Logging từng file bị xóa
+    - Xóa một file thì xóa luôn các hardlink của nó, nếu không dung lượng không được giải phóng
+    """
+    hardlinks = hardlinks or {}
+    
+    print("\n===== CHẾ ĐỘ XÓA TRÙNG LẶP =====")
+    print("1. Giữ file đầu tiên, xóa các file còn lại")
+    print("2. Giữ file mới nhất (theo modification time), xóa cũ hơn")
+    print("3. Giữ file cũ nhất (theo modification time), xóa mới hơn")
+    print("0. Không xóa")
+    
+    choice = get_user_input("Chọn (0-3)", default="0")
+    
+    if choice == "0":
+        return
+    
+    files_to_delete = []
+    
+    for key, files in duplicates.items():
+        if by_hash:
+            file_paths = [f[0] for f in files]
+        else:
+            file_paths = files
+        
+        if choice == "1":
+            # Giữ file đầu tiên
+            files_to_delete.extend(file_paths[1:])
+        
+        elif choice == "2":
+            # Giữ file mới nhất
+            files_with_mtime = [(f, os.path.getmtime(f)) for f in file_paths]
+            files_sorted = sorted(files_with_mtime, key=lambda x: x[1], reverse=True)
+            files_to_delete.extend([f[0] for f in files_sorted[1:]])
+        
+        elif choice == "3":
+            # Giữ file cũ nhất
+            files_with_mtime = [(f, os.path.getmtime(f)) for f in file_paths]
+            files_sorted = sorted(files_with_mtime, key=lambda x: x[1])
+            files_to_delete.extend([f[0] for f in files_sorted[1:]])
+    
+    if not files_to_delete:
+        print("Không có file nào để xóa.")
+        return
+    
+    # Thêm hardlink của các file bị xóa
+    linked = [link for f in files_to_delete for link in hardlinks.get(f, [])]
+    if linked:
+        print(f"\n🔗 Thêm {len(linked)} hardlink của các file trên (cùng dữ liệu)")
+        files_to_delete.extend(linked)
+    
+    # Hiển thị preview
+    print(f"\n⚠️  SẼ XÓA {len(files_to_delete)} FILE:")
+    for i, file_path in enumerate(files_to_delete[:10], 1):
+        print(f"   {i}. {file_path}")
+    
+    if len(files_to_delete) > 10:
+        print(f"   ... và {len(files_to_delete) - 10} file khác")
+    
+    if not confirm_action(f"Bạn sắp xóa {len(files_to_delete)} file!", require_yes=True):
+        print("❌ Đã hủy")
+        return
+    
+    # Xóa files
+    print(f"\n🗑️  Đang xóa...\n")
+    progress = ProgressBar(len(files_to_delete), prefix="Xóa file:")
+    
+    deleted = 0
+    errors = 0
+    
+    for file_path in files_to_delete:
+        success, error = safe_delete(file_path)
+        
+        if success:
+            deleted += 1
+            log_info(f"Đã xóa: {file_path}")
+        else:
+            errors += 1
+            log_error(f"Lỗi xóa {file_path}: {error}")
+        
+        progress.update()
+    
+    progress.finish()
+    
+    print(f"\n✅ Đã xóa {deleted}/{len(files_to_delete)} file")
+    if errors > 0:
+        print(f"❌ {errors} file gặp lỗi")
+    
+    log_info(f"Xóa hoàn thành: {deleted} thành công, {errors} lỗi")
+
+
+def _link_temp_path(target: str) -> str:
+    """Đường dẫn file tạm cùng thư mục với target"""
+    directory, name = os.path.split(target)
+    return os.path.join(directory, f".{name}{LINK_TEMP_SUFFIX}")
+
+
+def _remove_quietly(path: str) -> None:
+    """Xóa file nếu tồn tại, bỏ qua lỗi"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def clone_file(source: str, dest: str) -> None:
+    """
+    Tạo reflink: dest dùng chung extent dữ liệu với source (copy-on-write)
+    
+    Args:
+        source: File nguồn
+        dest: File đích (được tạo mới)
+    
+    Raises:
+        OSError: Nếu OS/filesystem không hỗ trợ reflink (vd: ext4, NTFS)
+    """
+    if not FCNTL_AVAILABLE or not sys.platform.startswith('linux'):
+        raise OSError("Reflink (FICLONE) chỉ hỗ trợ trên Linux")
+    
+    with open(source, 'rb') as src, open(dest, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def swap_with_link(source: str, target: str, method: str,
+                   mode: Optional[int] = None, mtime_ns: Optional[int] = None) -> None:
+    """
+    Thay target bằng liên kết tới source (atomic)
+    
+    Args:
+        source: File giữ lại
+        target: File trùng lặp cần thay
+        method: 'hardlink' hoặc 'reflink'
+        mode: Quyền cần giữ cho target (chỉ reflink)
+        mtime_ns: mtime cần giữ cho target (chỉ reflink)
+    
+    Raises:
+        OSError: Nếu không tạo được liên kết (khác ổ đĩa, không hỗ trợ reflink, ...)
+    
+    Giải thích:
+    - Tạo liên kết ở file tạm cạnh target rồi os.replace -> target luôn tồn tại,
+      hoặc là file cũ hoặc là liên kết mới, kể cả khi bị ngắt giữa chừng
+    - Hardlink dùng chung inode nên mode/mtime là của source
+    - Reflink là inode riêng nên giữ được mode/mtime của target
+    """
+    temp_path = _link_temp_path(target)
+    _remove_quietly(temp_path)
+    
+    try:
+        if method == 'hardlink':
+            os.link(source, temp_path)
+        else:
+            clone_file(source, temp_path)
+            if mode is not None:
+                os.chmod(temp_path, mode)
+            if mtime_ns is not None:
+                os.utime(temp_path, ns=(mtime_ns, mtime_ns))
+        
+        os.replace(temp_path, target)
+    except BaseException:
+        _remove_quietly(temp_path)
+        raise
+
+
+def restore_independent_copy(target: str, mode: int, mtime_ns: int) -> None:
+    """
+    Thay liên kết bằng bản copy độc lập (dùng khi rollback)
+    
+    Args:
+        target: File đang là hardlink/reflink
+        mode: Quyền gốc của file
+        mtime_ns: mtime gốc của file
+    """
+    temp_path = _link_temp_path(target)
+    _remove_quietly(temp_path)
+    
+    try:
+        shutil.copyfile(target, temp_path)
+        os.chmod(temp_path, mode)
+        os.utime(temp_path, ns=(mtime_ns, mtime_ns))
+        os.replace(temp_path, target)
+    except BaseException:
+        _remove_quietly(temp_path)
+        raise
+
+
+def build_link_plan(duplicates: Dict[str, List[Tuple[str, int]]],
+                    hardlinks: Optional[Dict[str, List[str]]] = None) -> List[dict]:
+    """
+    Lập danh sách thao tác thay file trùng lặp bằng liên kết
+    
+    Args:
+        duplicates: {hash: [(file_path, size), ...]}
+        hardlinks: {đường dẫn đại diện: [hardlink khác]} từ DuplicateFinder.hardlinks
+    
+    Returns:
+        list: [{'source', 'target', 'size', 'inode', 'mode', 'mtime_ns',
+                'source_mtime_ns'}, ...]
+    
+    Giải thích:
+    - Mỗi nhóm giữ file đầu tiên làm source, các file còn lại trỏ về source
+    - Hardlink của target cũng phải thay, nếu không inode cũ vẫn chiếm dung lượng
+    - Lưu mode/mtime của target để rollback, mtime của source để phát hiện file đã đổi
+    - Bỏ qua nhóm file 0 byte (liên kết không giải phóng được gì)
+    """
+    hardlinks = hardlinks or {}
+    plan = []
+    
+    for files in duplicates.values():
+        if files[0][1] == 0:
+            continue
+        
+        source = files[0][0]
+        try:
+            source_stat = os.stat(source)
+        except OSError as e:
+            log_error(f"Bỏ qua nhóm, không stat được {source}: {e}")
+            continue
+        
+        for file_path, size in files[1:]:
+            for target in [file_path] + hardlinks.get(file_path, []):
+                try:
+                    st = os.stat(target)
+                except OSError as e:
+                    log_error(f"Bỏ qua {target}: {e}")
+                    continue
+                
+                if (st.st_dev, st.st_ino) == (source_stat.st_dev, source_stat.st_ino):
+                    continue
+                
+                plan.append({
+                    'source': source,
+                    'target': target,
+                    'size': size,
+                    'inode': [st.st_dev, st.st_ino],
+                    'mode': st.st_mode & 0o7777,
+                    'mtime_ns': st.st_mtime_ns,
+                    'source_mtime_ns': source_stat.st_mtime_ns
+                })
+    
+    return plan
+
+
+def get_reclaimable_bytes(plan: List[dict]) -> int:
+    """
+    Dung lượng giải phóng được nếu chạy hết plan (mỗi inode đích tính một lần)
+    
+    Args:
+        plan: Kết quả của build_link_plan()
+    
+    Returns:
+        int: Số bytes
+    """
+    seen = {}
+    for item in plan:
+        seen[tuple(item['inode'])] = item['size']
+    return sum(seen.values())
+
+
+def read_link_journal(journal_path: str) -> Tuple[Optional[dict], List[dict], set, set]:
+    """
+    Đọc journal của thao tác thay bằng liên kết
+    
+    Args:
+        journal_path: File journal (JSON Lines)
+    
+    Returns:
+        tuple: (header, plan, target đã xong, target đã rollback)
+    
+    Giải thích:
+    - Dòng cuối bị cắt dở (mất điện khi đang ghi) được bỏ qua
+    """
+    header = None
+    plan = []
+    done = set()
+    rolled_back = set()
     
-    if len(duplicates) > limit:
-        remaining = len(duplicates) - limit
-        print(f"... và {remaining} nhóm khác (dùng -a để hiển thị tất cả)\n")
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            
+            record_type = record.get('type')
+            if record_type == 'header':
+                header = record
+            elif record_type == 'plan':
+                plan.append(record)
+            elif record_type == 'done':
+                done.add(record['target'])
+                rolled_back.discard(record['target'])
+            elif record_type == 'rollback':
+                rolled_back.add(record['target'])
     
-    return total_duplicates, wasted_space
+    return header, plan, done, rolled_back
+
 
+def _append_journal(journal, record: dict) -> None:
+    """Ghi một dòng vào journal và flush ngay"""
+    journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+    journal.flush()
 
-def save_report(duplicates: dict, output_file: str, by_hash: bool = True):
+
+def _shares_source_inode(item: dict) -> bool:
     """
-    Lưu báo cáo file trùng lặp ra file
+    Target đã là hardlink của source chưa
+    
+    Giải thích:
+    - Bị ngắt sau swap_with_link nhưng trước khi ghi dòng 'done' thì target đã
+      dùng chung inode với source dù journal chưa ghi nhận
+    """
+    source_key = get_inode_key(item['source'])
+    return source_key is not None and source_key == get_inode_key(item['target'])
+
+
+def execute_link_plan(plan: List[dict], method: str, journal_path: str,
+                      done: Optional[set] = None) -> Tuple[int, int, int]:
+    """
+    Thực hiện plan thay file trùng lặp bằng liên kết, ghi journal từng bước
     
     Args:
-        duplicates: Dictionary chứa duplicates
-        output_file: Tên file output
-        by_hash: True = duplicates theo hash
+        plan: Kết quả của build_link_plan() (hoặc đọc lại từ journal)
+        method: 'hardlink' hoặc 'reflink'
+        journal_path: File journal (ghi tiếp nếu đã tồn tại)
+        done: Các target đã xong ở lần chạy trước (khi resume)
+    
+    Returns:
+        tuple: (số file đã thay, số file lỗi/bỏ qua, bytes giải phóng)
     
     Giải thích:
-    - Xuất toàn bộ kết quả ra file text
-    - Dễ xem lại và phân tích sau
+    - Journal ghi header + toàn bộ plan trước, sau đó một dòng 'done' cho mỗi file
+    - Bị ngắt giữa chừng: chạy --link-resume để làm tiếp, --link-rollback để hoàn tác
+    - File source/target bị sửa sau khi quét (mtime khác) được bỏ qua
+    - Target đã dùng chung inode với source (bị ngắt ngay sau swap) được ghi 'done'
+      luôn, không kiểm tra mtime (mtime lúc này là của source)
     """
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write("=" * 60 + "\n")
-        f.write("  BÁO CÁO FILE TRÙNG LẶP\n")
-        f.write("=" * 60 + "\n\n")
-        
-        duplicate_groups = len(duplicates)
-        total_duplicates = sum(len(files) - 1 for files in duplicates.values())
-        
-        f.write(f"Tổng số nhóm trùng lặp: {duplicate_groups}\n")
-        f.write(f"Tổng số file trùng lặp: {total_duplicates}\n\n")
+    done = set(done or ())
+    is_new = not os.path.exists(journal_path)
+    
+    journal_dir = os.path.dirname(journal_path)
+    if journal_dir:
+        os.makedirs(journal_dir, exist_ok=True)
+    
+    linked = 0
+    errors = 0
+    freed_inodes = {}
+    pending = [item for item in plan if item['target'] not in done]
+    if not pending:
+        print("✅ Không còn file nào cần thay (journal đã chạy xong)")
+        return 0, 0, 0
+    
+    progress = ProgressBar(len(pending), prefix=f"Tạo {method}:")
+    
+    with open(journal_path, 'a', encoding='utf-8') as journal:
+        if is_new:
+            _append_journal(journal, {'type': 'header', 'method': method,
+                                      'created': time.strftime('%Y-%m-%d %H:%M:%S')})
+            for item in plan:
+                _append_journal(journal, dict(item, type='plan'))
         
-        for idx, (key, files) in enumerate(duplicates.items(), 1):
-            if by_hash:
-                file_size = files[0][1]
-                file_paths = [f[0] for f in files]
-            else:
-                file_size = key
-                file_paths = files
-            
-            group_waste = file_size * (len(file_paths) - 1)
+        for item in pending:
+            source, target = item['source'], item['target']
             
-            f.write(f"\nNhóm {idx}: {len(file_paths)} file ({format_size(file_size)})\n")
-            if by_hash:
-                f.write(f"Hash: {key}\n")
+            try:
+                source_stat = os.stat(source)
+                target_stat = os.stat(target)
+                
+                if source_stat.st_ino and (source_stat.st_dev, source_stat.st_ino) == \
+                        (target_stat.st_dev, target_stat.st_ino):
+                    log_info(f"{method}: {target} đã là liên kết tới {source}, ghi lại journal")
+                else:
+                    if (source_stat.st_mtime_ns != item['source_mtime_ns'] or
+                            target_stat.st_mtime_ns != item['mtime_ns'] or
+                            target_stat.st_size != item['size']):
+                        raise OSError("file đã thay đổi sau khi quét")
+                    
+                    swap_with_link(source, target, method, item['mode'], item['mtime_ns'])
+                    log_info(f"{method}: {target} -> {source}")
+                
+                _append_journal(journal, {'type': 'done', 'target': target})
+                linked += 1
+                freed_inodes[tuple(item['inode'])] = item['size']
+            except OSError as e:
+                errors += 1
+                _append_journal(journal, {'type': 'error', 'target': target, 'error': str(e)})
+                log_error(f"Lỗi {method} {target}: {e}")
             
-            for file_path in file_paths:
-                f.write(f"  - {file_path}\n")
+            progress.update()
     
-    log_info(f"Đã lưu báo cáo: {output_file}")
+    progress.finish()
+    
+    return linked, errors, sum(freed_inodes.values())
 
 
-def delete_duplicates_interactive(duplicates: dict, by_hash: bool = True):
+def rollback_link_journal(journal_path: str) -> Tuple[int, int]:
     """
-    Xóa file trùng lặp với tương tác
+    Hoàn tác các file đã thay bằng liên kết theo journal
     
     Args:
-        duplicates: Dictionary chứa duplicates
-        by_hash: True = duplicates theo hash
+        journal_path: File journal
+    
+    Returns:
+        tuple: (số file đã khôi phục, số file lỗi)
     
     Giải thích:
-    - Cho phép người dùng chọn cách xóa
-    - Xác nhận trước khi xóa
-    - Logging từng file bị xóa
+    - Gom target theo inode ghi trong plan (các target vốn là hardlink của nhau)
+    - Mỗi inode khôi phục một bản copy độc lập (mode/mtime gốc), các target còn lại
+      hardlink lại vào bản đó -> dung lượng trở về đúng như trước khi dedupe
+    - Ghi dòng 'rollback' vào journal nên chạy lại không làm lại file đã xong;
+      inode đã khôi phục một phần thì hardlink tiếp vào target đã rollback
+    - Target chưa có dòng 'done' nhưng đã dùng chung inode với source (bị ngắt
+      ngay sau swap) cũng được khôi phục
     """
-    print("\n===== CHẾ ĐỘ XÓA TRÙNG LẶP =====")
-    print("1. Giữ file đầu tiên, xóa các file còn lại")
-    print("2. Giữ file mới nhất (theo modification time), xóa cũ hơn")
-    print("3. Giữ file cũ nhất (theo modification time), xóa mới hơn")
-    print("0. Không xóa")
+    _, plan, done, rolled_back = read_link_journal(journal_path)
     
-    choice = get_user_input("Chọn (0-3)", default="0")
+    inode_groups: Dict[Tuple[int, int], List[dict]] = {}
+    for item in plan:
+        target = item['target']
+        if target in done or target in rolled_back or _shares_source_inode(item):
+            inode_groups.setdefault(tuple(item['inode']), []).append(item)
     
-    if choice == "0":
-        return
+    pending = sum(1 for items in inode_groups.values()
+                  for item in items if item['target'] not in rolled_back)
+    if not pending:
+        print("✅ Không có file nào cần hoàn tác (journal đã rollback xong)")
+        return 0, 0
     
-    files_to_delete = []
+    restored = 0
+    errors = 0
+    progress = ProgressBar(pending, prefix="Rollback:")
     
-    for key, files in duplicates.items():
-        if by_hash:
-            file_paths = [f[0] for f in files]
-        else:
-            file_paths = files
-        
-        if choice == "1":
-            # Giữ file đầu tiên
-            files_to_delete.extend(file_paths[1:])
-        
-        elif choice == "2":
-            # Giữ file mới nhất
-            files_with_mtime = [(f, os.path.getmtime(f)) for f in file_paths]
-            files_sorted = sorted(files_with_mtime, key=lambda x: x[1], reverse=True)
-            files_to_delete.extend([f[0] for f in files_sorted[1:]])
-        
-        elif choice == "3":
-            # Giữ file cũ nhất
-            files_with_mtime = [(f, os.path.getmtime(f)) for f in file_paths]
-            files_sorted = sorted(files_with_mtime, key=lambda x: x[1])
-            files_to_delete.extend([f[0] for f in files_sorted[1:]])
+    with open(journal_path, 'a', encoding='utf-8') as journal:
+        for items in inode_groups.values():
+            anchor = next((item['target'] for item in items if item['target'] in rolled_back), None)
+            
+            for item in items:
+                target = item['target']
+                if target in rolled_back:
+                    continue
+                
+                try:
+                    if anchor is None:
+                        restore_independent_copy(target, item['mode'], item['mtime_ns'])
+                        anchor = target
+                    else:
+                        swap_with_link(anchor, target, 'hardlink')
+                    _append_journal(journal, {'type': 'rollback', 'target': target})
+                    restored += 1
+                    log_info(f"Rollback: {target}")
+                except OSError as e:
+                    errors += 1
+                    log_error(f"Lỗi rollback {target}: {e}")
+                
+                progress.update()
     
-    if not files_to_delete:
-        print("Không có file nào để xóa.")
+    progress.finish()
+    
+    return restored, errors
+
+
+def get_default_link_journal() -> str:
+    """Tên file journal mặc định theo thời gian chạy"""
+    return os.path.join('logs', f"duplicate-finder_link_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+
+
+def link_duplicates(duplicates: Dict[str, List[Tuple[str, int]]], method: str,
+                    hardlinks: Optional[Dict[str, List[str]]] = None,
+                    dry_run: bool = False, journal_path: Optional[str] = None,
+                    confirm: bool = True):
+    """
+    Thay file trùng lặp bằng hardlink/reflink để giải phóng dung lượng
+    
+    Args:
+        duplicates: {hash: [(file_path, size), ...]} (nên đã verify nếu dùng hash nhanh)
+        method: 'hardlink' hoặc 'reflink'
+        hardlinks: {đường dẫn đại diện: [hardlink khác]} từ DuplicateFinder.hardlinks
+        dry_run: Chỉ báo cáo, không thay đổi file
+        journal_path: File journal (None = tự đặt tên trong logs/)
+        confirm: Hỏi xác nhận trước khi chạy
+    
+    Giải thích:
+    - Mọi đường dẫn vẫn đọc được như cũ, chỉ dữ liệu trùng được dùng chung
+    - Hardlink: sửa một file sẽ thấy ở tất cả các file cùng nhóm
+    - Reflink: copy-on-write, sửa một file không ảnh hưởng file khác (btrfs/XFS)
+    """
+    plan = build_link_plan(duplicates, hardlinks)
+    
+    if not plan:
+        print("Không có file nào cần thay.")
         return
     
-    # Hiển thị preview
-    print(f"\n⚠️  SẼ XÓA {len(files_to_delete)} FILE:")
-    for i, file_path in enumerate(files_to_delete[:10], 1):
-        print(f"   {i}. {file_path}")
+    reclaimable = get_reclaimable_bytes(plan)
+    print(f"\n🔗 Thay {len(plan)} file bằng {method}, giải phóng khoảng {format_size(reclaimable)}")
     
-    if len(files_to_delete) > 10:
-        print(f"   ... và {len(files_to_delete) - 10} file khác")
+    for item in plan[:10]:
+        print(f"   {item['target']} -> {item['source']}")
+    if len(plan) > 10:
+        print(f"   ... và {len(plan) - 10} file khác")
     
-    if not confirm_action(f"Bạn sắp xóa {len(files_to_delete)} file!", require_yes=True):
+    if dry_run:
+        print("\n(dry-run) Không có file nào bị thay đổi")
+        log_info(f"Dry-run {method}: {len(plan)} file, {reclaimable} bytes")
+        return
+    
+    if confirm and not confirm_action(f"Bạn sắp thay {len(plan)} file bằng {method}!", require_yes=True):
         print("❌ Đã hủy")
         return
     
-    # Xóa files
-    print(f"\n🗑️  Đang xóa...\n")
-    progress = ProgressBar(len(files_to_delete), prefix="Xóa file:")
+    journal_path = journal_path or get_default_link_journal()
+    print(f"\n📒 Journal: {journal_path}\n")
     
-    deleted = 0
-    errors = 0
+    linked, errors, freed = execute_link_plan(plan, method, journal_path)
+    print_link_summary(linked, errors, freed, journal_path)
+
+
+def print_link_summary(linked: int, errors: int, freed: int, journal_path: str):
+    """In kết quả thay file bằng liên kết"""
+    print(f"\n✅ Đã thay {linked} file, giải phóng {format_size(freed)}")
+    if errors > 0:
+        print(f"❌ {errors} file gặp lỗi/bị bỏ qua (xem log)")
+    print(f"   Hoàn tác: --link-rollback {journal_path}")
+    log_info(f"Link hoàn thành: {linked} file, {errors} lỗi, {freed} bytes")
+
+
+def resume_link_journal(journal_path: str):
+    """
+    Chạy tiếp thao tác thay bằng liên kết bị ngắt giữa chừng
     
-    for file_path in files_to_delete:
-        success, error = safe_delete(file_path)
-        
-        if success:
-            deleted += 1
-            log_info(f"Đã xóa: {file_path}")
-        else:
-            errors += 1
-            log_error(f"Lỗi xóa {file_path}: {error}")
-        
-        progress.update()
+    Args:
+        journal_path: File journal của lần chạy trước
+    """
+    if not os.path.isfile(journal_path):
+        print(f"❌ Journal không tồn tại: {journal_path}")
+        return
     
-    progress.finish()
+    header, plan, done, _ = read_link_journal(journal_path)
+    if not header:
+        print(f"❌ Journal không hợp lệ: {journal_path}")
+        return
     
-    print(f"\n✅ Đã xóa {deleted}/{len(files_to_delete)} file")
-    if errors > 0:
-        print(f"❌ {errors} file gặp lỗi")
+    # Dọn file tạm còn sót khi bị ngắt đúng lúc swap
+    for item in plan:
+        _remove_quietly(_link_temp_path(item['target']))
     
-    log_info(f"Xóa hoàn thành: {deleted} thành công, {errors} lỗi")
+    print(f"🔁 Tiếp tục {header['method']}: {len(done)}/{len(plan)} file đã xong\n")
+    linked, errors, freed = execute_link_plan(plan, header['method'], journal_path, done)
+    if linked or errors:
+        print_link_summary(linked, errors, freed, journal_path)
+
+
+def undo_link_journal(journal_path: str):
+    """
+    Hoàn tác thao tác thay bằng liên kết theo journal
+    
+    Args:
+        journal_path: File journal
+    """
+    if not os.path.isfile(journal_path):
+        print(f"❌ Journal không tồn tại: {journal_path}")
+        return
+    
+    print(f"⏪ Đang hoàn tác theo journal: {journal_path}\n")
+    restored, errors = rollback_link_journal(journal_path)
+    if not restored and not errors:
+        return
+    
+    print(f"\n✅ Đã khôi phục {restored} file về trạng thái trước khi thay")
+    if errors > 0:
+        print(f"❌ {errors} file gặp lỗi (xem log)")
+    log_info(f"Rollback {journal_path}: {restored} file, {errors} lỗi")
 
 
 def main_interactive():
@@ -514,23 +2664,36 @@ def main_interactive():
     
     # Chọn phương pháp
     print("\n===== PHƯƠNG PHÁP TÌM =====")
+    fast_algo = get_fastest_algorithm()
     print("1. Theo hash (MD5) - Chính xác nhưng chậm")
     print("2. Theo hash (SHA256) - Chính xác hơn MD5")
     print("3. Theo kích thước - Nhanh nhưng không chính xác")
+    print(f"4. Theo hash nhanh ({fast_algo.upper()}) - Nhanh, so sánh byte trước khi xóa")
+    print("5. Ảnh gần giống (pHash) - Tìm ảnh đã resize/nén lại, cần Pillow + NumPy")
     
-    method = get_user_input("Chọn phương pháp (1-3)", default="1")
+    method = get_user_input("Chọn phương pháp (1-5)", default="1")
     
     # Multiprocessing
     use_mp = get_user_input("Sử dụng multiprocessing? (Y/n)", default="y")
     use_multiprocessing = use_mp.lower() != 'n'
     
     # Tạo finder
-    if method in ["1", "2"]:
-        hash_algo = 'md5' if method == "1" else 'sha256'
-        finder = DuplicateFinder(folder_input, recursive, min_size, hash_algo)
+    hash_algo = None
+    by_hash = True
+    
+    if method in ["1", "2", "4"]:
+        hash_algo = {'1': 'md5', '2': 'sha256', '4': fast_algo}[method]
+        finder = DuplicateFinder(folder_input, recursive, min_size, hash_algo,
+                                 cache_path=DEFAULT_CACHE_FILE)
         duplicates = finder.find_by_size_first(use_multiprocessing)
         
-        total_duplicates, wasted_space = display_duplicates(duplicates, by_hash=True)
+        print()
+        display_stage_stats(finder.stage_stats)
+        display_cache_stats(finder)
+        
+        total_duplicates, wasted_space = display_duplicates(duplicates, by_hash=True,
+                                                            hardlinks=finder.hardlinks)
+        display_hardlinks(finder.hardlink_groups)
         
         if duplicates:
             print(f"{'='*60}")
@@ -538,10 +2701,13 @@ def main_interactive():
             print(f"{'='*60}")
     
     elif method == "3":
+        by_hash = False
         finder = DuplicateFinder(folder_input, recursive, min_size)
         duplicates = finder.find_by_size_only()
         
-        total_duplicates, wasted_space = display_duplicates(duplicates, by_hash=False)
+        total_duplicates, wasted_space = display_duplicates(duplicates, by_hash=False,
+                                                            hardlinks=finder.hardlinks)
+        display_hardlinks(finder.hardlink_groups)
         
         if duplicates:
             print(f"{'='*60}")
@@ -549,6 +2715,26 @@ def main_interactive():
             print(f"⚠️  Lưu ý: Phương pháp này chỉ dựa trên kích thước, có thể không chính xác 100%")
             print(f"{'='*60}")
     
+    elif method == "5":
+        if not IMAGE_HASH_AVAILABLE:
+            print("❌ Cần cài Pillow và NumPy: pip install Pillow numpy")
+            return
+        
+        finder = DuplicateFinder(folder_input, recursive, min_size, cache_path=DEFAULT_CACHE_FILE)
+        duplicates = finder.find_similar_images(use_multiprocessing=use_multiprocessing)
+        
+        print()
+        display_stage_stats(finder.stage_stats)
+        display_cache_stats(finder)
+        
+        _, reclaimable = display_similar_images(duplicates)
+        
+        if duplicates:
+            print(f"{'='*60}")
+            print(f"💾 Giữ ảnh lớn nhất mỗi nhóm sẽ giải phóng: {format_size(reclaimable)}")
+            print(f"⚠️  Ảnh gần giống không giống hệt nhau, hãy xem lại trước khi xóa")
+            print(f"{'='*60}")
+    
     else:
         print("❌ Lựa chọn không hợp lệ!")
         return
@@ -560,25 +2746,180 @@ def main_interactive():
     save_input = get_user_input("\nLưu báo cáo ra file? (y/N)", default="n")
     if save_input.lower() == 'y':
         output_file = "duplicate_report.txt"
-        save_report(duplicates, output_file, by_hash=(method in ["1", "2"]))
+        save_report(duplicates, output_file, by_hash=by_hash,
+                    hardlink_groups=finder.hardlink_groups)
         print(f"✅ Đã lưu báo cáo: {output_file}")
     
+    # Thay file trùng lặp bằng liên kết (chỉ khi đã so sánh theo hash)
+    if hash_algo:
+        link_input = get_user_input("\nThay file trùng lặp bằng hardlink/reflink? (y/N)", default="n")
+        if link_input.lower() == 'y':
+            method = get_user_input("Cách liên kết (hardlink/reflink)", default="hardlink").lower()
+            if method not in LINK_METHODS:
+                print("❌ Lựa chọn không hợp lệ!")
+                return
+            
+            if not is_cryptographic(hash_algo):
+                duplicates = verify_duplicates(duplicates)
+            
+            link_duplicates(duplicates, method, hardlinks=finder.hardlinks)
+            return
+    
     # Xóa file trùng lặp
     delete_input = get_user_input("\nXóa file trùng lặp? (y/N)", default="n")
     if delete_input.lower() == 'y':
-        delete_duplicates_interactive(duplicates, by_hash=(method in ["1", "2"]))
+        if hash_algo and not is_cryptographic(hash_algo):
+            # Hash nhanh: bắt buộc so sánh byte để không xóa nhầm
+            duplicates = verify_duplicates(duplicates)
+        
+        delete_duplicates_interactive(duplicates, by_hash=by_hash,
+                                      hardlinks=finder.hardlinks)
+
+
+def main_cli_streaming(args, finder: DuplicateFinder, report_format: str):
+    """
+    Chế độ CLI ghi báo cáo streaming (NDJSON/CSV)
+    
+    Args:
+        args: Tham số CLI
+        finder: DuplicateFinder đã khởi tạo
+        report_format: 'ndjson' hoặc 'csv'
+    
+    Giải thích:
+    - Mỗi nhóm được ghi ngay khi xác định (và so sánh byte nếu cần)
+    - Màn hình chỉ hiện tổng kết, không giữ danh sách nhóm trong RAM
+    """
+    verify = args.verify or not is_cryptographic(finder.hash_algo)
+    
+    with StreamingReport(args.output, report_format) as report:
+        def on_group(file_hash: str, files: List[Tuple[str, int]]):
+            groups = verify_group(file_hash, files) if verify else {file_hash: files}
+            for key, group in groups.items():
+                report.write_group(key, [f[0] for f in group], group[0][1], finder.hardlinks)
+        
+        if args.size_only:
+            for size, file_paths in finder.find_by_size_only().items():
+                report.write_group(None, file_paths, size, finder.hardlinks)
+        elif args.similar:
+            similar = finder.find_similar_images(args.similar, args.similar_threshold,
+                                                 not args.no_multiprocessing)
+            for key, files in similar.items():
+                report.write_group(key, [f[0] for f in files], files[0][1], finder.hardlinks,
+                                   wasted_bytes=sum(size for _, size in files[1:]))
+            print()
+            display_stage_stats(finder.stage_stats)
+            display_cache_stats(finder)
+        else:
+            finder.find_by_size_first(not args.no_multiprocessing, on_group=on_group)
+            print()
+            display_stage_stats(finder.stage_stats)
+            display_cache_stats(finder)
+        
+        report.write_hardlinks(finder.hardlink_groups)
+    
+    print(f"📊 {report.group_count} nhóm trùng lặp, {report.duplicate_count} file thừa, "
+          f"lãng phí {format_size(report.wasted_space)}")
+    print(f"✅ Đã ghi báo cáo {report_format}: {args.output}")
+    log_info(f"Báo cáo streaming {args.output}: {report.group_count} nhóm")
+
+
+def get_default_state_file() -> str:
+    """Tên file checkpoint mặc định theo thời gian chạy"""
+    return os.path.join('logs', f"duplicate-finder_state_{time.strftime('%Y%m%d_%H%M%S')}.db")
 
 
 def main_cli(args):
-    """Chế độ CLI"""
-    hash_algo = 'sha256' if args.sha256 else 'md5'
-    
-    finder = DuplicateFinder(
-        args.directory,
-        recursive=not args.no_recursive,
-        min_size=args.min_size * 1024 if args.min_size else 0,
-        hash_algo=hash_algo
-    )
+    """
+    Chế độ CLI
+    
+    Giải thích:
+    - Chỉ ghi checkpoint khi có --checkpoint/--checkpoint-file (mỗi file một dòng
+      trong state, lần quét thường không cần), xong thì xóa file checkpoint
+    - Có checkpoint thì Ctrl+C: lưu checkpoint và in lệnh --resume để chạy tiếp
+    """
+    state = None
+    cache_path = None if args.no_cache else args.cache_file
+    
+    if args.resume:
+        if not os.path.isfile(args.resume):
+            print(f"❌ File checkpoint không tồn tại: {args.resume}")
+            return
+        
+        state = ScanState(args.resume)
+        options = state.get_meta('options')
+        if not options:
+            state.close()
+            print(f"❌ File checkpoint không hợp lệ: {args.resume}")
+            return
+        
+        print(f"🔁 Tiếp tục quét {options['folder_path']} từ checkpoint: {args.resume}\n")
+        finder = DuplicateFinder(**options, cache_path=cache_path,
+                                 scan_workers=args.scan_workers, state=state)
+    else:
+        finder = DuplicateFinder(
+            args.directory,
+            recursive=not args.no_recursive,
+            min_size=args.min_size * 1024 if args.min_size else 0,
+            hash_algo='sha256' if args.sha256 else args.algo,
+            prefilter=not args.no_prefilter,
+            prefilter_block_size=args.prefilter_size * 1024,
+            prefilter_tail=args.prefilter_tail,
+            cache_path=cache_path,
+            io_engine=args.io_engine,
+            block_size=args.block_size * 1024,
+            scan_workers=args.scan_workers
+        )
+        
+        if (args.checkpoint or args.checkpoint_file) and not (args.size_only or args.similar):
+            if args.checkpoint_file and os.path.exists(args.checkpoint_file):
+                print(f"❌ File checkpoint đã tồn tại: {args.checkpoint_file} (dùng --resume để chạy tiếp)")
+                return
+            
+            state = ScanState(args.checkpoint_file or get_default_state_file())
+            state.set_meta('options', finder.get_options())
+            state.set_meta('phase', 'scan')
+            finder.state = state
+    
+    try:
+        run_cli(args, finder)
+    except KeyboardInterrupt:
+        if state is None:
+            raise
+        state.close()
+        print(f"\n\n⏸️  Đã dừng, checkpoint đã lưu. Chạy tiếp bằng:")
+        print(f"   python duplicate-finder.py --resume {state.db_path}")
+        log_info(f"Dừng quét, checkpoint: {state.db_path}")
+        return
+    
+    if state is not None:
+        state.remove()
+
+
+def run_cli(args, finder: DuplicateFinder):
+    """
+    Chạy tìm kiếm và xuất kết quả theo tham số CLI
+    
+    Args:
+        args: Tham số CLI
+        finder: DuplicateFinder đã khởi tạo
+    """
+    report_format = get_report_format(args.output, args.format)
+    if report_format != 'text':
+        main_cli_streaming(args, finder, report_format)
+        return
+    
+    if args.similar:
+        similar = finder.find_similar_images(args.similar, args.similar_threshold,
+                                             not args.no_multiprocessing)
+        print()
+        display_stage_stats(finder.stage_stats)
+        display_cache_stats(finder)
+        display_similar_images(similar, limit=1000 if args.all else 20)
+        
+        if args.output:
+            save_report(similar, args.output, by_hash=True)
+            print(f"✅ Đã lưu báo cáo: {args.output}")
+        return
     
     if args.size_only:
         duplicates = finder.find_by_size_only()
@@ -586,12 +2927,87 @@ def main_cli(args):
     else:
         duplicates = finder.find_by_size_first(not args.no_multiprocessing)
         by_hash = True
+        
+        print()
+        display_stage_stats(finder.stage_stats)
+        display_cache_stats(finder)
+        
+        if args.verify or (args.link and not is_cryptographic(finder.hash_algo)):
+            # Thay bằng liên kết với hash nhanh: bắt buộc so sánh byte
+            duplicates = verify_duplicates(duplicates)
     
-    display_duplicates(duplicates, by_hash, limit=1000 if args.all else 20)
+    limit = 1000 if args.all else 20
+    display_duplicates(duplicates, by_hash, limit=limit, hardlinks=finder.hardlinks)
+    display_hardlinks(finder.hardlink_groups, limit=limit)
     
     if args.output:
-        save_report(duplicates, args.output, by_hash)
+        save_report(duplicates, args.output, by_hash, hardlink_groups=finder.hardlink_groups)
         print(f"✅ Đã lưu báo cáo: {args.output}")
+    
+    if args.link and duplicates:
+        link_duplicates(duplicates, args.link, hardlinks=finder.hardlinks,
+                        dry_run=args.dry_run, journal_path=args.journal, confirm=not args.yes)
+
+
+def prune_cache(cache_file: str):
+    """
+    Dọn dẹp file cache hash
+    
+    Args:
+        cache_file: Đường dẫn file cache
+    
+    Giải thích:
+    - Xóa row của file đã bị xóa/sửa (stat không còn khớp)
+    - VACUUM để thu gọn file SQLite
+    """
+    if not os.path.isfile(cache_file):
+        print(f"❌ File cache không tồn tại: {cache_file}")
+        return
+    
+    old_size = os.path.getsize(cache_file)
+    cache = HashCache(cache_file)
+    
+    print(f"🧹 Đang kiểm tra cache: {cache_file}")
+    removed, kept = cache.prune()
+    cache.compact()
+    cache.close()
+    
+    new_size = os.path.getsize(cache_file)
+    print(f"✅ Đã xóa {removed} mục cũ, giữ lại {kept} mục")
+    print(f"   Kích thước cache: {format_size(old_size)} → {format_size(new_size)}")
+    log_info(f"Prune cache {cache_file}: xóa {removed}, giữ {kept}")
+
+
+def run_io_benchmark(file_path: str, hash_algo: str):
+    """
+    Đo tốc độ hash (MB/s) của từng I/O engine trên ổ đĩa hiện tại
+    
+    Args:
+        file_path: File dùng để đo (nên lớn, vd: vài trăm MB)
+        hash_algo: Thuật toán hash
+    
+    Giải thích:
+    - Thử read / readinto / mmap với nhiều block size
+    - Bỏ page cache trước mỗi lần đo nếu OS hỗ trợ (đo tốc độ đọc đĩa thật)
+    """
+    if not os.path.isfile(file_path):
+        print(f"❌ File không tồn tại: {file_path}")
+        return
+    
+    hash_algo = resolve_algorithm(hash_algo)
+    print(f"⏱️  Benchmark hash {hash_algo} trên {file_path} ({format_size(os.path.getsize(file_path))})\n")
+    
+    results = benchmark_hash_engines(file_path, hash_algo)
+    
+    print(f"   {'Engine':<10} {'Block':>10} {'MB/s':>10}")
+    for result in results:
+        print(f"   {result['engine']:<10} {format_size(result['block_size']):>10} "
+              f"{result['mb_per_s']:>10.1f}")
+        log_info(f"Benchmark {result['engine']} block={result['block_size']}: "
+                 f"{result['mb_per_s']:.1f} MB/s")
+    
+    if results and not results[0]['cold_cache']:
+        print("\n⚠️  OS không hỗ trợ bỏ page cache, kết quả có thể là tốc độ đọc từ RAM")
 
 
 def main():
@@ -600,17 +3016,86 @@ def main():
     
     parser = argparse.ArgumentParser(description='Tool tìm file trùng lặp')
     parser.add_argument('directory', nargs='?', help='Thư mục cần quét')
-    parser.add_argument('--sha256', action='store_true', help='Dùng SHA256 thay vì MD5')
+    parser.add_argument('--algo', default='md5', type=str.lower, choices=known_algorithms(),
+                        help='Thuật toán hash (mặc định: md5; xxh3_128/blake3 dùng blake2b nếu chưa cài)')
+    parser.add_argument('--sha256', action='store_true', help='Dùng SHA256 thay vì MD5 (= --algo sha256)')
+    parser.add_argument('--verify', action='store_true',
+                        help='So sánh từng byte các nhóm trùng lặp sau khi hash')
     parser.add_argument('--size-only', action='store_true', help='Chỉ so sánh theo size')
     parser.add_argument('--min-size', type=int, help='Kích thước tối thiểu (KB)')
     parser.add_argument('--no-recursive', action='store_true', help='Không quét thư mục con')
     parser.add_argument('--no-multiprocessing', action='store_true', help='Tắt multiprocessing')
+    parser.add_argument('--no-prefilter', action='store_true',
+                        help='Bỏ bước hash khối đầu, hash toàn bộ file ngay')
+    parser.add_argument('--prefilter-size', type=int, default=PREFILTER_BLOCK_SIZE // 1024,
+                        help='Kích thước khối đầu/cuối khi lọc nhanh (KB, mặc định: 4)')
+    parser.add_argument('--prefilter-tail', action='store_true',
+                        help='Hash thêm khối cuối file ở bước lọc nhanh')
+    parser.add_argument('--scan-workers', type=int, default=DEFAULT_SCAN_WORKERS,
+                        help=f'Số thread quét thư mục song song (mặc định: {DEFAULT_SCAN_WORKERS}, 1 = tuần tự)')
+    parser.add_argument('--io-engine', default='auto', choices=IO_ENGINES,
+                        help='Cách đọc file khi hash (mặc định: auto = mmap với file lớn, readinto với file nhỏ)')
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE // 1024,
+                        help='Kích thước block đọc khi hash (KB, mặc định: 1024)')
+    parser.add_argument('--benchmark-io', metavar='FILE',
+                        help='Đo tốc độ hash (MB/s) của từng I/O engine trên FILE rồi thoát')
+    parser.add_argument('--cache-file', default=DEFAULT_CACHE_FILE,
+                        help=f'File cache hash (mặc định: {DEFAULT_CACHE_FILE})')
+    parser.add_argument('--no-cache', action='store_true', help='Không dùng cache hash')
+    parser.add_argument('--cache-prune', action='store_true',
+                        help='Xóa mục cache cũ và thu gọn file cache rồi thoát')
+    parser.add_argument('--similar', choices=list(PERCEPTUAL_HASHERS),
+                        help='Tìm ảnh gần giống bằng perceptual hash (cần Pillow + NumPy)')
+    parser.add_argument('--similar-threshold', type=int, default=DEFAULT_SIMILAR_THRESHOLD,
+                        help=f'Khoảng cách Hamming tối đa trên 64 bit (mặc định: {DEFAULT_SIMILAR_THRESHOLD})')
+    parser.add_argument('--checkpoint', action='store_true',
+                        help='Ghi checkpoint để --resume được khi bị ngắt '
+                             '(logs/duplicate-finder_state_<time>.db, xóa khi xong)')
+    parser.add_argument('--checkpoint-file', metavar='STATE',
+                        help='Ghi checkpoint vào file này (bao gồm --checkpoint)')
+    parser.add_argument('--resume', metavar='STATE',
+                        help='Tiếp tục lần quét bị ngắt từ file checkpoint (dùng lại tùy chọn quét đã lưu)')
+    parser.add_argument('--link', choices=LINK_METHODS,
+                        help='Thay file trùng lặp bằng hardlink hoặc reflink (btrfs/XFS)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Với --link: chỉ báo cáo dung lượng giải phóng được, không sửa file')
+    parser.add_argument('--journal', help='Với --link: file journal (mặc định: logs/duplicate-finder_link_<time>.jsonl)')
+    parser.add_argument('-y', '--yes', action='store_true', help='Với --link: không hỏi xác nhận')
+    parser.add_argument('--link-resume', metavar='JOURNAL',
+                        help='Chạy tiếp thao tác --link bị ngắt theo journal rồi thoát')
+    parser.add_argument('--link-rollback', metavar='JOURNAL',
+                        help='Hoàn tác thao tác --link (khôi phục bản copy riêng, giữ hardlink có từ trước) rồi thoát')
     parser.add_argument('-o', '--output', help='File output cho báo cáo')
+    parser.add_argument('--format', choices=REPORT_FORMATS,
+                        help='Định dạng báo cáo (mặc định: theo đuôi file -o; .ndjson/.jsonl/.csv ghi streaming)')
     parser.add_argument('-a', '--all', action='store_true', help='Hiển thị tất cả kết quả')
     
     args = parser.parse_args()
     
-    if args.directory:
+    if args.link and (args.size_only or args.similar):
+        parser.error('--link chỉ dùng được khi so sánh theo hash (không dùng với --size-only/--similar)')
+    
+    if args.resume and (args.size_only or args.similar):
+        parser.error('--resume chỉ dùng cho quét theo hash')
+    
+    if args.similar and not IMAGE_HASH_AVAILABLE:
+        parser.error('--similar cần Pillow và NumPy: pip install Pillow numpy')
+    
+    if get_report_format(args.output, args.format) != 'text':
+        if not args.output:
+            parser.error('--format ndjson/csv cần -o FILE')
+        if args.link:
+            parser.error('--link không dùng được với báo cáo streaming (ndjson/csv)')
+    
+    if args.benchmark_io:
+        run_io_benchmark(args.benchmark_io, 'sha256' if args.sha256 else args.algo)
+    elif args.link_resume:
+        resume_link_journal(args.link_resume)
+    elif args.link_rollback:
+        undo_link_journal(args.link_rollback)
+    elif args.cache_prune:
+        prune_cache(args.cache_file)
+    elif args.directory or args.resume:
         main_cli(args)
     else:
         try:
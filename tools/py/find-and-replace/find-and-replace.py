@@ -6,8 +6,14 @@ Tool: Tìm và thay thế text trong nhiều file
 
 import os
 import re
+import sys
 from pathlib import Path
 
+# Thêm thư mục cha vào sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import scan_files
+
 
 def print_header():
     print("=" * 60)
@@ -81,21 +87,10 @@ def replace_in_file(file_path, search_text, replace_text, case_sensitive=True, u
 
 def get_files_to_process(folder_path, file_extensions, recursive=True):
     """Lấy danh sách file cần xử lý"""
-    files_list = []
-    
-    if recursive:
-        for root, dirs, files in os.walk(folder_path):
-            for file in files:
-                if not file_extensions or any(file.lower().endswith(ext) for ext in file_extensions):
-                    files_list.append(os.path.join(root, file))
-    else:
-        for file in os.listdir(folder_path):
-            file_path = os.path.join(folder_path, file)
-            if os.path.isfile(file_path):
-                if not file_extensions or any(file.lower().endswith(ext) for ext in file_extensions):
-                    files_list.append(file_path)
-    
-    return files_list
+    return [
+        entry.path
+        for entry in scan_files(folder_path, extensions=file_extensions or None, recursive=recursive)
+    ]
 
 
 def find_mode(folder_path, search_text, file_extensions, case_sensitive, use_regex, recursive):
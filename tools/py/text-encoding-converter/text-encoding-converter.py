@@ -5,9 +5,15 @@ Tool: Chuyển đổi encoding của file text
 """
 
 import os
+import sys
 import chardet
 from pathlib import Path
 
+# Thêm thư mục cha vào sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import scan_files
+
 
 def print_header():
     print("=" * 60)
@@ -77,61 +83,35 @@ def convert_folder(folder_path, source_encoding, target_encoding, file_extension
     
     print(f"\n🔄 Bắt đầu chuyển đổi...\n")
     
-    if recursive:
-        for root, dirs, files in os.walk(folder_path):
-            for file in files:
-                if not file_extensions or any(file.lower().endswith(ext) for ext in file_extensions):
-                    file_path = os.path.join(root, file)
-                    
-                    # Detect encoding nếu source là 'auto'
-                    if source_encoding.lower() == 'auto':
-                        detected, confidence = detect_encoding(file_path)
-                        if detected and confidence > 0.7:
-                            actual_source = detected
-                            print(f"📄 {file} (detect: {detected}, {confidence:.0%})")
-                        else:
-                            print(f"⚠️  {file} - Khong phat hien duoc encoding, bo qua")
-                            skipped_count += 1
-                            continue
-                    else:
-                        actual_source = source_encoding
-                        print(f"📄 {file}")
-                    
-                    # Convert
-                    success = convert_encoding(file_path, actual_source, target_encoding, backup)
-                    
-                    if success:
-                        print(f"   ✓ {actual_source} → {target_encoding}")
-                        converted_count += 1
-                    else:
-                        error_count += 1
-    else:
-        files = [f for f in os.listdir(folder_path) if os.path.isfile(os.path.join(folder_path, f))]
+    # Lấy hết danh sách trước khi ghi: file .bak tạo ra trong lúc chạy không bị quét lại
+    files_to_convert = list(scan_files(folder_path, extensions=file_extensions or None, recursive=recursive))
+    
+    for entry in files_to_convert:
+        file = entry.name
+        file_path = entry.path
         
-        for file in files:
-            if not file_extensions or any(file.lower().endswith(ext) for ext in file_extensions):
-                file_path = os.path.join(folder_path, file)
-                
-                if source_encoding.lower() == 'auto':
-                    detected, confidence = detect_encoding(file_path)
-                    if detected and confidence > 0.7:
-                        actual_source = detected
-                        print(f"📄 {file} (detect: {detected}, {confidence:.0%})")
-                    else:
-                        print(f"⚠️  {file} - Khong phat hien duoc encoding, bo qua")
-                        skipped_count += 1
-                        continue
-                else:
-                    actual_source = source_encoding
-                    print(f"📄 {file}")
-                
-                success = convert_encoding(file_path, actual_source, target_encoding, backup)
-                
-                if success:
-                    print(f"   ✓ {actual_source} → {target_encoding}")
-                    converted_count += 1
-                else:
-                    error_count += 1
+        # Detect encoding nếu source là 'auto'
+        if source_encoding.lower() == 'auto':
+            detected, confidence = detect_encoding(file_path)
+            if detected and confidence > 0.7:
+                actual_source = detected
+                print(f"📄 {file} (detect: {detected}, {confidence:.0%})")
+            else:
+                print(f"⚠️  {file} - Khong phat hien duoc encoding, bo qua")
+                skipped_count += 1
+                continue
+        else:
+            actual_source = source_encoding
+            print(f"📄 {file}")
+        
+        # Convert
+        success = convert_encoding(file_path, actual_source, target_encoding, backup)
+        
+        if success:
+            print(f"   ✓ {actual_source} → {target_encoding}")
+            converted_count += 1
+        else:
+            error_count += 1
     
     return converted_count, skipped_count, error_count
 
@@ -143,21 +123,10 @@ def detect_mode(folder_path, file_extensions, recursive=True):
     
     encoding_stats = {}
     
-    if recursive:
-        files_to_check = []
-        for root, dirs, files in os.walk(folder_path):
-            for file in files:
-                if not file_extensions or any(file.lower().endswith(ext) for ext in file_extensions):
-                    files_to_check.append(os.path.join(root, file))
-    else:
-        files_to_check = [
-            os.path.join(folder_path, f) 
-            for f in os.listdir(folder_path) 
-            if os.path.isfile(os.path.join(folder_path, f))
-            and (not file_extensions or any(f.lower().endswith(ext) for ext in file_extensions))
-        ]
+    files_to_check = scan_files(folder_path, extensions=file_extensions or None, recursive=recursive)
     
-    for file_path in files_to_check:
+    for entry in files_to_check:
+        file_path = entry.path
         encoding, confidence = detect_encoding(file_path)
         
         if encoding:
@@ -11,6 +11,7 @@ Cấu trúc:
 - file_ops.py: Thao tác file/folder
 - progress.py: Progress bar
 - logger.py: Logging system
+- hashing.py: Registry thuật toán hash và I/O engine đọc file
 """
 
 # Import từ các module mới
@@ -30,6 +31,10 @@ from .validation import (
 )
 
 from .file_ops import (
+    FileEntry,
+    scan_files,
+    parallel_scan_files,
+    DEFAULT_SCAN_WORKERS,
     get_file_list,
     get_folder_size,
     safe_delete,
@@ -55,6 +60,20 @@ from .logger import (
     log_operation
 )
 
+from .hashing import (
+    register_hasher,
+    available_algorithms,
+    known_algorithms,
+    resolve_algorithm,
+    get_fastest_algorithm,
+    get_hasher,
+    is_cryptographic,
+    hash_file,
+    benchmark_hash_engines,
+    IO_ENGINES,
+    DEFAULT_BLOCK_SIZE
+)
+
 from .ui import (
     print_success_box,
     print_error_box,
@@ -82,6 +101,10 @@ __all__ = [
     'parse_size_string',
     
     # File operations
+    'FileEntry',
+    'scan_files',
+    'parallel_scan_files',
+    'DEFAULT_SCAN_WORKERS',
     'get_file_list',
     'get_folder_size',
     'safe_delete',
@@ -104,6 +127,19 @@ __all__ = [
     'log_success',
     'log_operation',
     
+    # Hashing
+    'register_hasher',
+    'available_algorithms',
+    'known_algorithms',
+    'resolve_algorithm',
+    'get_fastest_algorithm',
+    'get_hasher',
+    'is_cryptographic',
+    'hash_file',
+    'benchmark_hash_engines',
+    'IO_ENGINES',
+    'DEFAULT_BLOCK_SIZE',
+    
     # UI components
     'print_success_box',
     'print_error_box',
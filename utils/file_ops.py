@@ -9,8 +9,272 @@ Lý do: Tách riêng logic file operations để dễ maintain và test
 
 import os
 import shutil
+import fnmatch
 from pathlib import Path
-from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Iterator, List, Optional, Tuple
+
+
+# Số thread mặc định cho parallel_scan_files (quét bị giới hạn bởi độ trễ I/O, không phải CPU)
+DEFAULT_SCAN_WORKERS = 16
+
+
+class FileEntry:
+    """
+    Entry nhẹ trả về từ scan_files()
+    
+    Mục đích: Mang theo kết quả DirEntry.stat() đã lấy khi quét
+    Lý do: Tránh gọi os.path.getsize()/Path.is_file() thêm một lần stat cho mỗi file
+    """
+    
+    __slots__ = ('path', 'name', 'depth', 'is_dir', 'stat')
+    
+    def __init__(self, path: str, name: str, depth: int, is_dir: bool = False,
+                 stat: Optional[os.stat_result] = None):
+        """
+        Args:
+            path: Đường dẫn đầy đủ
+            name: Tên file/thư mục
+            depth: Độ sâu so với thư mục gốc (0 = nằm trực tiếp trong thư mục gốc)
+            is_dir: Có phải thư mục không
+            stat: Kết quả stat (None với thư mục)
+        """
+        self.path = path
+        self.name = name
+        self.depth = depth
+        self.is_dir = is_dir
+        self.stat = stat
+    
+    @property
+    def size(self) -> int:
+        """Kích thước file (bytes), 0 với thư mục"""
+        return self.stat.st_size if self.stat else 0
+    
+    @property
+    def mtime(self) -> float:
+        """Thời gian sửa đổi cuối (giây)"""
+        return self.stat.st_mtime if self.stat else 0.0
+    
+    @property
+    def mtime_ns(self) -> int:
+        """Thời gian sửa đổi cuối (nano giây)"""
+        return self.stat.st_mtime_ns if self.stat else 0
+    
+    def __fspath__(self) -> str:
+        return self.path
+    
+    def __repr__(self) -> str:
+        return f"FileEntry({self.path!r}, size={self.size})"
+
+
+def _matches_any(name: str, rel_path: str, patterns: List[str]) -> bool:
+    """
+    Kiểm tra tên hoặc đường dẫn tương đối có khớp glob nào không
+    
+    Args:
+        name: Tên file/thư mục
+        rel_path: Đường dẫn tương đối so với thư mục gốc (dùng '/')
+        patterns: Danh sách glob (vd: ['*.pyc', 'node_modules', 'build/*'])
+    
+    Returns:
+        bool: True nếu khớp ít nhất một pattern
+    """
+    for pattern in patterns:
+        if fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(rel_path, pattern):
+            return True
+    return False
+
+
+def _scan_directory(current: str, rel_dir: str, depth: int, extensions: Optional[tuple],
+                    max_depth: Optional[int], exclude_patterns: List[str], yield_dirs: bool,
+                    skip_dir: Optional[Callable[[FileEntry], bool]],
+                    skip_files: Optional[Callable[[str], bool]] = None) -> Tuple[List[FileEntry], List[tuple]]:
+    """
+    Quét một thư mục (không đệ quy)
+    
+    Args:
+        current: Đường dẫn thư mục
+        rel_dir: Đường dẫn tương đối so với thư mục gốc
+        depth: Độ sâu của các entry trong thư mục này
+        (các tham số còn lại giống scan_files)
+    
+    Returns:
+        tuple: (entries, subdirs) - subdirs là list (path, rel_path, depth) cần quét tiếp
+    
+    Giải thích:
+    - Dùng chung cho scan_files (tuần tự) và parallel_scan_files (thread pool)
+    - Thư mục không có quyền truy cập trả về rỗng
+    - skip_files(current) = True: chỉ tìm thư mục con, không stat file (dùng khi resume)
+    """
+    entries = []
+    subdirs = []
+    list_files = not (skip_files and skip_files(current))
+    
+    try:
+        with os.scandir(current) as it:
+            for dir_entry in it:
+                name = dir_entry.name
+                rel_path = f"{rel_dir}/{name}" if rel_dir else name
+                
+                if exclude_patterns and _matches_any(name, rel_path, exclude_patterns):
+                    continue
+                
+                try:
+                    if dir_entry.is_dir(follow_symlinks=False):
+                        entry = FileEntry(dir_entry.path, name, depth, is_dir=True)
+                        
+                        if yield_dirs:
+                            entries.append(entry)
+                        
+                        if max_depth is not None and depth >= max_depth:
+                            continue
+                        if skip_dir and skip_dir(entry):
+                            continue
+                        
+                        subdirs.append((dir_entry.path, rel_path, depth + 1))
+                        continue
+                    
+                    if not list_files or not dir_entry.is_file():
+                        continue
+                    
+                    if extensions and not name.lower().endswith(extensions):
+                        continue
+                    
+                    entries.append(FileEntry(dir_entry.path, name, depth, stat=dir_entry.stat()))
+                
+                except (OSError, PermissionError):
+                    # File bị xóa trong lúc quét hoặc không có quyền
+                    pass
+    except (OSError, PermissionError):
+        pass
+    
+    return entries, subdirs
+
+
+def scan_files(directory: str, extensions: Optional[List[str]] = None,
+               recursive: bool = True, max_depth: Optional[int] = None,
+               exclude_patterns: Optional[List[str]] = None,
+               yield_dirs: bool = False,
+               skip_dir: Optional[Callable[[FileEntry], bool]] = None,
+               skip_files: Optional[Callable[[str], bool]] = None,
+               on_dir_done: Optional[Callable[[str], None]] = None) -> Iterator[FileEntry]:
+    """
+    Duyệt thư mục bằng os.scandir, trả về từng file kèm stat
+    
+    Args:
+        directory: Thư mục cần quét
+        extensions: Danh sách phần mở rộng cần lọc (vd: ['.jpg', '.png'])
+        recursive: Có quét thư mục con không (False = max_depth 0)
+        max_depth: Độ sâu tối đa của thư mục con (None = không giới hạn)
+        exclude_patterns: Danh sách glob loại trừ, khớp theo tên hoặc đường dẫn tương đối
+        yield_dirs: Có trả về cả entry thư mục không
+        skip_dir: Hàm nhận entry thư mục, trả về True để không đi vào thư mục đó
+        skip_files: Hàm nhận đường dẫn thư mục, trả về True để bỏ qua file trong
+                    thư mục đó (vẫn đi vào thư mục con)
+        on_dir_done: Hàm được gọi với đường dẫn thư mục sau khi đã yield hết file
+                     của thư mục đó (dùng để checkpoint)
+    
+    Yields:
+        FileEntry: Entry của từng file (và thư mục nếu yield_dirs)
+    
+    Giải thích:
+    - Dùng generator: bắt đầu xử lý ngay, không giữ toàn bộ danh sách trong RAM
+    - Mỗi file chỉ stat một lần (DirEntry.stat() được cache trong entry)
+    - Không đi theo symlink thư mục (giống os.walk mặc định)
+    - Thư mục không có quyền truy cập bị bỏ qua
+    """
+    if not recursive:
+        max_depth = 0
+    
+    if extensions:
+        extensions = tuple(ext.lower() for ext in extensions)
+    
+    # Stack các (đường dẫn thư mục, đường dẫn tương đối, độ sâu)
+    stack = [(os.fspath(directory), '', 0)]
+    
+    while stack:
+        current, rel_dir, depth = stack.pop()
+        entries, subdirs = _scan_directory(
+            current, rel_dir, depth, extensions, max_depth,
+            exclude_patterns or [], yield_dirs, skip_dir, skip_files
+        )
+        
+        yield from entries
+        
+        if on_dir_done:
+            on_dir_done(current)
+        
+        # Đảo ngược để thư mục con được duyệt theo đúng thứ tự liệt kê
+        stack.extend(reversed(subdirs))
+
+
+def parallel_scan_files(directory: str, extensions: Optional[List[str]] = None,
+                        recursive: bool = True, max_depth: Optional[int] = None,
+                        exclude_patterns: Optional[List[str]] = None,
+                        yield_dirs: bool = False,
+                        skip_dir: Optional[Callable[[FileEntry], bool]] = None,
+                        skip_files: Optional[Callable[[str], bool]] = None,
+                        on_dir_done: Optional[Callable[[str], None]] = None,
+                        workers: int = DEFAULT_SCAN_WORKERS) -> Iterator[FileEntry]:
+    """
+    Giống scan_files nhưng quét nhiều thư mục con song song bằng thread pool
+    
+    Args:
+        (giống scan_files)
+        workers: Số thread quét đồng thời (<= 1 thì dùng scan_files)
+    
+    Yields:
+        FileEntry: Entry của từng file (thứ tự không cố định)
+    
+    Giải thích:
+    - Trên NFS/SMB, thời gian quét chủ yếu là chờ readdir/stat qua mạng,
+      nhiều thread chờ cùng lúc giúp tăng tốc dù có GIL
+    - Mỗi thư mục là một task; thư mục con tìm được được gửi vào pool ngay
+    - Kết quả được yield ngay khi một thư mục quét xong (streaming)
+    - skip_dir/skip_files có thể được gọi từ nhiều thread,
+      on_dir_done luôn được gọi ở thread đang duyệt generator
+    """
+    if workers <= 1:
+        yield from scan_files(directory, extensions, recursive, max_depth,
+                              exclude_patterns, yield_dirs, skip_dir, skip_files, on_dir_done)
+        return
+    
+    if not recursive:
+        max_depth = 0
+    
+    if extensions:
+        extensions = tuple(ext.lower() for ext in extensions)
+    
+    options = (extensions, max_depth, exclude_patterns or [], yield_dirs, skip_dir, skip_files)
+    
+    executor = ThreadPoolExecutor(max_workers=workers)
+    root = os.fspath(directory)
+    future = executor.submit(_scan_directory, root, '', 0, *options)
+    pending = {future}
+    future_dirs = {future: root}
+    
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            
+            for future in done:
+                entries, subdirs = future.result()
+                current = future_dirs.pop(future)
+                
+                for subdir in subdirs:
+                    child = executor.submit(_scan_directory, *subdir, *options)
+                    future_dirs[child] = subdir[0]
+                    pending.add(child)
+                
+                yield from entries
+                
+                if on_dir_done:
+                    on_dir_done(current)
+    finally:
+        # Consumer dừng sớm (break) -> hủy các thư mục chưa quét
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
 
 
 def get_file_list(directory: str, extensions: Optional[List[str]] = None, 
@@ -28,92 +292,45 @@ def get_file_list(directory: str, extensions: Optional[List[str]] = None,
         list: Danh sách đường dẫn file
     
     Giải thích:
-    - Quét tất cả file trong thư mục
+    - Quét tất cả file trong thư mục bằng scan_files()
     - Lọc theo extension nếu có
     - Loại trừ các pattern không mong muốn (node_modules, .git...)
+      Pattern không có ký tự glob được khớp như chuỗi con của đường dẫn
     - Hỗ trợ cả recursive và non-recursive
     """
-    file_list = []
-    directory = Path(directory)
-    
-    if exclude_patterns is None:
-        exclude_patterns = []
-    
-    def should_exclude(path: Path) -> bool:
-        """Kiểm tra có nên loại trừ path này không"""
-        path_str = str(path)
-        for pattern in exclude_patterns:
-            if pattern in path_str:
-                return True
-        return False
-    
-    if recursive:
-        for root, dirs, files in os.walk(directory):
-            # Loại bỏ các thư mục không mong muốn khỏi dirs
-            dirs[:] = [d for d in dirs if not should_exclude(Path(root) / d)]
-            
-            for file in files:
-                file_path = Path(root) / file
-                
-                if should_exclude(file_path):
-                    continue
-                
-                # Kiểm tra extension
-                if extensions:
-                    if file_path.suffix.lower() in extensions:
-                        file_list.append(str(file_path))
-                else:
-                    file_list.append(str(file_path))
-    else:
-        for item in directory.iterdir():
-            if item.is_file():
-                if should_exclude(item):
-                    continue
-                
-                if extensions:
-                    if item.suffix.lower() in extensions:
-                        file_list.append(str(item))
-                else:
-                    file_list.append(str(item))
+    patterns = []
+    for pattern in exclude_patterns or []:
+        if any(ch in pattern for ch in '*?['):
+            patterns.append(pattern)
+        else:
+            patterns.append(f"*{pattern}*")
     
-    return file_list
+    return [
+        entry.path
+        for entry in scan_files(directory, extensions, recursive, exclude_patterns=patterns)
+    ]
 
 
-def get_folder_size(folder_path: str) -> int:
+def get_folder_size(folder_path: str, workers: int = DEFAULT_SCAN_WORKERS) -> int:
     """
     Tính tổng dung lượng của thư mục
     
     Args:
         folder_path: Đường dẫn thư mục
+        workers: Số thread quét song song (1 = tuần tự)
     
     Returns:
         int: Tổng dung lượng (bytes)
     
     Giải thích:
     - Duyệt qua tất cả file trong thư mục và thư mục con
-    - Cộng dồn kích thước của từng file
+    - Cộng dồn kích thước của từng file (stat lấy sẵn từ parallel_scan_files)
     - Bỏ qua file không tồn tại hoặc không có quyền truy cập
-    - Sử dụng Path và generator để tối ưu memory
     """
-    total_size = 0
-    folder = Path(folder_path)
-    
-    if not folder.exists() or not folder.is_dir():
+    if not os.path.isdir(folder_path):
         return 0
     
-    try:
-        # Sử dụng Path.rglob() thay vì os.walk() để tối ưu hơn
-        for file_path in folder.rglob('*'):
-            if file_path.is_file():
-                try:
-                    total_size += file_path.stat().st_size
-                except (OSError, PermissionError):
-                    # Bỏ qua file không có quyền truy cập
-                    pass
-    except (OSError, PermissionError):
-        pass
-    
-    return total_size
+    return sum(entry.size for entry in parallel_scan_files(folder_path, workers=workers))
 
 
 def safe_delete(path: str) -> Tuple[bool, str]:
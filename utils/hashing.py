@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Module hashing - Registry các thuật toán hash dùng chung
+
+Mục đích: Chọn thuật toán hash theo tên, dễ thêm backend mới
+Lý do: MD5/SHA bị giới hạn bởi CPU, các hash không mã hóa (xxHash, BLAKE3)
+       nhanh hơn nhiều khi chỉ cần so sánh nội dung file
+"""
+
+import os
+import mmap
+import time
+import hashlib
+import threading
+from typing import Callable, Dict, List, Optional
+
+# xxHash (tùy chọn): pip install xxhash
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+# BLAKE3 (tùy chọn): pip install blake3
+try:
+    import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+
+
+# Thuật toán thay thế khi backend nhanh chưa được cài (chỉ cần hashlib)
+FALLBACK_ALGORITHM = 'blake2b'
+
+# Thứ tự ưu tiên khi chọn thuật toán nhanh nhất
+FAST_ALGORITHMS = ['xxh3_128', 'blake3', FALLBACK_ALGORITHM]
+
+# name -> (factory tạo hasher, có phải hash mã hóa không)
+_HASHERS: Dict[str, tuple] = {}
+
+# Kích thước block đọc mặc định khi hash file
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+# File lớn hơn ngưỡng này dùng mmap khi engine = 'auto'
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+# Các I/O engine hỗ trợ cho hash_file()
+IO_ENGINES = ['auto', 'read', 'readinto', 'mmap']
+
+# Buffer đọc dùng lại theo từng thread (tránh cấp phát bytes mới mỗi chunk)
+_thread_buffers = threading.local()
+
+
+def register_hasher(name: str, factory: Callable, cryptographic: bool = True) -> None:
+    """
+    Đăng ký một thuật toán hash
+    
+    Args:
+        name: Tên thuật toán (vd: 'md5', 'xxh3_128')
+        factory: Hàm không tham số trả về object có update()/hexdigest()
+        cryptographic: Thuật toán có chống va chạm cố ý không
+    
+    Giải thích:
+    - Tool chỉ cần gọi get_hasher(name), không cần biết backend cụ thể
+    - Hash không mã hóa cần bước so sánh byte trước khi xóa file
+    """
+    _HASHERS[name] = (factory, cryptographic)
+
+
+register_hasher('md5', hashlib.md5)
+register_hasher('sha1', hashlib.sha1)
+register_hasher('sha256', hashlib.sha256)
+register_hasher('blake2b', lambda: hashlib.blake2b(digest_size=16))
+
+if XXHASH_AVAILABLE:
+    register_hasher('xxh3_128', xxhash.xxh3_128, cryptographic=False)
+
+if BLAKE3_AVAILABLE:
+    register_hasher('blake3', blake3.blake3)
+
+
+def available_algorithms() -> List[str]:
+    """
+    Danh sách thuật toán đã đăng ký (đã cài backend)
+    
+    Returns:
+        list: Tên các thuật toán
+    """
+    return list(_HASHERS.keys())
+
+
+def known_algorithms() -> List[str]:
+    """
+    Danh sách thuật toán có thể chọn (kể cả backend chưa cài, sẽ dùng fallback)
+    
+    Returns:
+        list: Tên các thuật toán
+    """
+    names = available_algorithms()
+    for name in FAST_ALGORITHMS:
+        if name not in names:
+            names.append(name)
+    return names
+
+
+def resolve_algorithm(name: str) -> str:
+    """
+    Chuyển tên thuật toán thành thuật toán thực sự được dùng
+    
+    Args:
+        name: Tên thuật toán người dùng chọn
+    
+    Returns:
+        str: Tên thuật toán có sẵn
+    
+    Raises:
+        ValueError: Nếu tên thuật toán không hợp lệ
+    
+    Giải thích:
+    - xxh3_128/blake3 chưa cài -> dùng blake2b (có sẵn trong hashlib)
+    - Tên không hợp lệ -> báo lỗi thay vì âm thầm dùng MD5
+    - Không phân biệt hoa/thường, bỏ khoảng trắng thừa ('XXH3_128 ' -> 'xxh3_128')
+    """
+    name = name.strip().lower()
+    
+    if name in _HASHERS:
+        return name
+    
+    if name in FAST_ALGORITHMS:
+        return FALLBACK_ALGORITHM
+    
+    raise ValueError(
+        f"Thuật toán hash không hợp lệ: {name} "
+        f"(hỗ trợ: {', '.join(known_algorithms())})"
+    )
+
+
+def get_fastest_algorithm() -> str:
+    """
+    Thuật toán nhanh nhất đang có
+    
+    Returns:
+        str: xxh3_128, blake3 hoặc blake2b
+    """
+    for name in FAST_ALGORITHMS:
+        if name in _HASHERS:
+            return name
+    return FALLBACK_ALGORITHM
+
+
+def get_hasher(name: str):
+    """
+    Tạo hasher mới theo tên thuật toán
+    
+    Args:
+        name: Tên thuật toán (đi qua resolve_algorithm)
+    
+    Returns:
+        object: Hasher có update() và hexdigest()
+    
+    Raises:
+        ValueError: Nếu tên thuật toán không hợp lệ
+    """
+    factory, _ = _HASHERS[resolve_algorithm(name)]
+    return factory()
+
+
+def is_cryptographic(name: str) -> bool:
+    """
+    Kiểm tra thuật toán có phải hash mã hóa không
+    
+    Args:
+        name: Tên thuật toán
+    
+    Returns:
+        bool: False với hash nhanh như xxh3_128
+    """
+    _, cryptographic = _HASHERS[resolve_algorithm(name)]
+    return cryptographic
+
+
+def _get_buffer(block_size: int) -> memoryview:
+    """
+    Lấy buffer đọc đã cấp phát sẵn của thread hiện tại
+    
+    Args:
+        block_size: Kích thước buffer (bytes)
+    
+    Returns:
+        memoryview: View trên bytearray dùng lại giữa các lần gọi
+    """
+    buffer = getattr(_thread_buffers, 'buffer', None)
+    if buffer is None or len(buffer) != block_size:
+        buffer = memoryview(bytearray(block_size))
+        _thread_buffers.buffer = buffer
+    return buffer
+
+
+def _advise_sequential(fd: int) -> None:
+    """Báo kernel sẽ đọc tuần tự (tăng read-ahead), bỏ qua nếu OS không hỗ trợ"""
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+
+
+def _hash_read(f, hasher, block_size: int) -> None:
+    """Engine 'read': f.read() từng chunk (tạo bytes mới mỗi lần)"""
+    while True:
+        chunk = f.read(block_size)
+        if not chunk:
+            break
+        hasher.update(chunk)
+
+
+def _hash_readinto(f, hasher, block_size: int) -> None:
+    """Engine 'readinto': đọc vào buffer cố định, hash qua memoryview"""
+    buffer = _get_buffer(block_size)
+    while True:
+        n = f.readinto(buffer)
+        if not n:
+            break
+        hasher.update(buffer[:n])
+
+
+def _hash_mmap(f, hasher, block_size: int) -> None:
+    """Engine 'mmap': map file vào bộ nhớ, hash từng đoạn không cần copy"""
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm)
+        try:
+            for offset in range(0, len(mm), block_size):
+                hasher.update(view[offset:offset + block_size])
+        finally:
+            view.release()
+
+
+def hash_file(file_path: str, algo: str = 'md5', engine: str = 'auto',
+              block_size: int = DEFAULT_BLOCK_SIZE) -> str:
+    """
+    Tính hash toàn bộ nội dung file
+    
+    Args:
+        file_path: Đường dẫn file
+        algo: Tên thuật toán (xem available_algorithms())
+        engine: I/O engine ('auto', 'read', 'readinto', 'mmap')
+        block_size: Kích thước block đọc (bytes)
+    
+    Returns:
+        str: Hex digest
+    
+    Raises:
+        OSError: Nếu không đọc được file
+        ValueError: Nếu algo hoặc engine không hợp lệ
+    
+    Giải thích:
+    - 'readinto': mở file không buffer, đọc vào buffer dùng lại -> ít cấp phát, ít syscall
+    - 'mmap': không copy dữ liệu sang user space, hợp với file lớn
+    - 'auto': mmap khi file >= MMAP_THRESHOLD, còn lại readinto
+    - Có posix_fadvise(SEQUENTIAL) thì dùng để kernel đọc trước nhiều hơn
+    """
+    if engine not in IO_ENGINES:
+        raise ValueError(f"I/O engine không hợp lệ: {engine} (hỗ trợ: {', '.join(IO_ENGINES)})")
+    
+    hasher = get_hasher(algo)
+    
+    with open(file_path, 'rb', buffering=0) as f:
+        _advise_sequential(f.fileno())
+        size = os.fstat(f.fileno()).st_size
+        
+        if engine == 'auto':
+            engine = 'mmap' if size >= MMAP_THRESHOLD else 'readinto'
+        
+        if engine == 'mmap' and size == 0:
+            # mmap không map được file rỗng
+            engine = 'readinto'
+        
+        if engine == 'read':
+            _hash_read(f, hasher, block_size)
+        elif engine == 'readinto':
+            _hash_readinto(f, hasher, block_size)
+        else:
+            _hash_mmap(f, hasher, block_size)
+    
+    return hasher.hexdigest()
+
+
+def drop_file_cache(file_path: str) -> bool:
+    """
+    Bỏ các trang của file khỏi page cache (nếu OS hỗ trợ)
+    
+    Args:
+        file_path: Đường dẫn file
+    
+    Returns:
+        bool: True nếu đã gửi POSIX_FADV_DONTNEED
+    
+    Mục đích: Benchmark đọc từ đĩa thay vì từ RAM
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    
+    try:
+        fd = os.open(file_path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+        return True
+    except OSError:
+        return False
+
+
+def benchmark_hash_engines(file_path: str, algo: str = 'md5',
+                           block_sizes: Optional[List[int]] = None,
+                           engines: Optional[List[str]] = None,
+                           repeat: int = 3, cold_cache: bool = True) -> List[dict]:
+    """
+    Đo tốc độ hash (MB/s) của từng I/O engine trên một file
+    
+    Args:
+        file_path: File dùng để đo (nên lớn hơn vài trăm MB)
+        algo: Thuật toán hash
+        block_sizes: Các block size cần thử (mặc định: 64 KB, 1 MB, 8 MB)
+        engines: Các engine cần thử (mặc định: read, readinto, mmap)
+        repeat: Số lần đo mỗi cấu hình, lấy lần nhanh nhất
+        cold_cache: Bỏ page cache trước mỗi lần đo (nếu OS hỗ trợ)
+    
+    Returns:
+        list: [{'engine', 'block_size', 'seconds', 'mb_per_s', 'cold_cache'}, ...]
+    """
+    if block_sizes is None:
+        block_sizes = [64 * 1024, DEFAULT_BLOCK_SIZE, 8 * 1024 * 1024]
+    if engines is None:
+        engines = ['read', 'readinto', 'mmap']
+    
+    size = os.path.getsize(file_path)
+    results = []
+    
+    for engine in engines:
+        for block_size in block_sizes:
+            best = None
+            dropped = False
+            
+            for _ in range(max(1, repeat)):
+                if cold_cache:
+                    dropped = drop_file_cache(file_path)
+                
+                start = time.perf_counter()
+                hash_file(file_path, algo, engine, block_size)
+                elapsed = time.perf_counter() - start
+                
+                if best is None or elapsed < best:
+                    best = elapsed
+            
+            results.append({
+                'engine': engine,
+                'block_size': block_size,
+                'seconds': best,
+                'mb_per_s': (size / (1024 * 1024)) / best if best else 0.0,
+                'cold_cache': dropped
+            })
+    
+    return results